@@ -0,0 +1,114 @@
+"""
+Two simultaneous /add-post-image uploads should overlap rather than queue behind one
+another, now that every handler uses its own pooled aiomysql connection instead of
+the shared blocking mysql.connector one.
+
+    python benchmarks/concurrent_uploads.py --size 2400 --rounds 3
+
+Sends the requests in-process through httpx's ASGI transport against the database
+configured in .env, as the first user in the user table, and deletes the posts it
+created afterwards. Prints the wall time of one upload, of two concurrent uploads
+and their ratio: close to 1x means the uploads ran in parallel, 2x means serialized.
+Exits non-zero when the ratio is above --max-ratio (default 1.5).
+"""
+import argparse
+import asyncio
+import io
+import os
+import random
+import statistics
+import sys
+import time
+
+import aiomysql
+import httpx
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main
+
+
+DESCRIPTION = "benchmark: concurrent uploads"
+
+
+def make_image(size: int) -> bytes:
+    image = Image.frombytes("RGB", (size, size), random.randbytes(size * size * 3))
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+
+async def upload(client, userid, token, data):
+    response = await client.post(
+        "/add-post-image",
+        data={"uid": str(userid), "imagePostdescription": DESCRIPTION},
+        files=[("imagefile", ("bench.jpg", data, "image/jpeg"))],
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    response.raise_for_status()
+
+
+async def timed(coroutine_factory):
+    started = time.perf_counter()
+    await coroutine_factory()
+    return time.perf_counter() - started
+
+
+async def cleanup(userid):
+    async with main.pool.acquire() as conn:
+        async with conn.cursor(aiomysql.DictCursor) as cursor:
+            await cursor.execute("SELECT postid FROM post WHERE userid = %s AND postdescription = %s", (userid, DESCRIPTION))
+            postids = [row['postid'] for row in await cursor.fetchall()]
+            if postids:
+                placeholders = ", ".join(["%s"] * len(postids))
+                await cursor.execute(f"DELETE FROM image WHERE postid IN ({placeholders})", postids)
+                await cursor.execute(f"DELETE FROM post WHERE postid IN ({placeholders})", postids)
+    return len(postids)
+
+
+async def run(args):
+    main.pool = await main.create_db_pool()
+    try:
+        async with main.pool.acquire() as conn:
+            async with conn.cursor(aiomysql.DictCursor) as cursor:
+                await cursor.execute("SELECT userid FROM user ORDER BY userid LIMIT 1")
+                user = await cursor.fetchone()
+        if not user:
+            print("No user to upload as.")
+            return
+
+        userid = user['userid']
+        token = main.create_access_token({"userid": str(userid)})
+        images = [make_image(args.size) for _ in range(2)]
+        print(f"Two {args.size}x{args.size} JPEGs ({len(images[0]) // 1024} KiB each), {args.rounds} rounds")
+
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            single, pair = [], []
+            for _ in range(args.rounds):
+                single.append(await timed(lambda: upload(client, userid, token, images[0])))
+                pair.append(await timed(lambda: asyncio.gather(
+                    upload(client, userid, token, images[0]),
+                    upload(client, userid, token, images[1]),
+                )))
+
+        one, two = statistics.median(single), statistics.median(pair)
+        ratio = two / one
+        print(f"one upload:          {one * 1000:8.1f} ms")
+        print(f"two concurrent:      {two * 1000:8.1f} ms")
+        print(f"ratio:               {ratio:8.2f}x  (1x = fully parallel, 2x = serialized)")
+        print(f"removed {await cleanup(userid)} benchmark posts")
+        if ratio > args.max_ratio:
+            raise SystemExit(f"Concurrent uploads took {ratio:.2f}x one upload (max {args.max_ratio}x): they are serializing.")
+    finally:
+        main.pool.close()
+        await main.pool.wait_closed()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=2400)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--max-ratio", type=float, default=1.5)
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,116 @@
+"""
+Round trips and latency of the feed image fetch: the old per-post join versus the
+batched load_feed_images, and hydrate_posts served from a warm post cache.
+
+    python benchmarks/feed_images.py --page-size 20 --iterations 200
+
+Runs against the database configured in .env and uses the newest image posts as the page.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+import aiomysql
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main
+
+
+class CountingCursor:
+    """
+    Wraps a cursor and counts execute() calls, i.e. database round trips.
+    """
+
+    def __init__(self, cursor):
+        self.cursor = cursor
+        self.round_trips = 0
+
+    async def execute(self, query, args=None):
+        self.round_trips += 1
+        return await self.cursor.execute(query, args)
+
+    def __getattr__(self, name):
+        return getattr(self.cursor, name)
+
+
+async def per_post_join(cursor, records):
+    processed_records = []
+    for record in records:
+        await cursor.execute("""
+            SELECT p.userid, p.username, p.postdescription, p.posteddate, u.profileimage AS userprofile, p.posttype, p.postid, p.n_or_g, p.groupname, p.groupid, p.grouptype,
+                i.image, i.mediakey AS imagemediakey, i.placeholder
+            FROM post p
+            LEFT JOIN user u ON u.userid = p.userid
+            LEFT JOIN image i ON p.postid = i.postid
+            WHERE p.posttype = 'image' AND p.postid = %s
+        """, (record['postid'],))
+        image_records = await cursor.fetchall()
+        main.attach_media_urls(image_records, 'image', 'imagemediakey')
+        await main.attach_image_derivatives(cursor, image_records)
+        processed_records.extend(image_records)
+    return processed_records
+
+
+async def batched(cursor, records):
+    images_by_post = await main.load_feed_images(cursor, records, 'image')
+    processed_records = []
+    for record in records:
+        processed_records.extend(main.build_post_rows(record, images_by_post))
+    return processed_records
+
+
+async def cached(cursor, records):
+    return await main.hydrate_posts(cursor, [('n', record['postid']) for record in records])
+
+
+async def measure(name, strategy, records, iterations):
+    timings = []
+    round_trips = 0
+    async with main.pool.acquire() as conn:
+        async with conn.cursor(aiomysql.DictCursor) as raw_cursor:
+            for _ in range(iterations):
+                cursor = CountingCursor(raw_cursor)
+                started = time.perf_counter()
+                await strategy(cursor, records)
+                timings.append((time.perf_counter() - started) * 1000)
+                round_trips = cursor.round_trips
+
+    timings.sort()
+    p95 = timings[max(0, int(len(timings) * 0.95) - 1)]
+    print(f"{name:<16} round trips/page: {round_trips:>3}   p50: {statistics.median(timings):7.2f} ms   p95: {p95:7.2f} ms")
+
+
+async def run(args):
+    main.pool = await main.create_db_pool()
+    try:
+        async with main.pool.acquire() as conn:
+            async with conn.cursor(aiomysql.DictCursor) as cursor:
+                await cursor.execute(
+                    "SELECT * FROM post WHERE posttype = 'image' ORDER BY posteddate DESC LIMIT %s",
+                    (args.page_size,)
+                )
+                records = await cursor.fetchall()
+
+        if not records:
+            print("No image posts to benchmark against.")
+            return
+
+        print(f"Page of {len(records)} image posts, {args.iterations} iterations")
+        await measure("per-post join", per_post_join, records, args.iterations)
+        await measure("batched", batched, records, args.iterations)
+        await measure("cached", cached, records, args.iterations)
+        print(f"post cache: {main.post_cache.stats()}")
+    finally:
+        main.pool.close()
+        await main.pool.wait_closed()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--page-size", type=int, default=20)
+    parser.add_argument("--iterations", type=int, default=200)
+    asyncio.run(run(parser.parse_args()))
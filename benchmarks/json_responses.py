@@ -0,0 +1,116 @@
+"""
+CPU time to render a feed page and a notifications list: the old path (walk each row
+into base64/isoformat strings, then FastAPI's jsonable_encoder and the stdlib JSONResponse)
+against ORJSONResponse rendering the rows as they come from the database.
+
+    python benchmarks/json_responses.py --page-size 20 --iterations 500
+
+Runs against the database configured in .env, using the newest posts as the feed page and
+the user with the most notifications for the notifications list.
+"""
+import argparse
+import asyncio
+import base64
+import os
+import statistics
+import sys
+import time
+from datetime import datetime
+
+import aiomysql
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main
+
+
+def legacy_walk(record):
+    serialized_record = {}
+    for key in record:
+        if isinstance(record[key], datetime):
+            serialized_record[key] = record[key].isoformat()
+        elif isinstance(record[key], bytes):
+            serialized_record[key] = base64.b64encode(record[key]).decode('utf-8')
+        else:
+            serialized_record[key] = record[key]
+    return serialized_record
+
+
+def legacy_render(rows):
+    return JSONResponse(content=jsonable_encoder([legacy_walk(row) for row in rows])).body
+
+
+def orjson_render(rows):
+    return main.ORJSONResponse(content=rows).body
+
+
+def measure(name, render, rows, iterations):
+    timings = []
+    for _ in range(iterations):
+        started = time.process_time_ns()
+        body = render(rows)
+        timings.append((time.process_time_ns() - started) / 1000)
+
+    timings.sort()
+    p95 = timings[max(0, int(len(timings) * 0.95) - 1)]
+    print(f"  {name:<8} cpu/response p50: {statistics.median(timings):8.1f} us   p95: {p95:8.1f} us   "
+          f"body: {len(body)} bytes")
+    return statistics.median(timings)
+
+
+def compare(title, rows, iterations):
+    print(f"{title} ({len(rows)} rows)")
+    before = measure("legacy", legacy_render, rows, iterations)
+    after = measure("orjson", orjson_render, rows, iterations)
+    print(f"  speedup: {before / after:4.2f}x")
+
+
+async def run(args):
+    main.pool = await main.create_db_pool()
+    try:
+        async with main.pool.acquire() as conn:
+            async with conn.cursor(aiomysql.DictCursor) as cursor:
+                await cursor.execute(
+                    "SELECT postid FROM post WHERE mediastatus = 'ready' ORDER BY posteddate DESC LIMIT %s",
+                    (args.page_size,)
+                )
+                refs = [('n', record['postid']) for record in await cursor.fetchall()]
+                feed = await main.hydrate_posts(cursor, refs)
+
+                await cursor.execute("""
+                    SELECT postowneruserid FROM notification
+                    GROUP BY postowneruserid ORDER BY COUNT(*) DESC LIMIT 1
+                """)
+                busiest = await cursor.fetchone()
+                notifications = []
+                if busiest:
+                    await cursor.execute("""
+                        SELECT n.notificationid, n.postid, n.postowneruserid,n.commenttext,n.groupid,n.groupname,n.replaytext, n.myuserid, n.username, n.notificationtype, n.date, u.profileimage, n.seenstatus,n.n_or_g
+                        FROM notification n
+                        JOIN user u ON n.myuserid = u.userid
+                        WHERE n.postowneruserid = %s
+                        ORDER BY n.date DESC LIMIT 30
+                    """, (busiest['postowneruserid'],))
+                    notifications = await cursor.fetchall()
+
+        if not feed and not notifications:
+            print("No posts or notifications to benchmark against.")
+            return
+
+        print(f"{args.iterations} iterations")
+        if feed:
+            compare("feed page", feed, args.iterations)
+        if notifications:
+            compare("notifications", notifications, args.iterations)
+    finally:
+        main.pool.close()
+        await main.pool.wait_closed()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--page-size", type=int, default=20)
+    parser.add_argument("--iterations", type=int, default=500)
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,140 @@
+"""
+OFFSET versus keyset pagination, paging 1,000 pages deep through one user's timeline
+in a seeded 1M-row table.
+
+    python benchmarks/keyset_pagination.py --rows 1000000 --pages 1000 --page-size 20
+
+Seeds a scratch table (bench_post) in the database configured in .env with the same
+(userid, posteddate, postid) index the post table uses, and drops it afterwards unless
+--keep is given. Seeding 1M rows takes a few minutes; --keep lets later runs skip it.
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+import aiomysql
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main
+
+
+BENCH_USERS = 50
+
+
+async def seed(cursor, rows: int):
+    await cursor.execute("""
+        CREATE TABLE IF NOT EXISTS bench_post (
+            postid INT(11) NOT NULL,
+            userid INT(11) NOT NULL,
+            posteddate DATETIME NOT NULL,
+            postdescription VARCHAR(255) DEFAULT NULL,
+            PRIMARY KEY (postid),
+            KEY userid_posteddate (userid, posteddate, postid)
+        ) ENGINE=InnoDB
+    """)
+    await cursor.execute("SELECT COUNT(*) AS total FROM bench_post")
+    existing = (await cursor.fetchone())['total']
+    if existing >= rows:
+        print(f"bench_post already has {existing} rows")
+        return
+
+    print(f"Seeding {rows - existing} rows...")
+    start = datetime(2020, 1, 1)
+    batch = []
+    for postid in range(existing + 1, rows + 1):
+        batch.append((
+            postid,
+            random.randint(1, BENCH_USERS),
+            start + timedelta(seconds=random.randint(0, 4 * 365 * 24 * 3600)),
+            f"post {postid}",
+        ))
+        if len(batch) == 5000:
+            await cursor.executemany(
+                "INSERT INTO bench_post (postid, userid, posteddate, postdescription) VALUES (%s, %s, %s, %s)", batch
+            )
+            batch = []
+    if batch:
+        await cursor.executemany(
+            "INSERT INTO bench_post (postid, userid, posteddate, postdescription) VALUES (%s, %s, %s, %s)", batch
+        )
+
+
+async def page_with_offset(cursor, userid, pages, page_size):
+    timings = []
+    for page in range(pages):
+        started = time.perf_counter()
+        await cursor.execute("""
+            SELECT * FROM bench_post WHERE userid = %s
+            ORDER BY posteddate DESC, postid DESC
+            LIMIT %s OFFSET %s
+        """, (userid, page_size, page * page_size))
+        rows = await cursor.fetchall()
+        timings.append((time.perf_counter() - started) * 1000)
+        if len(rows) < page_size:
+            break
+    return timings
+
+
+async def page_with_keyset(cursor, userid, pages, page_size):
+    timings = []
+    cursor_token = None
+    for _ in range(pages):
+        started = time.perf_counter()
+        after, after_args = main.keyset_filter(["posteddate", "postid"], cursor_token)
+        await cursor.execute(f"""
+            SELECT * FROM bench_post WHERE userid = %s AND {after}
+            ORDER BY posteddate DESC, postid DESC
+            LIMIT %s
+        """, (userid, *after_args, page_size))
+        rows = await cursor.fetchall()
+        cursor_token = main.next_keyset_cursor(rows, ["posteddate", "postid"], page_size)
+        timings.append((time.perf_counter() - started) * 1000)
+        if not cursor_token:
+            break
+    return timings
+
+
+def report(name, timings):
+    checkpoints = [index for index in (0, 99, 499, 999) if index < len(timings)]
+    at_depth = "  ".join(f"page {index + 1}: {timings[index]:6.2f} ms" for index in checkpoints)
+    ordered = sorted(timings)
+    p95 = ordered[max(0, int(len(ordered) * 0.95) - 1)]
+    print(f"{name:<8} pages: {len(timings):>4}  total: {sum(timings):9.1f} ms  "
+          f"p50: {statistics.median(timings):6.2f} ms  p95: {p95:6.2f} ms")
+    print(f"{'':<8} {at_depth}")
+
+
+async def run(args):
+    config = dict(main.async_db_config, minsize=1, maxsize=1)
+    async with aiomysql.create_pool(**config) as pool:
+        async with pool.acquire() as conn:
+            async with conn.cursor(aiomysql.DictCursor) as cursor:
+                await seed(cursor, args.rows)
+                try:
+                    await cursor.execute(
+                        "SELECT userid, COUNT(*) AS total FROM bench_post GROUP BY userid ORDER BY total DESC LIMIT 1"
+                    )
+                    busiest = await cursor.fetchone()
+                    print(f"Paging user {busiest['userid']} ({busiest['total']} posts), "
+                          f"{args.pages} pages of {args.page_size}")
+
+                    report("offset", await page_with_offset(cursor, busiest['userid'], args.pages, args.page_size))
+                    report("keyset", await page_with_keyset(cursor, busiest['userid'], args.pages, args.page_size))
+                finally:
+                    if not args.keep:
+                        await cursor.execute("DROP TABLE bench_post")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--pages", type=int, default=1000)
+    parser.add_argument("--page-size", type=int, default=20)
+    parser.add_argument("--keep", action="store_true", help="keep bench_post for the next run")
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,85 @@
+"""
+Like and comment counts for a feed page: the old per-card COUNT(*) requests
+(get_like_count + get_comments_count for every post) against the materialized
+counters, which come back inline with the hydrated posts.
+
+    python benchmarks/post_counters.py --page-size 20 --iterations 200
+
+Runs read-only against the database configured in .env, using the posts with the
+most likes as the page so the COUNT(*) side has rows to count. Run
+`python manage.py reconcile-counters` first so both sides agree.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+import aiomysql
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main
+
+
+async def per_card_counts(cursor, postids):
+    counts = {}
+    for postid in postids:
+        await cursor.execute("SELECT COUNT(*) AS like_count FROM post_like WHERE postid = %s", (postid,))
+        like_count = (await cursor.fetchone())['like_count']
+        await cursor.execute("SELECT COUNT(*) AS comment_count FROM comment WHERE postid = %s", (postid,))
+        comment_count = (await cursor.fetchone())['comment_count']
+        counts[postid] = (like_count, comment_count)
+    return counts
+
+
+async def counter_columns(cursor, postids):
+    placeholders = ", ".join(["%s"] * len(postids))
+    await cursor.execute(f"SELECT postid, likecount, commentcount FROM post WHERE postid IN ({placeholders})", postids)
+    return {row['postid']: (row['likecount'], row['commentcount']) for row in await cursor.fetchall()}
+
+
+async def measure(strategy, cursor, postids, iterations):
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        result = await strategy(cursor, postids)
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings, result
+
+
+async def run(args):
+    main.pool = await main.create_db_pool()
+    try:
+        async with main.pool.acquire() as conn:
+            async with conn.cursor(aiomysql.DictCursor) as cursor:
+                await cursor.execute("SELECT postid FROM post ORDER BY likecount DESC LIMIT %s", (args.page_size,))
+                postids = [row['postid'] for row in await cursor.fetchall()]
+                if not postids:
+                    print("No posts to benchmark against.")
+                    return
+
+                print(f"{len(postids)} posts, {args.iterations} iterations")
+                results = {}
+                for name, strategy, queries in (
+                    ("COUNT(*)", per_card_counts, 2 * len(postids)),
+                    ("counters", counter_columns, 1),
+                ):
+                    timings, results[name] = await measure(strategy, cursor, postids, args.iterations)
+                    print(f"{name:<9} queries/page: {queries:>3}  p50: {statistics.median(timings):7.2f} ms  "
+                          f"max: {max(timings):7.2f} ms")
+
+                drifted = [postid for postid in postids if results["COUNT(*)"][postid] != results["counters"].get(postid)]
+                if drifted:
+                    print(f"{len(drifted)} posts have drifted counters; run manage.py reconcile-counters.")
+    finally:
+        main.pool.close()
+        await main.pool.wait_closed()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--page-size", type=int, default=20)
+    parser.add_argument("--iterations", type=int, default=200)
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,117 @@
+"""
+ns/row of the compiled post serializers against the per-endpoint code they replaced:
+the hand-built feed dict and the key-walking serialize_record used for whole rows.
+
+    python benchmarks/post_serializer.py --rows 10000 --repeat 5
+
+Runs on synthetic rows shaped like post table rows; no database is needed.
+"""
+import argparse
+import base64
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main
+
+
+def make_rows(count: int):
+    started = datetime(2024, 1, 1)
+    rows = []
+    for postid in range(1, count + 1):
+        posttype = random.choice(['text', 'link', 'video', 'audio'])
+        row = {column: None for column in main.POST_COLUMNS}
+        row.update({
+            'postid': postid,
+            'userid': random.randint(1, 5000),
+            'username': f"user{postid}",
+            'postdescription': "A post description " * 3,
+            'posteddate': started + timedelta(seconds=postid),
+            'posttype': posttype,
+            'post': os.urandom(48) if posttype in ('video', 'audio') else b'',
+            'userprofile': os.urandom(256),
+            'textcolor': '#000000',
+            'textbody': "Body text " * 10,
+            'thelink': 'https://example.com' if posttype == 'link' else '',
+            'n_or_g': 'n',
+            'mediakey': os.urandom(32).hex(),
+            'mediastatus': 'ready',
+            'posturl': f"/media/{postid}",
+        })
+        rows.append(row)
+    return rows
+
+
+def legacy_feed_row(record):
+    return {
+        'postid': record['postid'],
+        'userid': record['userid'],
+        'username': record['username'],
+        'postdescription': record['postdescription'],
+        'posteddate': record['posteddate'],
+        'posttype': record['posttype'],
+        'post': base64.b64encode(record['post']).decode('utf-8') if record['post'] else None,
+        'posturl': record.get('posturl'),
+        'posterurl': record.get('posterurl'),
+        'previewurl': record.get('previewurl'),
+        'placeholder': record.get('placeholder'),
+        'userprofile': base64.b64encode(record['userprofile']).decode('utf-8') if record['userprofile'] else None,
+        'filepath': record['filepath'] if 'filepath' in record else None,
+        'textcolor': record['textcolor'] if 'textcolor' in record else None,
+        'textbody': record['textbody'] if 'textbody' in record else None,
+        'thelink': record['thelink'] if 'thelink' in record else None,
+        'groupid': record['groupid'] if 'groupid' in record else None,
+        'grouptype': record['grouptype'] if 'grouptype' in record else None,
+        'n_or_g': record['n_or_g'] if 'n_or_g' in record else None,
+        'groupname': record['groupname'] if 'groupname' in record else None,
+    }
+
+
+def legacy_whole_row(record):
+    serialized_record = {}
+    for key in record:
+        if isinstance(record[key], datetime):
+            serialized_record[key] = record[key].isoformat()
+        elif isinstance(record[key], bytes):
+            serialized_record[key] = base64.b64encode(record[key]).decode('utf-8')
+        else:
+            serialized_record[key] = record[key]
+    return serialized_record
+
+
+def measure(serializer, rows, repeat: int) -> float:
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter_ns()
+        for row in rows:
+            serializer(row)
+        elapsed = time.perf_counter_ns() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best / len(rows)
+
+
+def run(args):
+    random.seed(args.seed)
+    rows = make_rows(args.rows)
+    print(f"{args.rows} rows, best of {args.repeat}")
+
+    for name, before, after in (
+        ("feed row", legacy_feed_row, main.serialize_feed_post),
+        ("whole row", legacy_whole_row, main.serialize_post),
+    ):
+        before_ns = measure(before, rows, args.repeat)
+        after_ns = measure(after, rows, args.repeat)
+        print(f"{name:<10} before: {before_ns:8.0f} ns/row   after: {after_ns:8.0f} ns/row   "
+              f"speedup: {before_ns / after_ns:4.2f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=1)
+    run(parser.parse_args())
@@ -0,0 +1,111 @@
+"""
+Bytes read from MySQL per request with the old SELECT * queries against the explicit
+projections that replaced them, for the lookups and lists that used to drag blobs along.
+
+    python benchmarks/select_projection.py --page-size 20
+
+Runs read-only against the database configured in .env, using its newest posts and
+users as the sample. Bytes are the server's own Bytes_sent counter for the session,
+so they are what actually crossed the wire, result set metadata included.
+"""
+import argparse
+import asyncio
+import os
+import sys
+
+import aiomysql
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main
+
+
+async def bytes_sent(cursor) -> int:
+    await cursor.execute("SHOW SESSION STATUS LIKE 'Bytes_sent'")
+    return int((await cursor.fetchone())['Value'])
+
+
+async def measure(cursor, query, args, overhead: int) -> int:
+    """
+    Bytes_sent for one query and its result. `overhead` is what the status query
+    itself sends, which lands inside the measured window.
+    """
+    started = await bytes_sent(cursor)
+    await cursor.execute(query, args)
+    await cursor.fetchall()
+    return await bytes_sent(cursor) - started - overhead
+
+
+async def sample(cursor, args):
+    await cursor.execute("SELECT postid FROM post ORDER BY posteddate DESC LIMIT %s", (args.page_size,))
+    postids = [row['postid'] for row in await cursor.fetchall()]
+    await cursor.execute("SELECT postid FROM image ORDER BY imageid DESC LIMIT 1")
+    image_post = await cursor.fetchone()
+    await cursor.execute("SELECT userid, username FROM user ORDER BY createddate DESC LIMIT 2")
+    users = await cursor.fetchall()
+    return postids, image_post, users
+
+
+def cases(postids, image_post, users):
+    ids = ", ".join(["%s"] * len(postids))
+    userid = users[0]['userid']
+    otheruserid = users[-1]['userid']
+    search = f"%{users[0]['username'][:3]}%"
+
+    yield ("feed page (hydrate_posts)",
+           f"SELECT * FROM post WHERE postid IN ({ids})",
+           f"SELECT {main.FEED_POST_SELECT} FROM post WHERE postid IN ({ids})", postids)
+    yield ("get_post",
+           "SELECT * FROM post WHERE postid=%s",
+           f"SELECT {main.POST_SELECT} FROM post WHERE postid=%s", (postids[0],))
+    if image_post:
+        yield ("get_images",
+               "SELECT * FROM image WHERE postid=%s",
+               f"SELECT {main.IMAGE_SELECT} FROM image WHERE postid=%s", (image_post['postid'],))
+    yield ("join-group user lookup",
+           "SELECT * FROM user WHERE userid = %s",
+           main.QUERIES["user_name"].sql, (userid,))
+    yield ("start-to-follow checks",
+           "SELECT * FROM iamfollowing WHERE otheruserid=%s AND myuserid=%s",
+           "SELECT iamfollowingid FROM iamfollowing WHERE otheruserid=%s AND myuserid=%s", (otheruserid, userid))
+    yield ("get_userlist_to_follow",
+           "SELECT * FROM user WHERE userid != %s LIMIT 20",
+           f"SELECT {main.USER_SELECT} FROM user WHERE userid != %s LIMIT 20", (userid,))
+    yield ("search-result users",
+           "SELECT * FROM user WHERE username LIKE %s",
+           f"SELECT {main.USER_SELECT} FROM user WHERE username LIKE %s", (search,))
+
+
+async def run(args):
+    main.pool = await main.create_db_pool()
+    try:
+        async with main.pool.acquire() as conn:
+            async with conn.cursor(aiomysql.DictCursor) as cursor:
+                postids, image_post, users = await sample(cursor, args)
+                if not postids or not users:
+                    print("No posts or users to benchmark against.")
+                    return
+
+                started = await bytes_sent(cursor)
+                overhead = await bytes_sent(cursor) - started
+
+                print(f"{'request':<28} {'SELECT *':>12} {'projection':>12} {'saved':>8}")
+                total_before = total_after = 0
+                for name, before_query, after_query, query_args in cases(postids, image_post, users):
+                    before = await measure(cursor, before_query, query_args, overhead)
+                    after = await measure(cursor, after_query, query_args, overhead)
+                    total_before += before
+                    total_after += after
+                    saved = 1 - after / before if before else 0
+                    print(f"{name:<28} {before:>10} B {after:>10} B {saved:>7.1%}")
+                print(f"{'total':<28} {total_before:>10} B {total_after:>10} B "
+                      f"{1 - total_after / total_before if total_before else 0:>7.1%}")
+    finally:
+        main.pool.close()
+        await main.pool.wait_closed()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--page-size", type=int, default=20)
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,74 @@
+"""
+Peak Python heap per feed response: hydrating a page and rendering it as one body
+versus streaming it row by row from an SSDictCursor through iter_json_array.
+
+    python benchmarks/streaming_responses.py --page-size 50
+
+Runs against the database configured in .env with the post cache disabled, so every
+post is read from MySQL, and uses the newest posts as the page.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tracemalloc
+
+import aiomysql
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main
+
+
+async def buffered(refs):
+    async with main.pool.acquire() as conn:
+        async with conn.cursor(aiomysql.DictCursor) as cursor:
+            rows = await main.hydrate_posts(cursor, refs)
+    body = main.dump_json(rows)
+    return len(body)
+
+
+async def streamed(refs):
+    sent = 0
+    async for chunk in main.iter_json_array(main.iter_hydrated_posts(refs)):
+        sent += len(chunk)
+    return sent
+
+
+async def measure(name, strategy, refs):
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    size = await strategy(refs)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:<9} body: {size / 1024:9.1f} KiB   peak heap: {peak / 1024:9.1f} KiB")
+
+
+async def run(args):
+    main.pool = await main.create_db_pool()
+    main.post_cache = main.PostCache(max_bytes=0)
+    try:
+        async with main.pool.acquire() as conn:
+            async with conn.cursor(aiomysql.DictCursor) as cursor:
+                await cursor.execute(
+                    "SELECT postid FROM post WHERE mediastatus = 'ready' ORDER BY posteddate DESC LIMIT %s",
+                    (args.page_size,)
+                )
+                refs = [('n', record['postid']) for record in await cursor.fetchall()]
+
+        if not refs:
+            print("No posts to benchmark against.")
+            return
+
+        print(f"Page of {len(refs)} posts")
+        await measure("buffered", buffered, refs)
+        await measure("streamed", streamed, refs)
+    finally:
+        main.pool.close()
+        await main.pool.wait_closed()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--page-size", type=int, default=50)
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,99 @@
+"""
+Fail on SELECT * (or alias.*) against tables with LONGBLOB columns.
+
+    python lint_sql.py            # checks main.py and manage.py
+    python lint_sql.py main.py benchmarks/feed_images.py
+
+The blob-bearing tables are read from the CREATE TABLE statements in main.py, so new
+tables are covered without touching this file. Every string literal is checked,
+f-strings included; a SELECT * whose table is an interpolated {name} is reported too,
+since it may be one of them. Exits 1 if anything is found. Needs only the standard
+library (no database, no app dependencies), so it can run anywhere main.py can be read.
+"""
+import ast
+import os
+import re
+import sys
+
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_PATHS = ("main.py", "manage.py")
+
+CREATE_TABLE = re.compile(r"CREATE TABLE IF NOT EXISTS\s+`?(\w+)`?\s*\((.*?)\)\s*ENGINE", re.S | re.I)
+BLOB_COLUMN = re.compile(r"^\s*`?(\w+)`?\s+(?:TINY|MEDIUM|LONG)?BLOB\b", re.M | re.I)
+SELECT = re.compile(r"\bSELECT\s+(.*?)\s+FROM\s+(.*?)(?=\bWHERE\b|\bORDER\b|\bGROUP\b|\bLIMIT\b|\bUNION\b|\)|;|$)", re.S | re.I)
+STAR = re.compile(r"(?:^|,)\s*(?:DISTINCT\s+)?(?:\w+\.)?\*\s*(?:,|$)", re.I)
+TABLE = re.compile(r"(?:^|\bJOIN\b|,)\s*(`?\w+`?|\{[^}]*\})", re.I)
+
+
+def blob_tables(schema_source: str) -> dict:
+    """
+    {table: [blob columns]} for the CREATE TABLE statements in `schema_source`.
+    """
+    tables = {}
+    for match in CREATE_TABLE.finditer(schema_source):
+        columns = BLOB_COLUMN.findall(match.group(2))
+        if columns:
+            tables[match.group(1).lower()] = columns
+    return tables
+
+
+def string_literals(tree):
+    """
+    (line, text) for every str constant and f-string; interpolated values keep their
+    source as {expression} so an interpolated table name is still visible.
+    """
+    for node in ast.walk(tree):
+        if isinstance(node, ast.JoinedStr):
+            parts = []
+            for value in node.values:
+                if isinstance(value, ast.Constant):
+                    parts.append(str(value.value))
+                else:
+                    parts.append("{" + ast.unparse(value.value) + "}")
+            yield node.lineno, "".join(parts)
+        elif isinstance(node, ast.Constant) and isinstance(node.value, str):
+            yield node.lineno, node.value
+
+
+def check_source(source: str, tables: dict):
+    findings = []
+    seen = set()
+    for lineno, text in string_literals(ast.parse(source)):
+        for select in SELECT.finditer(text):
+            if not STAR.search(select.group(1)):
+                continue
+            for table in TABLE.findall(select.group(2)):
+                name = table.strip("`").lower()
+                if name.startswith("{"):
+                    reason = f"SELECT * from interpolated table {table}"
+                elif name in tables:
+                    reason = f"SELECT * from {name} (blob columns: {', '.join(tables[name])})"
+                else:
+                    continue
+                if (lineno, reason) not in seen:
+                    seen.add((lineno, reason))
+                    findings.append((lineno, reason))
+    return findings
+
+
+def main(paths) -> int:
+    with open(os.path.join(ROOT, "main.py"), encoding="utf-8") as schema_file:
+        tables = blob_tables(schema_file.read())
+
+    failures = 0
+    for path in paths:
+        with open(os.path.join(ROOT, path), encoding="utf-8") as source_file:
+            findings = check_source(source_file.read(), tables)
+        for lineno, reason in sorted(findings):
+            print(f"{path}:{lineno}: {reason}")
+        failures += len(findings)
+
+    if failures:
+        print(f"{failures} SELECT * against blob-bearing tables; list the columns the query needs.")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:] or DEFAULT_PATHS))
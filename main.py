@@ -1,4 +1,11 @@
+from abc import ABC, abstractmethod
+import asyncio
 import base64
+import contextvars
+from array import array
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
 from email.mime.image import MIMEImage
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
@@ -11,55 +18,436 @@ import random
 import re
 import secrets
 import smtplib
+import socket
 import ssl
 import string
+import subprocess
+import sys
 import tempfile
+import time
+import weakref
+import zlib
 from typing import Any, Dict, List, Optional, Union
 from urllib.parse import urlparse
 import aiomysql
+import brotli
 from bs4 import BeautifulSoup
-from fastapi import (Depends, FastAPI, File, Form, status, HTTPException, Query, UploadFile, requests,)
-from fastapi.concurrency import asynccontextmanager
-from fastapi.responses import JSONResponse
+from fastapi import (Depends, FastAPI, File, Form, status, HTTPException, Query, Request, Response, UploadFile, requests,)
+from fastapi.concurrency import asynccontextmanager, run_in_threadpool
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.security import OAuth2PasswordBearer
 import httpx
+import imageio_ffmpeg
 from jose import jwt, JWTError
-import mysql.connector
+import orjson
 from fastapi.middleware.cors import CORSMiddleware
 from datetime import datetime, timedelta, timezone
+from decimal import Decimal
 from playwright.sync_api import sync_playwright
 from moviepy.editor import VideoFileClip
+from PIL import Image, ImageOps, UnidentifiedImageError
 import requests
+from starlette.datastructures import Headers, MutableHeaders
+import zstandard
 
 
 # Load environment variables from .env file
 load_dotenv()
 
-app = FastAPI()
+def orjson_default(value):
+    """
+    Types orjson does not serialize natively, encoded the way FastAPI's encoder and
+    the old per-endpoint serializers did: blobs as base64, Decimal as a number and
+    timedelta (MySQL TIME) as seconds.
+    """
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return base64.b64encode(value).decode('ascii')
+    if isinstance(value, Decimal):
+        return int(value) if value.as_tuple().exponent >= 0 else float(value)
+    if isinstance(value, timedelta):
+        return value.total_seconds()
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
 
- 
 
-sync_db_config = {
-    "host": os.getenv("DB_HOST"),
-    "user": os.getenv("DB_USER"),
-    "password": os.getenv("DB_PASSWORD"),
-    "database": os.getenv("DB_NAME"),
-}
+def dump_json(content) -> bytes:
+    return orjson.dumps(content, default=orjson_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+class ORJSONResponse(JSONResponse):
+    """
+    JSON rendered by orjson. datetime is handled natively and the rest through
+    orjson_default, so endpoints can return database rows without walking them.
+    """
+
+    def render(self, content) -> bytes:
+        return dump_json(content)
+
+
+app = FastAPI(default_response_class=ORJSONResponse)
+
+ 
 
+DB_ACQUIRE_TIMEOUT_SECONDS = float(os.getenv("DB_ACQUIRE_TIMEOUT_SECONDS", "5"))
+POOL_WAIT_BUCKETS_MS = (1, 5, 10, 50, 100, 250, 500, 1000, 2500, 5000)
 
 async_db_config = {
     "host": os.getenv("DB_HOST"),
     "user": os.getenv("DB_USER"),
     "password": os.getenv("DB_PASSWORD"),
     "db": os.getenv("DB_NAME"),
-    "port": 3306,
-    "minsize": 4,
-    "maxsize": 16,
+    "port": int(os.getenv("DB_PORT", "3306")),
+    "minsize": int(os.getenv("DB_POOL_MIN_SIZE", "4")),
+    "maxsize": int(os.getenv("DB_POOL_MAX_SIZE", "16")),
+    "pool_recycle": int(os.getenv("DB_POOL_RECYCLE_SECONDS", "3600")),
     "autocommit": True,
     # 'ssl': {},
 }
 
-conn = mysql.connector.connect(**sync_db_config)
+# Per-request flag set when a connection could not be checked out in time, so
+# DatabaseBusyMiddleware can report 503 even from handlers that turn every
+# exception into a 500.
+pool_timed_out = contextvars.ContextVar("pool_timed_out", default=None)
+
+
+class PrimaryReads:
+    """
+    The primary pool as handed out by read_pool(): connections taken through it do
+    not mark the request as a possible write for read-your-writes.
+    """
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    def acquire(self):
+        return self.pool.acquire(write=False)
+
+
+class InstrumentedPool:
+    """
+    aiomysql pool wrapper whose acquire() gives up after DB_ACQUIRE_TIMEOUT_SECONDS
+    with a 503 instead of queueing forever, and which records how long requests
+    wait for a connection and how many are in use, to tell pool starvation apart
+    from slow queries. Anything else is delegated to the wrapped pool.
+    """
+
+    def __init__(self, pool, acquire_timeout: float = DB_ACQUIRE_TIMEOUT_SECONDS, replica: bool = False):
+        self.pool = pool
+        self.acquire_timeout = acquire_timeout
+        self.replica = replica
+        self.in_use = 0
+        self.max_in_use = 0
+        self.acquires = 0
+        self.timeouts = 0
+        self.wait_total_ms = 0.0
+        self.wait_max_ms = 0.0
+        self.wait_buckets = [0] * (len(POOL_WAIT_BUCKETS_MS) + 1)
+        self.reads = PrimaryReads(self)
+
+    def __getattr__(self, name):
+        return getattr(self.pool, name)
+
+    @asynccontextmanager
+    async def acquire(self, write: bool = True):
+        started = time.perf_counter()
+        try:
+            conn = await asyncio.wait_for(self.pool.acquire(), self.acquire_timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            flag = pool_timed_out.get()
+            if flag is not None:
+                flag["timed_out"] = True
+            print(f"Timed out after {self.acquire_timeout}s waiting for a database connection")
+            raise HTTPException(
+                status_code=503, detail="Database is busy, try again shortly", headers={"Retry-After": "1"}
+            )
+
+        self.record_wait((time.perf_counter() - started) * 1000)
+        if write and not self.replica:
+            routing = db_routing.get()
+            if routing is not None:
+                routing["primary_writes"] = True
+        self.in_use += 1
+        self.max_in_use = max(self.max_in_use, self.in_use)
+        try:
+            yield conn
+        finally:
+            self.in_use -= 1
+            await self.pool.release(conn)
+
+    def record_wait(self, wait_ms: float):
+        self.acquires += 1
+        self.wait_total_ms += wait_ms
+        self.wait_max_ms = max(self.wait_max_ms, wait_ms)
+        for index, bound in enumerate(POOL_WAIT_BUCKETS_MS):
+            if wait_ms <= bound:
+                self.wait_buckets[index] += 1
+                break
+        else:
+            self.wait_buckets[-1] += 1
+
+    def stats(self) -> dict:
+        labels = [f"le_{bound}ms" for bound in POOL_WAIT_BUCKETS_MS] + ["inf"]
+        return {
+            "minsize": self.pool.minsize,
+            "maxsize": self.pool.maxsize,
+            "size": self.pool.size,
+            "free": self.pool.freesize,
+            "in_use": self.in_use,
+            "max_in_use": self.max_in_use,
+            "acquires": self.acquires,
+            "timeouts": self.timeouts,
+            "acquire_timeout_seconds": self.acquire_timeout,
+            "wait_avg_ms": round(self.wait_total_ms / self.acquires, 3) if self.acquires else None,
+            "wait_max_ms": round(self.wait_max_ms, 3),
+            "wait_histogram": dict(zip(labels, self.wait_buckets)),
+        }
+
+
+async def create_db_pool(**overrides) -> InstrumentedPool:
+    return InstrumentedPool(await aiomysql.create_pool(**{**async_db_config, **overrides}))
+
+
+DB_REPLICA_HOST = os.getenv("DB_REPLICA_HOST") or None
+# Reads go back to the primary while the replica is further behind than this; a
+# negative value skips the lag check (e.g. a second local MySQL that does not
+# replicate, for testing the routing).
+DB_REPLICA_MAX_LAG_SECONDS = float(os.getenv("DB_REPLICA_MAX_LAG_SECONDS", "5"))
+DB_REPLICA_CHECK_SECONDS = float(os.getenv("DB_REPLICA_CHECK_SECONDS", "2"))
+DB_READ_YOUR_WRITES_SECONDS = float(os.getenv("DB_READ_YOUR_WRITES_SECONDS", "5"))
+# How long after a write a replica read may still return the old row.
+REPLICA_STALE_SECONDS = max(DB_REPLICA_MAX_LAG_SECONDS, DB_READ_YOUR_WRITES_SECONDS)
+
+replica_db_config = {
+    **async_db_config,
+    "host": DB_REPLICA_HOST,
+    "port": int(os.getenv("DB_REPLICA_PORT", str(async_db_config["port"]))),
+    "user": os.getenv("DB_REPLICA_USER") or async_db_config["user"],
+    "password": os.getenv("DB_REPLICA_PASSWORD") or async_db_config["password"],
+    "maxsize": int(os.getenv("DB_REPLICA_POOL_MAX_SIZE", str(async_db_config["maxsize"]))),
+}
+
+replica_pool = None
+
+# Per-request routing state: the client key used for read-your-writes stickiness
+# and whether a primary connection was taken other than for reads.
+db_routing = contextvars.ContextVar("db_routing", default=None)
+
+
+class RecentWriters:
+    """
+    Clients (user IDs, or addresses for anonymous requests) that wrote within the
+    last DB_READ_YOUR_WRITES_SECONDS; their reads stay on the primary until then.
+    """
+
+    def __init__(self, window_seconds: float = DB_READ_YOUR_WRITES_SECONDS):
+        self.window_seconds = window_seconds
+        self.until = {}
+
+    def note(self, client: str):
+        now = time.monotonic()
+        if len(self.until) > 10000:
+            self.until = {key: until for key, until in self.until.items() if until > now}
+        self.until[client] = now + self.window_seconds
+
+    def is_recent(self, client: Optional[str]) -> bool:
+        until = self.until.get(client) if client else None
+        return until is not None and until > time.monotonic()
+
+
+recent_writers = RecentWriters()
+
+
+class ReplicaMonitor:
+    """
+    Polls the replica's replication lag every DB_REPLICA_CHECK_SECONDS. The replica
+    is used only while the last check succeeded recently and found it at most
+    DB_REPLICA_MAX_LAG_SECONDS behind; stopped replication counts as unhealthy.
+    """
+
+    def __init__(self, check_seconds: float = DB_REPLICA_CHECK_SECONDS, max_lag_seconds: float = DB_REPLICA_MAX_LAG_SECONDS):
+        self.check_seconds = check_seconds
+        self.max_lag_seconds = max_lag_seconds
+        self.task = None
+        self.lag_seconds = None
+        self.checked_at = None
+        self.error = None
+        self.fallbacks = 0
+        self.replica_reads = 0
+        self.primary_reads = 0
+
+    async def start(self):
+        await self.check()
+        self.task = asyncio.create_task(self.run())
+        print(f"Replica monitor started for {DB_REPLICA_HOST}.")
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.check_seconds)
+            await self.check()
+
+    async def check(self):
+        if self.max_lag_seconds < 0:
+            self.lag_seconds, self.checked_at = 0, time.monotonic()
+            return
+        try:
+            async with replica_pool.acquire() as conn:
+                async with conn.cursor(aiomysql.DictCursor) as cursor:
+                    try:
+                        await cursor.execute("SHOW REPLICA STATUS")
+                    except aiomysql.Error:
+                        await cursor.execute("SHOW SLAVE STATUS")
+                    status = await cursor.fetchone() or {}
+            lag = status.get("Seconds_Behind_Source", status.get("Seconds_Behind_Master"))
+            self.lag_seconds = int(lag) if lag is not None else None
+            self.error = None if status else "replication is not configured"
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.lag_seconds, self.error = None, str(e)
+            print(f"Replica lag check failed: {e}")
+        self.checked_at = time.monotonic()
+
+    def is_healthy(self) -> bool:
+        if self.lag_seconds is None or self.checked_at is None:
+            return False
+        if time.monotonic() - self.checked_at > 3 * self.check_seconds:
+            return False
+        return self.max_lag_seconds < 0 or self.lag_seconds <= self.max_lag_seconds
+
+    def stats(self) -> dict:
+        return {
+            "host": DB_REPLICA_HOST,
+            "healthy": self.is_healthy(),
+            "lag_seconds": self.lag_seconds,
+            "max_lag_seconds": self.max_lag_seconds,
+            "error": self.error,
+            "replica_reads": self.replica_reads,
+            "primary_reads": self.primary_reads,
+            "lag_fallbacks": self.fallbacks,
+            "pool": replica_pool.stats() if replica_pool is not None else None,
+        }
+
+
+replica_monitor = ReplicaMonitor()
+
+
+def read_pool():
+    """
+    Pool for a read-only query: the replica when one is configured, healthy and
+    the requesting client has not written in the last DB_READ_YOUR_WRITES_SECONDS,
+    else the primary (through its PrimaryReads view).
+    """
+    routing = db_routing.get()
+    if replica_pool is not None and not (routing and recent_writers.is_recent(routing["client"])):
+        if replica_monitor.is_healthy():
+            replica_monitor.replica_reads += 1
+            return replica_pool
+        replica_monitor.fallbacks += 1
+
+    replica_monitor.primary_reads += 1
+    return pool.reads
+
+
+def routing_client(scope) -> Optional[str]:
+    """
+    Who a request belongs to for read-your-writes: the userid in its bearer token
+    (signature not checked; it only picks a pool), else its address.
+    """
+    authorization = Headers(scope=scope).get("authorization", "")
+    if authorization.lower().startswith("bearer "):
+        try:
+            userid = jwt.get_unverified_claims(authorization[7:]).get("userid")
+            if userid is not None:
+                return f"user:{userid}"
+        except JWTError:
+            pass
+    client = scope.get("client")
+    return f"addr:{client[0]}" if client else None
+
+
+def note_write():
+    """
+    Pin the current client's reads to the primary, for handlers that write over
+    GET (ReadYourWritesMiddleware only counts primary connections taken by other
+    methods, since GET handlers also read through pool.acquire()).
+    """
+    routing = db_routing.get()
+    if routing is not None and routing["client"]:
+        recent_writers.note(routing["client"])
+
+
+class ReadYourWritesMiddleware:
+    """
+    After a non-GET request that took a primary connection other than through
+    read_pool() (i.e. may have written), pins the client's reads to the primary
+    for DB_READ_YOUR_WRITES_SECONDS so it sees its own write. GET handlers that
+    write call note_write() themselves.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or replica_pool is None:
+            await self.app(scope, receive, send)
+            return
+
+        routing = {"client": routing_client(scope), "primary_writes": False}
+        token = db_routing.set(routing)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            db_routing.reset(token)
+            if (
+                scope["method"] not in ("GET", "HEAD", "OPTIONS")
+                and routing["primary_writes"]
+                and routing["client"]
+            ):
+                recent_writers.note(routing["client"])
+
+
+app.add_middleware(ReadYourWritesMiddleware)
+
+
+class DatabaseBusyMiddleware:
+    """
+    Turns a 500 into 503 + Retry-After when the request timed out waiting for a
+    database connection, whatever the handler's own error handling made of it.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        flag = {"timed_out": False}
+        token = pool_timed_out.set(flag)
+
+        async def send_busy(message):
+            if message["type"] == "http.response.start" and flag["timed_out"] and message["status"] == 500:
+                headers = MutableHeaders(raw=list(message["headers"]))
+                headers["Retry-After"] = "1"
+                message = {**message, "status": 503, "headers": headers.raw}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_busy)
+        finally:
+            pool_timed_out.reset(token)
+
+
+app.add_middleware(DatabaseBusyMiddleware)
 
 
 app.add_middleware(
@@ -68,22 +456,432 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
+
+
+COMPRESSION_ENABLED = os.getenv("COMPRESSION_ENABLED", "true").lower() in ("1", "true", "yes")
+COMPRESSION_ENCODINGS = [
+    encoding.strip() for encoding in os.getenv("COMPRESSION_ENCODINGS", "zstd,br,gzip").split(",") if encoding.strip()
+]
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+COMPRESSION_THREAD_BYTES = int(os.getenv("COMPRESSION_THREAD_BYTES", str(256 * 1024)))
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "5"))
+COMPRESSION_ZSTD_LEVEL = int(os.getenv("COMPRESSION_ZSTD_LEVEL", "3"))
+
+# Text-like bodies only; images, video, audio and archives are already compressed.
+COMPRESSIBLE_TYPES = {
+    "application/json",
+    "application/javascript",
+    "application/xml",
+    "application/vnd.apple.mpegurl",
+    "application/x-mpegurl",
+    "image/svg+xml",
+}
+
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """
+    The COMPRESSION_ENCODINGS entry the client accepts with the highest q-value, ties
+    going to the order of COMPRESSION_ENCODINGS; None for identity.
+    """
+    offered = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if name.strip():
+            offered[name.strip().lower()] = quality
+
+    best, best_quality = None, 0.0
+    for encoding in COMPRESSION_ENCODINGS:
+        quality = offered.get(encoding, offered.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def is_compressible(status: int, headers) -> bool:
+    if status < 200 or status in (204, 304) or "content-encoding" in headers or "content-range" in headers:
+        return False
+    content_type = headers.get("content-type", "").split(";")[0].strip().lower()
+    return content_type.startswith("text/") or content_type in COMPRESSIBLE_TYPES
+
+
+class StreamCompressor:
+    """
+    Incremental gzip/br/zstd encoder for one response. Chunks of at least
+    COMPRESSION_THREAD_BYTES are compressed in the thread pool so a large feed page
+    does not hold up the event loop; smaller ones are cheaper to do inline.
+    """
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "gzip":
+            self.compressor = zlib.compressobj(COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 31)
+        elif encoding == "br":
+            self.compressor = brotli.Compressor(quality=COMPRESSION_BROTLI_QUALITY)
+        elif encoding == "zstd":
+            self.compressor = zstandard.ZstdCompressor(level=COMPRESSION_ZSTD_LEVEL).compressobj()
+        else:
+            raise ValueError(f"Unsupported encoding: {encoding}")
+
+    def compress_sync(self, data: bytes, final: bool) -> bytes:
+        if self.encoding == "br":
+            out = self.compressor.process(data)
+            return out + self.compressor.finish() if final else out
+        out = self.compressor.compress(data)
+        return out + self.compressor.flush() if final else out
+
+    async def compress(self, data: bytes, final: bool) -> bytes:
+        if len(data) >= COMPRESSION_THREAD_BYTES:
+            return await run_in_threadpool(self.compress_sync, data, final)
+        return self.compress_sync(data, final)
+
+
+class CompressionStats:
+    """
+    Bytes before and after compression per route template, to see which endpoints
+    compression pays for and tune COMPRESSION_MIN_BYTES.
+    """
+
+    def __init__(self):
+        self.routes = {}
+
+    def record(self, route: str, encoding: Optional[str], bytes_before: int, bytes_after: int):
+        entry = self.routes.setdefault(route, {
+            "responses": 0, "compressed": 0, "bytes_before": 0, "bytes_after": 0, "encodings": {},
+        })
+        entry["responses"] += 1
+        entry["bytes_before"] += bytes_before
+        entry["bytes_after"] += bytes_after
+        if encoding:
+            entry["compressed"] += 1
+            entry["encodings"][encoding] = entry["encodings"].get(encoding, 0) + 1
+
+    def stats(self) -> dict:
+        return {
+            route: {**entry, "ratio": round(entry["bytes_after"] / entry["bytes_before"], 4) if entry["bytes_before"] else None}
+            for route, entry in sorted(self.routes.items())
+        }
+
+
+compression_stats = CompressionStats()
+
+
+class CompressionMiddleware:
+    """
+    Compresses text-like responses with the best encoding the client accepts. Bodies
+    sent in one message below COMPRESSION_MIN_BYTES go out as they are; streamed
+    bodies are compressed chunk by chunk and lose their Content-Length.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        state = {"start": None, "compressor": None, "bytes_before": 0, "bytes_after": 0}
+
+        async def send_compressed(message):
+            if message["type"] == "http.response.start":
+                state["start"] = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            start, state["start"] = state["start"], None
+
+            if start is not None:
+                headers = MutableHeaders(raw=start["headers"])
+                if (
+                    encoding
+                    and is_compressible(start["status"], headers)
+                    and (more_body or len(body) >= COMPRESSION_MIN_BYTES)
+                ):
+                    state["compressor"] = StreamCompressor(encoding)
+                    headers["Content-Encoding"] = encoding
+                    headers.add_vary_header("Accept-Encoding")
+                    if "content-length" in headers:
+                        del headers["content-length"]
+                    etag = headers.get("etag")
+                    if etag and not etag.startswith("W/"):
+                        headers["ETag"] = f"W/{etag}"
+
+            compressor = state["compressor"]
+            state["bytes_before"] += len(body)
+            if compressor is not None:
+                body = await compressor.compress(body, final=not more_body)
+            state["bytes_after"] += len(body)
+
+            if start is not None:
+                if compressor is not None and not more_body:
+                    headers["Content-Length"] = str(len(body))
+                await send(start)
+            await send({**message, "body": body})
+
+            if not more_body:
+                route = scope.get("route")
+                compression_stats.record(
+                    route.path if route is not None else "<unmatched>",
+                    compressor.encoding if compressor is not None else None,
+                    state["bytes_before"],
+                    state["bytes_after"],
+                )
+
+        await self.app(scope, receive, send_compressed)
+
+
+if COMPRESSION_ENABLED:
+    app.add_middleware(CompressionMiddleware)
+
+
+@app.get("/internal/compression-stats")
+async def get_compression_stats():
+    """
+    Response bytes before/after compression per route since the process started.
+    """
+    return compression_stats.stats()
+
+
 pool = None
 
+
+DB_SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", "200"))
+# aiomysql only speaks the text protocol, so a prepared statement is PREPAREd once
+# per connection but each call costs a SET of its parameters plus the EXECUTE: two
+# round trips instead of one. It pays off only where parsing and planning dominate.
+DB_PREPARED_STATEMENTS = os.getenv("DB_PREPARED_STATEMENTS", "false").lower() in ("1", "true", "yes")
+QUERY_TIME_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+
+class NamedQuery:
+    def __init__(self, name: str, sql: str, prepared: bool = False):
+        self.name = name
+        self.sql = sql
+        self.prepared = prepared
+
+
+QUERIES = {}
+
+
+def register_query(name: str, sql: str, prepared: bool = False) -> str:
+    """
+    Register `sql` (pyformat %s parameters) under `name` for run_query/db_fetch.
+    `sql` may also hold {fragments} (IN-list placeholders, keyset_filter conditions)
+    that the caller fills in per call. `prepared` marks the hot lookups worth a
+    server-side prepared statement when DB_PREPARED_STATEMENTS is on.
+    """
+    if name in QUERIES:
+        raise ValueError(f"Query {name!r} is already registered")
+    QUERIES[name] = NamedQuery(name, " ".join(sql.split()), prepared)
+    return name
+
+
+register_query("user_name", "SELECT username FROM user WHERE userid = %s", prepared=True)
+register_query("user_name_email", "SELECT username, emailaddress FROM user WHERE userid = %s", prepared=True)
+register_query("blocked_userids", "SELECT blockeduserid FROM user_blocked WHERE userid = %s", prepared=True)
+register_query("following", "SELECT otheruserid, type, groupid FROM iamfollowing WHERE myuserid = %s", prepared=True)
+# Counts read the counters maintained by bump_counter (see COUNTERS).
+register_query("comment_count", "SELECT commentcount AS comment_count FROM post WHERE postid = %s", prepared=True)
+register_query("like_count", "SELECT likecount AS like_count FROM post WHERE postid = %s", prepared=True)
+register_query("like_count_group", "SELECT likecount AS like_count FROM grouppost WHERE postid = %s", prepared=True)
+register_query("reply_count", "SELECT replycount AS replay_count FROM comment WHERE commentid = %s", prepared=True)
+register_query("popular_like_counts", """
+    SELECT postid, likecount AS like_count
+    FROM post
+    WHERE likecount > 0
+    ORDER BY likecount DESC LIMIT 10
+""")
+
+
+class QueryStats:
+    """
+    Per query name: calls, rows, approximate result bytes, total/max wall time and a
+    histogram of wall times over QUERY_TIME_BUCKETS_MS (the last bucket is +Inf).
+    """
+
+    def __init__(self):
+        self.queries = {}
+
+    def record(self, name: str, elapsed_ms: float, rows: int, nbytes: int):
+        entry = self.queries.get(name)
+        if entry is None:
+            entry = self.queries[name] = {
+                "calls": 0, "rows": 0, "bytes": 0, "total_ms": 0.0, "max_ms": 0.0, "slow": 0,
+                "buckets": [0] * (len(QUERY_TIME_BUCKETS_MS) + 1),
+            }
+        entry["calls"] += 1
+        entry["rows"] += rows
+        entry["bytes"] += nbytes
+        entry["total_ms"] += elapsed_ms
+        entry["max_ms"] = max(entry["max_ms"], elapsed_ms)
+        if elapsed_ms >= DB_SLOW_QUERY_MS:
+            entry["slow"] += 1
+        for index, bound in enumerate(QUERY_TIME_BUCKETS_MS):
+            if elapsed_ms <= bound:
+                entry["buckets"][index] += 1
+                break
+        else:
+            entry["buckets"][-1] += 1
+
+    def stats(self) -> dict:
+        labels = [f"le_{bound}ms" for bound in QUERY_TIME_BUCKETS_MS] + ["inf"]
+        return {
+            name: {
+                "calls": entry["calls"],
+                "rows": entry["rows"],
+                "bytes": entry["bytes"],
+                "total_ms": round(entry["total_ms"], 3),
+                "avg_ms": round(entry["total_ms"] / entry["calls"], 3),
+                "max_ms": round(entry["max_ms"], 3),
+                "slow": entry["slow"],
+                "prepared": QUERIES[name].prepared and DB_PREPARED_STATEMENTS,
+                "histogram": dict(zip(labels, entry["buckets"])),
+            }
+            for name, entry in sorted(self.queries.items())
+        }
+
+
+query_stats = QueryStats()
+prepared_statements = weakref.WeakKeyDictionary()
+
+
+def estimate_result_bytes(rows) -> int:
+    """
+    Rough payload size of a result: string and blob lengths, 8 bytes for anything else.
+    """
+    total = 0
+    for row in rows:
+        for value in (row.values() if isinstance(row, dict) else row):
+            if isinstance(value, (bytes, bytearray, str)):
+                total += len(value)
+            elif value is not None:
+                total += 8
+    return total
+
+
+async def execute_prepared(cursor, query: NamedQuery, args):
+    """
+    EXECUTE `query` as a server-side prepared statement on the cursor's connection,
+    PREPAREing it the first time this connection runs it.
+    """
+    statement = f"stmt_{query.name}"
+    prepared = prepared_statements.setdefault(cursor.connection, set())
+    if query.name not in prepared:
+        await cursor.execute(f"PREPARE {statement} FROM %s", (query.sql.replace("%s", "?").replace("%%", "%"),))
+        prepared.add(query.name)
+
+    variables = [f"@{statement}_{index}" for index in range(len(args))]
+    if variables:
+        await cursor.execute("SET " + ", ".join(f"{variable} = %s" for variable in variables), args)
+    using = f" USING {', '.join(variables)}" if variables else ""
+    try:
+        await cursor.execute(f"EXECUTE {statement}{using}")
+    except aiomysql.Error as err:
+        # 1243: unknown prepared statement, e.g. after the connection reconnected.
+        if not err.args or err.args[0] != 1243:
+            raise
+        prepared.discard(query.name)
+        await cursor.execute(f"PREPARE {statement} FROM %s", (query.sql.replace("%s", "?").replace("%%", "%"),))
+        prepared.add(query.name)
+        await cursor.execute(f"EXECUTE {statement}{using}")
+
+
+def record_query(name: str, elapsed_ms: float, rows: int, nbytes: int):
+    query_stats.record(name, elapsed_ms, rows, nbytes)
+    if elapsed_ms >= DB_SLOW_QUERY_MS:
+        print(f"Slow query {name}: {elapsed_ms:.1f} ms, {rows} rows")
+
+
+async def run_query(cursor, name: str, args=(), fetch: Optional[str] = "all", **fragments):
+    """
+    Run the registered query `name` on `cursor` and record its timing, row count and
+    result size. `fetch` is "all" (list of rows), "one" (row or None) or None (for
+    writes; returns the affected row count). `fragments` fill in the query's
+    {placeholders}; such queries are never prepared, their text varies per call.
+    """
+    query = QUERIES[name]
+    started = time.perf_counter()
+    if query.prepared and DB_PREPARED_STATEMENTS and not fragments:
+        await execute_prepared(cursor, query, args)
+    else:
+        await cursor.execute(query.sql.format(**fragments) if fragments else query.sql, args)
+
+    if fetch == "all":
+        result = await cursor.fetchall()
+        rows, nbytes = len(result), estimate_result_bytes(result)
+    elif fetch == "one":
+        result = await cursor.fetchone()
+        rows, nbytes = (1, estimate_result_bytes([result])) if result else (0, 0)
+    else:
+        result = rows = cursor.rowcount
+        nbytes = 0
+
+    record_query(name, (time.perf_counter() - started) * 1000, rows, nbytes)
+    return result
+
+
+async def db_fetch(name: str, args=(), fetch: Optional[str] = "all", replica: bool = False):
+    """
+    run_query on a pooled connection and DictCursor of its own, for handlers that
+    need a single query. `replica` routes a read-only query through read_pool().
+    """
+    async with (read_pool() if replica else pool).acquire() as conn:
+        async with conn.cursor(aiomysql.DictCursor) as cursor:
+            return await run_query(cursor, name, args, fetch)
+
+
+@app.get("/internal/db-stats")
+async def get_db_stats():
+    """
+    Connection pool usage and acquire-wait histogram, replica lag and routing, and
+    per named query call counts, rows, bytes and wall-time histograms since the
+    process started.
+    """
+    return {
+        "pool": pool.stats() if pool is not None else None,
+        "replica": replica_monitor.stats() if replica_pool is not None else None,
+        "queries": query_stats.stats(),
+    }
+
  
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    global pool
+    global pool, replica_pool
  
-    pool = await aiomysql.create_pool(**async_db_config)
-    print("Database pool created.")
+    pool = await create_db_pool()
+    print(f"Database pool created ({async_db_config['minsize']}-{async_db_config['maxsize']} connections).")
+    if DB_REPLICA_HOST:
+        replica_pool = InstrumentedPool(await aiomysql.create_pool(**replica_db_config), replica=True)
+        await replica_monitor.start()
     await create_tables()
+    if TRANSCODE_WORKER_ENABLED:
+        await transcode_worker.start()
     try:
         
         yield
     finally:
   
+        if TRANSCODE_WORKER_ENABLED:
+            await transcode_worker.stop()
+        if replica_pool is not None:
+            await replica_monitor.stop()
+            replica_pool.terminate()
+            await replica_pool.wait_closed()
         pool.terminate()
         await pool.wait_closed()
         print("Database pool terminated.")
@@ -94,268 +892,319 @@ app.router.lifespan_context = lifespan
 
 
 
+async def add_missing_columns(cursor, table: str, columns):
+    """
+    Add columns introduced after a table was first created. CREATE TABLE IF NOT EXISTS
+    leaves existing tables untouched, so new columns are patched in here. Returns
+    the names of the columns that were added.
+    """
+    await cursor.execute("""
+        SELECT COLUMN_NAME FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+    """, (table,))
+    existing_columns = {row[0] for row in await cursor.fetchall()}
+
+    added = []
+    for column, definition in columns:
+        if column not in existing_columns:
+            await cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+            print(f"Column '{table}.{column}' added.")
+            added.append(column)
+    return added
+
+
+
+
+async def add_missing_indexes(cursor, table: str, indexes):
+    """
+    Same as add_missing_columns, for indexes added to existing tables.
+    """
+    await cursor.execute("""
+        SELECT DISTINCT INDEX_NAME FROM information_schema.STATISTICS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+    """, (table,))
+    existing_indexes = {row[0] for row in await cursor.fetchall()}
+
+    for index, columns in indexes:
+        if index not in existing_indexes:
+            await cursor.execute(f"ALTER TABLE {table} ADD INDEX {index} ({columns})")
+            print(f"Index '{table}.{index}' added.")
+
+
+
+
 async def create_tables():
     try:
-        async with aiomysql.create_pool(**async_db_config) as pool:
-            async with pool.acquire() as conn:
-                async with conn.cursor() as cursor:
+        async with pool.acquire() as conn:
+            async with conn.cursor() as cursor:
 
                     
-                    create_comment_table_query = """
-                    CREATE TABLE IF NOT EXISTS comment (
-                        commentid INT(11) NOT NULL AUTO_INCREMENT,
-                        postid INT(11) DEFAULT NULL,
-                        userid INT(11) DEFAULT NULL,
-                        text VARCHAR(5000) DEFAULT NULL,
-                        commenteddate DATETIME DEFAULT NULL,
-                        username VARCHAR(100) DEFAULT NULL,
-                        userprofile LONGBLOB DEFAULT NULL,
-                        scrollposition INT(11) DEFAULT NULL,
-                        n_or_g TINYTEXT DEFAULT NULL, 
-                        commentimage LONGBLOB DEFAULT NULL,
-                        PRIMARY KEY (commentid),
-                        KEY postid (postid),
-                        KEY userid (userid),
-                        CONSTRAINT comment_ibfk_1 FOREIGN KEY (postid) REFERENCES post (postid),
-                        CONSTRAINT comment_ibfk_2 FOREIGN KEY (userid) REFERENCES user (userid)
-                    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
-                    """
-                    await cursor.execute(create_comment_table_query)
-                    print("Table 'comment' created successfully.")
-                    
-                    
-                    
-                    
-                    create_commentreply_table_query = """
-                    CREATE TABLE IF NOT EXISTS commentreply (
-                        commentreplayid INT(11) NOT NULL AUTO_INCREMENT,
-                        commentid INT(11) DEFAULT NULL,
-                        postid INT(11) DEFAULT NULL,
-                        userid INT(11) DEFAULT NULL,
-                        username VARCHAR(100) DEFAULT NULL,
-                        text VARCHAR(1000) DEFAULT NULL,
-                        replayeddate DATETIME DEFAULT NULL,
-                        userprofile LONGBLOB DEFAULT NULL,
-                        n_or_g TINYTEXT DEFAULT NULL,
-                        PRIMARY KEY (commentreplayid),
-                        KEY commentid (commentid),
-                        CONSTRAINT commentreply_ibfk_1 FOREIGN KEY (commentid) REFERENCES comment (commentid) ON DELETE CASCADE
-                    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
-                    """
-                    await cursor.execute(create_commentreply_table_query)
-                    print("Table 'commentreply' created successfully.")
-                    
-                    
-                    
-                    
-                    
-                    create_forgetpassword_table_query = """
-                    CREATE TABLE IF NOT EXISTS forgetpassword (
-                        forgetpasswordtid INT(11) NOT NULL AUTO_INCREMENT,
-                        userid INT(11) NOT NULL,
-                        code VARCHAR(100) NOT NULL,
-                        emailaddress VARCHAR(1000) DEFAULT NULL,
-                        expiredornot VARCHAR(100) NOT NULL,
-                        sentdate DATETIME DEFAULT CURRENT_TIMESTAMP,
-                        PRIMARY KEY (forgetpasswordtid),
-                        KEY userid (userid),
-                        CONSTRAINT forgetpassword_ibfk_1 FOREIGN KEY (userid) REFERENCES user (userid) ON DELETE CASCADE
-                    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
-                    """
-                    await cursor.execute(create_forgetpassword_table_query)
-                    print("Table 'forgetpassword' created successfully.")
-                    
-                    
-                    
-                    
-                    
-                    create_groupcomment_table_query = """
-                    CREATE TABLE IF NOT EXISTS groupcomment (
-                        commentid INT(11) NOT NULL AUTO_INCREMENT,
-                        postid INT(11) DEFAULT NULL,
-                        userid INT(11) DEFAULT NULL,
-                        text VARCHAR(5000) DEFAULT NULL,
-                        commenteddate DATETIME DEFAULT NULL,
-                        username VARCHAR(100) DEFAULT NULL,
-                        userprofile LONGBLOB DEFAULT NULL,
-                        n_or_g TINYTEXT DEFAULT NULL, 
-                        commentimage LONGBLOB DEFAULT NULL,
-                        PRIMARY KEY (commentid),
-                        KEY userid (userid),
-                        KEY postid (postid),
-                        CONSTRAINT groupcomment_ibfk_1 FOREIGN KEY (userid) REFERENCES user (userid),
-                        CONSTRAINT groupcomment_ibfk_2 FOREIGN KEY (postid) REFERENCES grouppost (postid)
-                    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
-                    """
-                    await cursor.execute(create_groupcomment_table_query)
-                    print("Table 'groupcomment' created successfully.")
-                    
-                    
-                    
-                    
+                create_comment_table_query = """
+                CREATE TABLE IF NOT EXISTS comment (
+                    commentid INT(11) NOT NULL AUTO_INCREMENT,
+                    postid INT(11) DEFAULT NULL,
+                    userid INT(11) DEFAULT NULL,
+                    text VARCHAR(5000) DEFAULT NULL,
+                    commenteddate DATETIME DEFAULT NULL,
+                    username VARCHAR(100) DEFAULT NULL,
+                    scrollposition INT(11) DEFAULT NULL,
+                    n_or_g TINYTEXT DEFAULT NULL, 
+                    commentimage LONGBLOB DEFAULT NULL,
+                    replycount INT(11) NOT NULL DEFAULT 0,
+                    PRIMARY KEY (commentid),
+                    KEY postid (postid),
+                    KEY userid (userid),
+                    CONSTRAINT comment_ibfk_1 FOREIGN KEY (postid) REFERENCES post (postid),
+                    CONSTRAINT comment_ibfk_2 FOREIGN KEY (userid) REFERENCES user (userid)
+                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+                """
+                await cursor.execute(create_comment_table_query)
+                print("Table 'comment' created successfully.")
+                    
+                    
+                    
+                    
+                create_commentreply_table_query = """
+                CREATE TABLE IF NOT EXISTS commentreply (
+                    commentreplayid INT(11) NOT NULL AUTO_INCREMENT,
+                    commentid INT(11) DEFAULT NULL,
+                    postid INT(11) DEFAULT NULL,
+                    userid INT(11) DEFAULT NULL,
+                    username VARCHAR(100) DEFAULT NULL,
+                    text VARCHAR(1000) DEFAULT NULL,
+                    replayeddate DATETIME DEFAULT NULL,
+                    n_or_g TINYTEXT DEFAULT NULL,
+                    PRIMARY KEY (commentreplayid),
+                    KEY commentid (commentid),
+                    CONSTRAINT commentreply_ibfk_1 FOREIGN KEY (commentid) REFERENCES comment (commentid) ON DELETE CASCADE
+                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+                """
+                await cursor.execute(create_commentreply_table_query)
+                print("Table 'commentreply' created successfully.")
                     
                     
                     
-                    create_groupcommentreplay_table_query = """
-                    CREATE TABLE IF NOT EXISTS groupcommentreplay (
-                        commentreplayid INT(11) NOT NULL AUTO_INCREMENT,
-                        commentid INT(11) DEFAULT NULL,
-                        postid INT(11) DEFAULT NULL,
-                        userid INT(11) DEFAULT NULL,
-                        username VARCHAR(100) DEFAULT NULL,
-                        text VARCHAR(1000) DEFAULT NULL,
-                        replayeddate DATETIME DEFAULT NULL,
-                        userprofile LONGBLOB DEFAULT NULL,
-                        n_or_g TINYTEXT DEFAULT NULL, 
-                        PRIMARY KEY (commentreplayid),
-                        KEY userid (userid),
-                        KEY postid (postid),
-                        CONSTRAINT groupcommentreplay_ibfk_1 FOREIGN KEY (userid) REFERENCES user (userid),
-                        CONSTRAINT groupcommentreplay_ibfk_2 FOREIGN KEY (postid) REFERENCES grouppost (postid)
-                    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
-                    """
-                    await cursor.execute(create_groupcommentreplay_table_query)
-                    print("Table 'groupcommentreplay' created successfully.")
                     
                     
+                create_forgetpassword_table_query = """
+                CREATE TABLE IF NOT EXISTS forgetpassword (
+                    forgetpasswordtid INT(11) NOT NULL AUTO_INCREMENT,
+                    userid INT(11) NOT NULL,
+                    code VARCHAR(100) NOT NULL,
+                    emailaddress VARCHAR(1000) DEFAULT NULL,
+                    expiredornot VARCHAR(100) NOT NULL,
+                    sentdate DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (forgetpasswordtid),
+                    KEY userid (userid),
+                    CONSTRAINT forgetpassword_ibfk_1 FOREIGN KEY (userid) REFERENCES user (userid) ON DELETE CASCADE
+                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+                """
+                await cursor.execute(create_forgetpassword_table_query)
+                print("Table 'forgetpassword' created successfully.")
+                    
+                    
+                    
+                    
+                    
+                create_groupcomment_table_query = """
+                CREATE TABLE IF NOT EXISTS groupcomment (
+                    commentid INT(11) NOT NULL AUTO_INCREMENT,
+                    postid INT(11) DEFAULT NULL,
+                    userid INT(11) DEFAULT NULL,
+                    text VARCHAR(5000) DEFAULT NULL,
+                    commenteddate DATETIME DEFAULT NULL,
+                    username VARCHAR(100) DEFAULT NULL,
+                    n_or_g TINYTEXT DEFAULT NULL, 
+                    commentimage LONGBLOB DEFAULT NULL,
+                    replycount INT(11) NOT NULL DEFAULT 0,
+                    PRIMARY KEY (commentid),
+                    KEY userid (userid),
+                    KEY postid (postid),
+                    CONSTRAINT groupcomment_ibfk_1 FOREIGN KEY (userid) REFERENCES user (userid),
+                    CONSTRAINT groupcomment_ibfk_2 FOREIGN KEY (postid) REFERENCES grouppost (postid)
+                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+                """
+                await cursor.execute(create_groupcomment_table_query)
+                print("Table 'groupcomment' created successfully.")
                     
                     
-                    create_groupimage_table_query = """
-                    CREATE TABLE IF NOT EXISTS groupimage (
-                        imageid INT(11) NOT NULL AUTO_INCREMENT,
-                        postid INT(11) DEFAULT NULL,
-                        image LONGBLOB DEFAULT NULL,
-                        PRIMARY KEY (imageid),
-                        KEY postid (postid),
-                        CONSTRAINT groupimage_ibfk_1 FOREIGN KEY (postid) REFERENCES grouppost (postid)
-                    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
-                    """
-                    await cursor.execute(create_groupimage_table_query)
-                    print("Table 'groupimage' created successfully.")
                     
                     
                     
                     
-                    create_groupmembercount_table_query = """
-                    CREATE TABLE IF NOT EXISTS groupmembercount (
-                        groupmembercountid INT(11) NOT NULL AUTO_INCREMENT,
-                        groupid INT(11) DEFAULT NULL,
-                        groupownerid INT(11) DEFAULT NULL,
-                        grouptype VARCHAR(100) NOT NULL,
-                        groupname VARCHAR(100) DEFAULT NULL,
-                        groupimage LONGBLOB DEFAULT NULL,
-                        members INT(11) DEFAULT NULL,
-                        PRIMARY KEY (groupmembercountid)
-                    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
-                    """
-                    await cursor.execute(create_groupmembercount_table_query)
-                    print("Table 'groupmembercount' created successfully.")
                     
+                create_groupcommentreplay_table_query = """
+                CREATE TABLE IF NOT EXISTS groupcommentreplay (
+                    commentreplayid INT(11) NOT NULL AUTO_INCREMENT,
+                    commentid INT(11) DEFAULT NULL,
+                    postid INT(11) DEFAULT NULL,
+                    userid INT(11) DEFAULT NULL,
+                    username VARCHAR(100) DEFAULT NULL,
+                    text VARCHAR(1000) DEFAULT NULL,
+                    replayeddate DATETIME DEFAULT NULL,
+                    n_or_g TINYTEXT DEFAULT NULL, 
+                    PRIMARY KEY (commentreplayid),
+                    KEY userid (userid),
+                    KEY postid (postid),
+                    CONSTRAINT groupcommentreplay_ibfk_1 FOREIGN KEY (userid) REFERENCES user (userid),
+                    CONSTRAINT groupcommentreplay_ibfk_2 FOREIGN KEY (postid) REFERENCES grouppost (postid)
+                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+                """
+                await cursor.execute(create_groupcommentreplay_table_query)
+                print("Table 'groupcommentreplay' created successfully.")
+                    
+                    
+                    
+                    
+                create_groupimage_table_query = """
+                CREATE TABLE IF NOT EXISTS groupimage (
+                    imageid INT(11) NOT NULL AUTO_INCREMENT,
+                    postid INT(11) DEFAULT NULL,
+                    image LONGBLOB DEFAULT NULL,
+                    mediakey CHAR(64) DEFAULT NULL,
+                    mediasize BIGINT(20) DEFAULT NULL,
+                    mediatype VARCHAR(100) DEFAULT NULL,
+                    width INT(11) DEFAULT NULL,
+                    height INT(11) DEFAULT NULL,
+                    placeholder VARCHAR(1000) DEFAULT NULL,
+                    PRIMARY KEY (imageid),
+                    KEY postid (postid),
+                    KEY mediakey (mediakey),
+                    CONSTRAINT groupimage_ibfk_1 FOREIGN KEY (postid) REFERENCES grouppost (postid)
+                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+                """
+                await cursor.execute(create_groupimage_table_query)
+                print("Table 'groupimage' created successfully.")
                     
                     
                     
                     
-                    create_grouppost_table_query = """
-                    CREATE TABLE IF NOT EXISTS grouppost (
-                        postid INT(11) NOT NULL AUTO_INCREMENT,
-                        groupid INT(11) DEFAULT NULL,
-                        userid INT(11) DEFAULT NULL,
-                        username VARCHAR(100) DEFAULT NULL,
-                        postdescription VARCHAR(1000) DEFAULT NULL,
-                        posteddate DATETIME DEFAULT NULL,
-                        posttype VARCHAR(50) DEFAULT NULL,
-                        post LONGBLOB DEFAULT NULL,
-                        userprofile LONGBLOB DEFAULT NULL,
-                        filepath VARCHAR(1000) DEFAULT NULL,
-                        groupname VARCHAR(1000) DEFAULT NULL,
-                        textcolor VARCHAR(50) DEFAULT NULL,
-                        textbody VARCHAR(1000) DEFAULT NULL,
-                        popularcount INT(255) DEFAULT NULL,
-                        thelink VARCHAR(1000) DEFAULT NULL,
-                        n_or_g VARCHAR(5) NOT NULL DEFAULT 'g',
-                        PRIMARY KEY (postid),
-                        KEY (userid),
-                        KEY (groupid),
-                        CONSTRAINT `grouppost_ibfk_1` FOREIGN KEY (`userid`) REFERENCES `user` (`userid`),
-                        CONSTRAINT `grouppost_ibfk_2` FOREIGN KEY (`groupid`) REFERENCES `groups` (`groupid`)
-                    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
-                     """
+                create_groupmembercount_table_query = """
+                CREATE TABLE IF NOT EXISTS groupmembercount (
+                    groupmembercountid INT(11) NOT NULL AUTO_INCREMENT,
+                    groupid INT(11) DEFAULT NULL,
+                    groupownerid INT(11) DEFAULT NULL,
+                    grouptype VARCHAR(100) NOT NULL,
+                    groupname VARCHAR(100) DEFAULT NULL,
+                    groupimage LONGBLOB DEFAULT NULL,
+                    members INT(11) DEFAULT NULL,
+                    PRIMARY KEY (groupmembercountid)
+                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+                """
+                await cursor.execute(create_groupmembercount_table_query)
+                print("Table 'groupmembercount' created successfully.")
+                    
+                    
+                    
+                    
+                    
+                create_grouppost_table_query = """
+                CREATE TABLE IF NOT EXISTS grouppost (
+                    postid INT(11) NOT NULL AUTO_INCREMENT,
+                    groupid INT(11) DEFAULT NULL,
+                    userid INT(11) DEFAULT NULL,
+                    username VARCHAR(100) DEFAULT NULL,
+                    postdescription VARCHAR(1000) DEFAULT NULL,
+                    posteddate DATETIME DEFAULT NULL,
+                    posttype VARCHAR(50) DEFAULT NULL,
+                    post LONGBLOB DEFAULT NULL,
+                    filepath VARCHAR(1000) DEFAULT NULL,
+                    groupname VARCHAR(1000) DEFAULT NULL,
+                    textcolor VARCHAR(50) DEFAULT NULL,
+                    textbody VARCHAR(1000) DEFAULT NULL,
+                    popularcount INT(255) DEFAULT NULL,
+                    thelink VARCHAR(1000) DEFAULT NULL,
+                    n_or_g VARCHAR(5) NOT NULL DEFAULT 'g',
+                    mediakey CHAR(64) DEFAULT NULL,
+                    mediasize BIGINT(20) DEFAULT NULL,
+                    mediatype VARCHAR(100) DEFAULT NULL,
+                    mediastatus VARCHAR(20) NOT NULL DEFAULT 'ready',
+                    posterkey CHAR(64) DEFAULT NULL,
+                    previewkey CHAR(64) DEFAULT NULL,
+                    placeholder VARCHAR(1000) DEFAULT NULL,
+                    likecount INT(11) NOT NULL DEFAULT 0,
+                    commentcount INT(11) NOT NULL DEFAULT 0,
+                    PRIMARY KEY (postid),
+                    KEY (userid),
+                    KEY (groupid),
+                    CONSTRAINT `grouppost_ibfk_1` FOREIGN KEY (`userid`) REFERENCES `user` (`userid`),
+                    CONSTRAINT `grouppost_ibfk_2` FOREIGN KEY (`groupid`) REFERENCES `groups` (`groupid`)
+                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+                 """
 
            
-                    await cursor.execute(create_grouppost_table_query)
-                    print("Table 'grouppost' created successfully.")
+                await cursor.execute(create_grouppost_table_query)
+                print("Table 'grouppost' created successfully.")
                     
                     
                     
                     
                     
-                    create_groups_table_query = """
-                    CREATE TABLE IF NOT EXISTS groups (
-                        groupid INT(11) NOT NULL AUTO_INCREMENT,
-                        groupownerid INT(11) NOT NULL,
-                        groupname VARCHAR(100) NOT NULL,
-                        grouptype VARCHAR(100) DEFAULT NULL,
-                        groupimage LONGBLOB DEFAULT NULL,
-                        groupimageupdateddate DATETIME DEFAULT NULL,
-                        groupbackgroundimage LONGBLOB DEFAULT NULL,
-                        groupbackgroundimageupdateddate DATETIME DEFAULT NULL,
-                        createdate DATETIME DEFAULT CURRENT_TIMESTAMP,
-                        PRIMARY KEY (groupid)
-                    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
-                     """
+                create_groups_table_query = """
+                CREATE TABLE IF NOT EXISTS groups (
+                    groupid INT(11) NOT NULL AUTO_INCREMENT,
+                    groupownerid INT(11) NOT NULL,
+                    groupname VARCHAR(100) NOT NULL,
+                    grouptype VARCHAR(100) DEFAULT NULL,
+                    groupimage LONGBLOB DEFAULT NULL,
+                    groupimageupdateddate DATETIME DEFAULT NULL,
+                    groupbackgroundimage LONGBLOB DEFAULT NULL,
+                    groupbackgroundimageupdateddate DATETIME DEFAULT NULL,
+                    createdate DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (groupid)
+                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+                 """
 
  
-                    await cursor.execute(create_groups_table_query)
-                    print("Table 'groups' created successfully.")
+                await cursor.execute(create_groups_table_query)
+                print("Table 'groups' created successfully.")
                     
                     
                     
                     
                     
-                    create_group_post_like_table_query = """
-                    CREATE TABLE IF NOT EXISTS group_post_like (
-                        likeid INT(11) NOT NULL AUTO_INCREMENT,
-                        postid INT(11) DEFAULT NULL,
-                        userid INT(11) DEFAULT NULL,
-                        currentuserid INT(11) DEFAULT NULL,
-                        username VARCHAR(100) DEFAULT NULL,
-                        profileimage LONGBLOB DEFAULT NULL,
-                        PRIMARY KEY (likeid),
-                        KEY postid (postid),
-                        KEY userid (userid),
-                        CONSTRAINT group_post_like_ibfk_1 FOREIGN KEY (postid) REFERENCES grouppost (postid),
-                        CONSTRAINT group_post_like_ibfk_2 FOREIGN KEY (userid) REFERENCES user (userid)
-                    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
-                     """
+                create_group_post_like_table_query = """
+                CREATE TABLE IF NOT EXISTS group_post_like (
+                    likeid INT(11) NOT NULL AUTO_INCREMENT,
+                    postid INT(11) DEFAULT NULL,
+                    userid INT(11) DEFAULT NULL,
+                    currentuserid INT(11) DEFAULT NULL,
+                    username VARCHAR(100) DEFAULT NULL,
+                    PRIMARY KEY (likeid),
+                    KEY postid (postid),
+                    KEY userid (userid),
+                    CONSTRAINT group_post_like_ibfk_1 FOREIGN KEY (postid) REFERENCES grouppost (postid),
+                    CONSTRAINT group_post_like_ibfk_2 FOREIGN KEY (userid) REFERENCES user (userid)
+                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+                 """
 
              
-                    await cursor.execute(create_group_post_like_table_query)
-                    print("Table 'group_post_like' created successfully.")
-                    
-                    
-                    
-                    
-                    create_group_users_table_query = """
-                    CREATE TABLE IF NOT EXISTS group_users (
-                        groupuser_id INT(11) NOT NULL AUTO_INCREMENT,
-                        groupid INT(11) NOT NULL,
-                        userid INT(11) NOT NULL,
-                        profileimage LONGBLOB DEFAULT NULL,
-                        username VARCHAR(100) NOT NULL,
-                        usertype VARCHAR(100) NOT NULL,
-                        joined_date DATETIME DEFAULT CURRENT_TIMESTAMP,
-                        status TINYINT(4) NOT NULL DEFAULT 1,
-                        PRIMARY KEY (groupuser_id),
-                        KEY groupid (groupid),
-                        KEY userid (userid),
-                        CONSTRAINT group_users_ibfk_1 FOREIGN KEY (groupid) REFERENCES groups (groupid) ON DELETE CASCADE,
-                        CONSTRAINT group_users_ibfk_2 FOREIGN KEY (userid) REFERENCES user (userid) ON DELETE CASCADE
-                    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
-                     """
+                await cursor.execute(create_group_post_like_table_query)
+                print("Table 'group_post_like' created successfully.")
+                    
+                    
+                    
+                    
+                create_group_users_table_query = """
+                CREATE TABLE IF NOT EXISTS group_users (
+                    groupuser_id INT(11) NOT NULL AUTO_INCREMENT,
+                    groupid INT(11) NOT NULL,
+                    userid INT(11) NOT NULL,
+                    username VARCHAR(100) NOT NULL,
+                    usertype VARCHAR(100) NOT NULL,
+                    joined_date DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    status TINYINT(4) NOT NULL DEFAULT 1,
+                    PRIMARY KEY (groupuser_id),
+                    KEY groupid (groupid),
+                    KEY userid (userid),
+                    CONSTRAINT group_users_ibfk_1 FOREIGN KEY (groupid) REFERENCES groups (groupid) ON DELETE CASCADE,
+                    CONSTRAINT group_users_ibfk_2 FOREIGN KEY (userid) REFERENCES user (userid) ON DELETE CASCADE
+                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+                 """
 
             
-                    await cursor.execute(create_group_users_table_query)
-                    print("Table 'group_users' created successfully.")
+                await cursor.execute(create_group_users_table_query)
+                print("Table 'group_users' created successfully.")
                     
                     
                     
@@ -364,62 +1213,67 @@ async def create_tables():
                     
                     
                     
-                    create_iamfollowed_table_query = """
-                    CREATE TABLE IF NOT EXISTS iamfollowed (
-                        iamfollowedid INT(11) NOT NULL AUTO_INCREMENT,
-                        myuserid INT(11) DEFAULT NULL,
-                        otheruserid INT(11) DEFAULT NULL,
-                        username VARCHAR(100) NOT NULL,
-                        profile LONGBLOB DEFAULT NULL,
-                        date DATETIME DEFAULT NULL,
-                        PRIMARY KEY (iamfollowedid),
-                        KEY myuserid (myuserid),
-                        CONSTRAINT iamfollowed_ibfk_1 FOREIGN KEY (myuserid) REFERENCES user (userid) ON DELETE CASCADE
-                    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
-                     """
+                create_iamfollowed_table_query = """
+                CREATE TABLE IF NOT EXISTS iamfollowed (
+                    iamfollowedid INT(11) NOT NULL AUTO_INCREMENT,
+                    myuserid INT(11) DEFAULT NULL,
+                    otheruserid INT(11) DEFAULT NULL,
+                    username VARCHAR(100) NOT NULL,
+                    date DATETIME DEFAULT NULL,
+                    PRIMARY KEY (iamfollowedid),
+                    KEY myuserid (myuserid),
+                    CONSTRAINT iamfollowed_ibfk_1 FOREIGN KEY (myuserid) REFERENCES user (userid) ON DELETE CASCADE
+                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+                 """
 
           
-                    await cursor.execute(create_iamfollowed_table_query)
-                    print("Table 'iamfollowed' created successfully.")
+                await cursor.execute(create_iamfollowed_table_query)
+                print("Table 'iamfollowed' created successfully.")
                     
                     
                     
                     
                     
-                    create_iamfollowing_table_query = """
-                    CREATE TABLE IF NOT EXISTS iamfollowing (
-                        iamfollowingid INT(11) NOT NULL AUTO_INCREMENT,
-                        myuserid INT(11) DEFAULT NULL,
-                        otheruserid INT(11) DEFAULT NULL,
-                        username VARCHAR(100) DEFAULT NULL,
-                        profile LONGBLOB DEFAULT NULL,
-                        date DATETIME DEFAULT NULL,
-                        type VARCHAR(50) DEFAULT NULL,
-                        groupid INT(11) DEFAULT NULL,
-                        PRIMARY KEY (iamfollowingid),
-                        KEY myuserid (myuserid),
-                        CONSTRAINT iamfollowing_ibfk_1 FOREIGN KEY (myuserid) REFERENCES user (userid) ON DELETE CASCADE
-                    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
-                     """
+                create_iamfollowing_table_query = """
+                CREATE TABLE IF NOT EXISTS iamfollowing (
+                    iamfollowingid INT(11) NOT NULL AUTO_INCREMENT,
+                    myuserid INT(11) DEFAULT NULL,
+                    otheruserid INT(11) DEFAULT NULL,
+                    username VARCHAR(100) DEFAULT NULL,
+                    date DATETIME DEFAULT NULL,
+                    type VARCHAR(50) DEFAULT NULL,
+                    groupid INT(11) DEFAULT NULL,
+                    PRIMARY KEY (iamfollowingid),
+                    KEY myuserid (myuserid),
+                    CONSTRAINT iamfollowing_ibfk_1 FOREIGN KEY (myuserid) REFERENCES user (userid) ON DELETE CASCADE
+                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+                 """
 
-                    await cursor.execute(create_iamfollowing_table_query)
-                    print("Table 'iamfollowing' created successfully.")
+                await cursor.execute(create_iamfollowing_table_query)
+                print("Table 'iamfollowing' created successfully.")
                     
                     
                     
                     
-                    create_image_table_query = """
-                    CREATE TABLE IF NOT EXISTS image (
-                        imageid INT(11) NOT NULL AUTO_INCREMENT,
-                        postid INT(11) DEFAULT NULL,
-                        image LONGBLOB DEFAULT NULL,
-                        PRIMARY KEY (imageid),
-                        KEY postid (postid)
-                    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
-                     """
+                create_image_table_query = """
+                CREATE TABLE IF NOT EXISTS image (
+                    imageid INT(11) NOT NULL AUTO_INCREMENT,
+                    postid INT(11) DEFAULT NULL,
+                    image LONGBLOB DEFAULT NULL,
+                    mediakey CHAR(64) DEFAULT NULL,
+                    mediasize BIGINT(20) DEFAULT NULL,
+                    mediatype VARCHAR(100) DEFAULT NULL,
+                    width INT(11) DEFAULT NULL,
+                    height INT(11) DEFAULT NULL,
+                    placeholder VARCHAR(1000) DEFAULT NULL,
+                    PRIMARY KEY (imageid),
+                    KEY postid (postid),
+                    KEY mediakey (mediakey)
+                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+                 """
 
-                    await cursor.execute(create_image_table_query)
-                    print("Table 'image' created successfully.")
+                await cursor.execute(create_image_table_query)
+                print("Table 'image' created successfully.")
                     
                     
                     
@@ -427,49 +1281,47 @@ async def create_tables():
                     
                     
                     
-                    create_notification_table_query = """
-                    CREATE TABLE IF NOT EXISTS notification (
-                        notificationid INT(11) NOT NULL AUTO_INCREMENT,
-                        postid INT(11) DEFAULT NULL,
-                        postowneruserid INT(11) DEFAULT NULL,
-                        myuserid INT(11) DEFAULT NULL,
+                create_notification_table_query = """
+                CREATE TABLE IF NOT EXISTS notification (
+                    notificationid INT(11) NOT NULL AUTO_INCREMENT,
+                    postid INT(11) DEFAULT NULL,
+                    postowneruserid INT(11) DEFAULT NULL,
+                    myuserid INT(11) DEFAULT NULL,
+                    username VARCHAR(100) DEFAULT NULL,
+                    notificationtype VARCHAR(50) DEFAULT NULL,
+                    commenttext VARCHAR(1000) DEFAULT NULL,
+                    replaytext VARCHAR(1000) DEFAULT NULL,
+                    date DATETIME DEFAULT NULL,
+                    seenstatus TINYINT(4) DEFAULT NULL,
+                    groupid INT(11) DEFAULT NULL,
+                    groupname VARCHAR(100) DEFAULT NULL,
+                    n_or_g VARCHAR(5) NOT NULL DEFAULT 'n',
+                    PRIMARY KEY (notificationid),
+                    KEY postid (postid),
+                    KEY postowneruserid (postowneruserid),
+                    KEY myuserid (myuserid)
+                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+                 """
+
+                await cursor.execute(create_notification_table_query)
+                print("Table 'notification' created successfully.")
+                    
+                    
+                create_user_blocked_table_query = """
+                    CREATE TABLE IF NOT EXISTS user_blocked (
+                        blockedid INT(11) NOT NULL AUTO_INCREMENT,
+                        userid INT(11) DEFAULT NULL,
                         username VARCHAR(100) DEFAULT NULL,
-                        notificationtype VARCHAR(50) DEFAULT NULL,
-                        commenttext VARCHAR(1000) DEFAULT NULL,
-                        replaytext VARCHAR(1000) DEFAULT NULL,
-                        date DATETIME DEFAULT NULL,
-                        userprofile LONGBLOB DEFAULT NULL,
-                        seenstatus TINYINT(4) DEFAULT NULL,
-                        groupid INT(11) DEFAULT NULL,
-                        groupname VARCHAR(100) DEFAULT NULL,
-                        n_or_g VARCHAR(5) NOT NULL DEFAULT 'n',
-                        PRIMARY KEY (notificationid),
-                        KEY postid (postid),
-                        KEY postowneruserid (postowneruserid),
-                        KEY myuserid (myuserid)
+                        blockeduserid INT(11) DEFAULT NULL,
+                        blockeddate DATETIME DEFAULT CURRENT_TIMESTAMP,
+                        PRIMARY KEY (blockedid),
+                        FOREIGN KEY (userid) REFERENCES user(userid) ON DELETE CASCADE ON UPDATE CASCADE,
+                        FOREIGN KEY (blockeduserid) REFERENCES user(userid) ON DELETE CASCADE ON UPDATE CASCADE
                     ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
-                     """
-
-                    await cursor.execute(create_notification_table_query)
-                    print("Table 'notification' created successfully.")
-                    
-                    
-                    create_user_blocked_table_query = """
-                        CREATE TABLE IF NOT EXISTS user_blocked (
-                            blockedid INT(11) NOT NULL AUTO_INCREMENT,
-                            userid INT(11) DEFAULT NULL,
-                            username VARCHAR(100) DEFAULT NULL,
-                            blockeduserid INT(11) DEFAULT NULL,
-                            blockeddate DATETIME DEFAULT CURRENT_TIMESTAMP,
-                            blockeduserprofile LONGBLOB DEFAULT NULL,
-                            PRIMARY KEY (blockedid),
-                            FOREIGN KEY (userid) REFERENCES user(userid) ON DELETE CASCADE ON UPDATE CASCADE,
-                            FOREIGN KEY (blockeduserid) REFERENCES user(userid) ON DELETE CASCADE ON UPDATE CASCADE
-                        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
-                    """
+                """
 
-                    await cursor.execute(create_user_blocked_table_query)
-                    print("Table 'user_blocked' created successfully.")
+                await cursor.execute(create_user_blocked_table_query)
+                print("Table 'user_blocked' created successfully.")
 
                     
                     
@@ -481,22 +1333,22 @@ async def create_tables():
                     
                     
                     
-                    create_passwordreset_table_query = """
-                    CREATE TABLE IF NOT EXISTS passwordreset (
-                        passwordresetid INT(11) NOT NULL AUTO_INCREMENT,
-                        userid INT(11) NOT NULL,
-                        emailaddress VARCHAR(1000) DEFAULT NULL,
-                        code VARCHAR(100) NOT NULL,
-                        expiredornot VARCHAR(100) NOT NULL,
-                        sentdate DATETIME DEFAULT CURRENT_TIMESTAMP(),
-                        PRIMARY KEY (passwordresetid),
-                        KEY userid (userid),
-                        CONSTRAINT passwordreset_ibfk_1 FOREIGN KEY (userid) REFERENCES user (userid) ON DELETE CASCADE
-                    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
-                     """
+                create_passwordreset_table_query = """
+                CREATE TABLE IF NOT EXISTS passwordreset (
+                    passwordresetid INT(11) NOT NULL AUTO_INCREMENT,
+                    userid INT(11) NOT NULL,
+                    emailaddress VARCHAR(1000) DEFAULT NULL,
+                    code VARCHAR(100) NOT NULL,
+                    expiredornot VARCHAR(100) NOT NULL,
+                    sentdate DATETIME DEFAULT CURRENT_TIMESTAMP(),
+                    PRIMARY KEY (passwordresetid),
+                    KEY userid (userid),
+                    CONSTRAINT passwordreset_ibfk_1 FOREIGN KEY (userid) REFERENCES user (userid) ON DELETE CASCADE
+                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+                 """
 
-                    await cursor.execute(create_passwordreset_table_query)
-                    print("Table 'passwordreset' created successfully.")
+                await cursor.execute(create_passwordreset_table_query)
+                print("Table 'passwordreset' created successfully.")
                     
                     
                     
@@ -504,32 +1356,40 @@ async def create_tables():
                     
                     
                     
-                    create_post_table_query = """
-                    CREATE TABLE IF NOT EXISTS post (
-                        postid INT(11) NOT NULL AUTO_INCREMENT,
-                        userid INT(11) DEFAULT NULL,
-                        username VARCHAR(100) DEFAULT NULL,
-                        postdescription VARCHAR(1000) DEFAULT NULL,
-                        groupname VARCHAR(1000) DEFAULT NULL,
-                        posteddate DATETIME DEFAULT NULL,
-                        posttype VARCHAR(50) DEFAULT NULL,
-                        post LONGBLOB DEFAULT NULL,
-                        userprofile LONGBLOB DEFAULT NULL,
-                        filepath VARCHAR(1000) DEFAULT NULL,
-                        textcolor VARCHAR(50) NOT NULL,
-                        textbody VARCHAR(1000) NOT NULL,
-                        popularcount INT(255) NOT NULL DEFAULT 0,
-                        thelink VARCHAR(1000) NOT NULL,
-                        groupid INT(11) DEFAULT NULL,
-                        grouptype VARCHAR(100) DEFAULT NULL,
-                        n_or_g VARCHAR(5) NOT NULL DEFAULT 'n',
-                        PRIMARY KEY (postid),
-                        KEY (userid)
-                    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
-                     """
+                create_post_table_query = """
+                CREATE TABLE IF NOT EXISTS post (
+                    postid INT(11) NOT NULL AUTO_INCREMENT,
+                    userid INT(11) DEFAULT NULL,
+                    username VARCHAR(100) DEFAULT NULL,
+                    postdescription VARCHAR(1000) DEFAULT NULL,
+                    groupname VARCHAR(1000) DEFAULT NULL,
+                    posteddate DATETIME DEFAULT NULL,
+                    posttype VARCHAR(50) DEFAULT NULL,
+                    post LONGBLOB DEFAULT NULL,
+                    filepath VARCHAR(1000) DEFAULT NULL,
+                    textcolor VARCHAR(50) NOT NULL,
+                    textbody VARCHAR(1000) NOT NULL,
+                    popularcount INT(255) NOT NULL DEFAULT 0,
+                    thelink VARCHAR(1000) NOT NULL,
+                    groupid INT(11) DEFAULT NULL,
+                    grouptype VARCHAR(100) DEFAULT NULL,
+                    n_or_g VARCHAR(5) NOT NULL DEFAULT 'n',
+                    mediakey CHAR(64) DEFAULT NULL,
+                    mediasize BIGINT(20) DEFAULT NULL,
+                    mediatype VARCHAR(100) DEFAULT NULL,
+                    mediastatus VARCHAR(20) NOT NULL DEFAULT 'ready',
+                    posterkey CHAR(64) DEFAULT NULL,
+                    previewkey CHAR(64) DEFAULT NULL,
+                    placeholder VARCHAR(1000) DEFAULT NULL,
+                    likecount INT(11) NOT NULL DEFAULT 0,
+                    commentcount INT(11) NOT NULL DEFAULT 0,
+                    PRIMARY KEY (postid),
+                    KEY (userid)
+                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+                 """
 
-                    await cursor.execute(create_post_table_query)
-                    print("Table 'post' created successfully.")
+                await cursor.execute(create_post_table_query)
+                print("Table 'post' created successfully.")
                     
                     
                     
@@ -539,71 +1399,258 @@ async def create_tables():
                     
                     
                     
-                    create_post_like_table_query = """
-                    CREATE TABLE IF NOT EXISTS post_like (
-                        likeid INT(11) NOT NULL AUTO_INCREMENT,
-                        postid INT(11) DEFAULT NULL,
-                        userid INT(11) DEFAULT NULL,
-                        currentuserid INT(11) NOT NULL,
-                        username VARCHAR(100) DEFAULT NULL,
-                        profileimage LONGBLOB DEFAULT NULL,
-                        PRIMARY KEY (likeid),
-                        KEY postid (postid),
-                        KEY userid (userid),
-                        CONSTRAINT post_like_ibfk_1 FOREIGN KEY (postid) REFERENCES post (postid),
-                        CONSTRAINT post_like_ibfk_2 FOREIGN KEY (userid) REFERENCES user (userid)
-                    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
-                     """
+                create_post_like_table_query = """
+                CREATE TABLE IF NOT EXISTS post_like (
+                    likeid INT(11) NOT NULL AUTO_INCREMENT,
+                    postid INT(11) DEFAULT NULL,
+                    userid INT(11) DEFAULT NULL,
+                    currentuserid INT(11) NOT NULL,
+                    username VARCHAR(100) DEFAULT NULL,
+                    PRIMARY KEY (likeid),
+                    KEY postid (postid),
+                    KEY userid (userid),
+                    CONSTRAINT post_like_ibfk_1 FOREIGN KEY (postid) REFERENCES post (postid),
+                    CONSTRAINT post_like_ibfk_2 FOREIGN KEY (userid) REFERENCES user (userid)
+                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+                 """
 
-                    await cursor.execute(create_post_like_table_query)
-                    print("Table 'post_like' created successfully.")
+                await cursor.execute(create_post_like_table_query)
+                print("Table 'post_like' created successfully.")
                     
                     
                     
                     
-                    create_user_table_query = """
-                    CREATE TABLE IF NOT EXISTS user (
-                        userid INT(11) NOT NULL AUTO_INCREMENT,
-                        username VARCHAR(100) DEFAULT NULL,
-                        birthdate DATETIME DEFAULT NULL,
-                        age INT(11) DEFAULT NULL,
-                        emailaddress VARCHAR(100) DEFAULT NULL,
-                        phonenumber VARCHAR(20) DEFAULT NULL,
-                        profileimage LONGBLOB DEFAULT NULL,
-                        createddate DATETIME DEFAULT NULL,
-                        password VARCHAR(100) DEFAULT NULL,
-                        onlinestatus INT(1) DEFAULT NULL,
-                        emailauth TINYINT(4) NOT NULL DEFAULT 0,
-                        notificationstatus TINYINT(4) NOT NULL DEFAULT 0,
-                        PRIMARY KEY (userid)
-                    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
-                     """
+                create_user_table_query = """
+                CREATE TABLE IF NOT EXISTS user (
+                    userid INT(11) NOT NULL AUTO_INCREMENT,
+                    username VARCHAR(100) DEFAULT NULL,
+                    birthdate DATETIME DEFAULT NULL,
+                    age INT(11) DEFAULT NULL,
+                    emailaddress VARCHAR(100) DEFAULT NULL,
+                    phonenumber VARCHAR(20) DEFAULT NULL,
+                    profileimage LONGBLOB DEFAULT NULL,
+                    avatarkey CHAR(64) DEFAULT NULL,
+                    createddate DATETIME DEFAULT NULL,
+                    password VARCHAR(100) DEFAULT NULL,
+                    onlinestatus INT(1) DEFAULT NULL,
+                    emailauth TINYINT(4) NOT NULL DEFAULT 0,
+                    notificationstatus TINYINT(4) NOT NULL DEFAULT 0,
+                    PRIMARY KEY (userid)
+                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+                 """
+
+                await cursor.execute(create_user_table_query)
+                print("Table 'user' created successfully.")
+                    
+                    
+                    
+                    
+                    
+                    
+                    
+                create_favpost_table_query = """
+                CREATE TABLE IF NOT EXISTS favpost (
+                    favpostid INT(11) NOT NULL AUTO_INCREMENT,
+                    postid INT(11) NOT NULL,
+                    userid INT(11) NOT NULL,
+                    saveeddate DATETIME DEFAULT CURRENT_TIMESTAMP(),
+                    PRIMARY KEY (favpostid),
+                    KEY userid (userid),
+                    KEY postid (postid),
+                    CONSTRAINT favpost_ibfk_1 FOREIGN KEY (userid) REFERENCES user (userid) ON DELETE CASCADE,
+                    CONSTRAINT favpost_ibfk_2 FOREIGN KEY (postid) REFERENCES post (postid) ON DELETE CASCADE
+                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+                 """
+
+                await cursor.execute(create_favpost_table_query)
+                print("Table 'favpost' created successfully.")
+
+                    
+                    
+                    
+                    
+                create_media_table_query = """
+                CREATE TABLE IF NOT EXISTS media (
+                    mediakey CHAR(64) NOT NULL,
+                    mediasize BIGINT(20) NOT NULL,
+                    mediatype VARCHAR(100) DEFAULT NULL,
+                    createddate DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (mediakey)
+                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+                 """
+
+                await cursor.execute(create_media_table_query)
+                print("Table 'media' created successfully.")
+                    
+                    
+                    
+                    
+                media_columns = [
+                    ("mediakey", "CHAR(64) DEFAULT NULL"),
+                    ("mediasize", "BIGINT(20) DEFAULT NULL"),
+                    ("mediatype", "VARCHAR(100) DEFAULT NULL"),
+                    ("placeholder", "VARCHAR(1000) DEFAULT NULL"),
+                ]
+                for table in ("post", "grouppost", "image", "groupimage"):
+                    await add_missing_columns(cursor, table, media_columns)
+                for table in ("post", "grouppost"):
+                    await add_missing_columns(cursor, table, [
+                        ("mediastatus", "VARCHAR(20) NOT NULL DEFAULT 'ready'"),
+                        ("posterkey", "CHAR(64) DEFAULT NULL"),
+                        ("previewkey", "CHAR(64) DEFAULT NULL"),
+                    ])
+                # Materialized counters, counted from existing rows when first added.
+                for table in ("post", "grouppost"):
+                    for column in await add_missing_columns(cursor, table, [
+                        ("likecount", "INT(11) NOT NULL DEFAULT 0"),
+                        ("commentcount", "INT(11) NOT NULL DEFAULT 0"),
+                    ]):
+                        await backfill_counter(cursor, table, column)
+                for table in ("comment", "groupcomment"):
+                    for column in await add_missing_columns(cursor, table, [
+                        ("replycount", "INT(11) NOT NULL DEFAULT 0"),
+                    ]):
+                        await backfill_counter(cursor, table, column)
+                for table in ("image", "groupimage"):
+                    await add_missing_columns(cursor, table, [
+                        ("width", "INT(11) DEFAULT NULL"),
+                        ("height", "INT(11) DEFAULT NULL"),
+                    ])
+                await add_missing_columns(cursor, "user", [
+                    ("avatarkey", "CHAR(64) DEFAULT NULL"),
+                ])
+
+                # Composite indexes backing keyset pagination: (filter, posteddate, postid).
+                await add_missing_indexes(cursor, "post", [
+                    ("userid_posteddate", "userid, posteddate, postid"),
+                    ("posttype_posteddate", "posttype, posteddate, postid"),
+                    ("mediastatus_posteddate", "mediastatus, posteddate"),
+                    ("likecount", "likecount"),
+                ])
+                await add_missing_indexes(cursor, "grouppost", [
+                    ("groupid_posteddate", "groupid, posteddate, postid"),
+                ])
+                await add_missing_indexes(cursor, "favpost", [
+                    ("userid_saveeddate", "userid, saveeddate, favpostid"),
+                ])
+                # Follower lookups for timeline fan-out.
+                await add_missing_indexes(cursor, "iamfollowing", [
+                    ("type_otheruserid", "type, otheruserid"),
+                    ("type_groupid", "type, groupid"),
+                ])
+                    
+                    
+                    
+                    
+                create_mediajob_table_query = """
+                CREATE TABLE IF NOT EXISTS mediajob (
+                    jobid INT(11) NOT NULL AUTO_INCREMENT,
+                    jobtype VARCHAR(20) NOT NULL DEFAULT 'transcode',
+                    postid INT(11) DEFAULT NULL,
+                    grouppostid INT(11) DEFAULT NULL,
+                    sourcekey CHAR(64) NOT NULL,
+                    status VARCHAR(20) NOT NULL DEFAULT 'queued',
+                    attempts INT(11) NOT NULL DEFAULT 0,
+                    claimtoken VARCHAR(64) DEFAULT NULL,
+                    claimedby VARCHAR(255) DEFAULT NULL,
+                    error VARCHAR(1000) DEFAULT NULL,
+                    createddate DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    updateddate DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+                    PRIMARY KEY (jobid),
+                    KEY status (status, jobid),
+                    KEY postid (postid),
+                    KEY grouppostid (grouppostid),
+                    KEY sourcekey_jobtype (sourcekey, jobtype)
+                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+                 """
+
+                await cursor.execute(create_mediajob_table_query)
+                print("Table 'mediajob' created successfully.")
+                await add_missing_indexes(cursor, "mediajob", [
+                    ("sourcekey_jobtype", "sourcekey, jobtype"),
+                ])
+
+                    
+                    
+                    
+                    
+                create_videorendition_table_query = """
+                CREATE TABLE IF NOT EXISTS videorendition (
+                    renditionid INT(11) NOT NULL AUTO_INCREMENT,
+                    mediakey CHAR(64) NOT NULL,
+                    rendition VARCHAR(10) NOT NULL,
+                    width INT(11) NOT NULL,
+                    height INT(11) NOT NULL,
+                    bandwidth INT(11) NOT NULL,
+                    playlistkey CHAR(64) NOT NULL,
+                    mediasize BIGINT(20) NOT NULL,
+                    segmentcount INT(11) NOT NULL,
+                    createddate DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (renditionid),
+                    UNIQUE KEY mediakey_rendition (mediakey, rendition)
+                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+                 """
+
+                await cursor.execute(create_videorendition_table_query)
+                print("Table 'videorendition' created successfully.")
+
+                    
+                    
+                    
+                    
+                create_imagederivative_table_query = """
+                CREATE TABLE IF NOT EXISTS imagederivative (
+                    derivativeid INT(11) NOT NULL AUTO_INCREMENT,
+                    sourcekey CHAR(64) NOT NULL,
+                    variant INT(11) NOT NULL,
+                    mediakey CHAR(64) NOT NULL,
+                    width INT(11) NOT NULL,
+                    height INT(11) NOT NULL,
+                    mediasize BIGINT(20) NOT NULL,
+                    createddate DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (derivativeid),
+                    UNIQUE KEY sourcekey_variant (sourcekey, variant)
+                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+                 """
+
+                await cursor.execute(create_imagederivative_table_query)
+                print("Table 'imagederivative' created successfully.")
+
 
-                    await cursor.execute(create_user_table_query)
-                    print("Table 'user' created successfully.")
                     
                     
                     
+                create_timeline_table_query = """
+                CREATE TABLE IF NOT EXISTS timeline (
+                    userid INT(11) NOT NULL,
+                    n_or_g CHAR(1) NOT NULL,
+                    postid INT(11) NOT NULL,
+                    source INT(11) NOT NULL,
+                    posteddate DATETIME NOT NULL,
+                    PRIMARY KEY (userid, n_or_g, postid),
+                    KEY userid_posteddate (userid, posteddate, postid),
+                    KEY userid_source (userid, n_or_g, source)
+                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+                 """
+
+                await cursor.execute(create_timeline_table_query)
+                print("Table 'timeline' created successfully.")
+
                     
                     
                     
                     
-                    create_favpost_table_query = """
-                    CREATE TABLE IF NOT EXISTS favpost (
-                        favpostid INT(11) NOT NULL AUTO_INCREMENT,
-                        postid INT(11) NOT NULL,
-                        userid INT(11) NOT NULL,
-                        saveeddate DATETIME DEFAULT CURRENT_TIMESTAMP(),
-                        PRIMARY KEY (favpostid),
-                        KEY userid (userid),
-                        KEY postid (postid),
-                        CONSTRAINT favpost_ibfk_1 FOREIGN KEY (userid) REFERENCES user (userid) ON DELETE CASCADE,
-                        CONSTRAINT favpost_ibfk_2 FOREIGN KEY (postid) REFERENCES post (postid) ON DELETE CASCADE
-                    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
-                     """
+                create_timelinepull_table_query = """
+                CREATE TABLE IF NOT EXISTS timelinepull (
+                    n_or_g CHAR(1) NOT NULL,
+                    source INT(11) NOT NULL,
+                    createddate DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (n_or_g, source)
+                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+                 """
 
-                    await cursor.execute(create_favpost_table_query)
-                    print("Table 'favpost' created successfully.")
+                await cursor.execute(create_timelinepull_table_query)
+                print("Table 'timelinepull' created successfully.")
 
 
 
@@ -690,19 +1737,13 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
 
 
 async def get_user_by_id(selectedrepostpostowneruid: str):
-    # Query to fetch username and emailaddress from the USER table
-    query = "SELECT username, emailaddress FROM user WHERE userid = %s"
-
     try:
-        async with pool.acquire() as conn:
-            async with conn.cursor(aiomysql.DictCursor) as cursor:
-                await cursor.execute(query, (selectedrepostpostowneruid,))
-                result = await cursor.fetchone()
+        result = await db_fetch("user_name_email", (selectedrepostpostowneruid,), fetch="one")
 
-                if result:
-                    return result["username"], result["emailaddress"]
-                else:
-                    raise HTTPException(status_code=404, detail="User not found")
+        if result:
+            return result["username"], result["emailaddress"]
+        else:
+            raise HTTPException(status_code=404, detail="User not found")
 
     except Exception as e:
         print(f"Error fetching user: {e}")
@@ -725,8 +1766,7 @@ async def report_post(
     try:
         async with pool.acquire() as conn:
             async with conn.cursor(aiomysql.DictCursor) as cursor:
-                await cursor.execute("SELECT username, emailaddress FROM user WHERE userid = %s", (selectedrepostpostowneruid,))
-                result = await cursor.fetchone()
+                result = await run_query(cursor, "user_name_email", (selectedrepostpostowneruid,), fetch="one")
 
                 if not result:
                     raise HTTPException(status_code=404, detail="User not found")
@@ -802,7 +1842,7 @@ async def report_post(
         print(f"Error sending email: {e}")
         raise HTTPException(status_code=500, detail="Error sending email")
 
-    return JSONResponse(content={"message": "Report submitted successfully, email sent."}, status_code=200)
+    return ORJSONResponse(content={"message": "Report submitted successfully, email sent."}, status_code=200)
     
     
     
@@ -934,7 +1974,7 @@ async def sign_up(
     profileimage: UploadFile = File(...)
 ):
     if password != reenterpassword:
-        return JSONResponse(content={"message": "Passwords do not match"}, status_code=400)
+        return ORJSONResponse(content={"message": "Passwords do not match"}, status_code=400)
     
     try:
         async with pool.acquire() as conn:
@@ -943,24 +1983,25 @@ async def sign_up(
                 await cursor.execute(check_email_query, (emailaddress,))
                 result = await cursor.fetchone()
                 if result[0] > 0:
-                    return JSONResponse(content={"message": "Email address already exists"}, status_code=400)
+                    return ORJSONResponse(content={"message": "Email address already exists"}, status_code=400)
 
                 createddate = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
                 onlinestatus = 0 
                 image_data = await profileimage.read()
                 user_id = generate_random_user_id()
+                avatarkey = await store_avatar(cursor, image_data)
                
 
                 insert_query = """
-                INSERT INTO user (userid, username, birthdate, age, emailaddress, phonenumber, profileimage, createddate, password, onlinestatus)
+                INSERT INTO user (userid, username, birthdate, age, emailaddress, phonenumber, avatarkey, createddate, password, onlinestatus)
                 VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
                 """
-                await cursor.execute(insert_query, (user_id, username, birthdate, age, emailaddress, '000000000', image_data, createddate, password, onlinestatus))
+                await cursor.execute(insert_query, (user_id, username, birthdate, age, emailaddress, '000000000', avatarkey, createddate, password, onlinestatus))
                 
                 await conn.commit()
 
         await send_email(emailaddress, user_id, username)
-        return JSONResponse(content={"message": "User created successfully", "userid": user_id}, status_code=201)
+        return ORJSONResponse(content={"message": "User created successfully", "userid": user_id}, status_code=201)
 
     except Exception as e:
         print(f"Error creating user: {e}")
@@ -989,7 +2030,7 @@ async def sign_up_with_google(
                 if result[0] > 0:
                     # Email already exists
                     print(f"Email {emailaddress} already exists.")
-                    return JSONResponse(content={"message": "Email address already exists"}, status_code=400)
+                    return ORJSONResponse(content={"message": "Email address already exists"}, status_code=400)
 
                 createddate = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
                 onlinestatus = 0
@@ -1010,14 +2051,16 @@ async def sign_up_with_google(
                         print(f"Error decoding base64 image: {e}")
                         raise HTTPException(status_code=400, detail="Invalid base64 image data")
                 
+                avatarkey = await store_avatar(cursor, image_data)
+
                 insert_query = """
-                INSERT INTO user (userid, username, birthdate, age, emailaddress, phonenumber, profileimage, createddate, password, onlinestatus)
+                INSERT INTO user (userid, username, birthdate, age, emailaddress, phonenumber, avatarkey, createddate, password, onlinestatus)
                 VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
                 """
-                await cursor.execute(insert_query, (user_id, username, birthdate, 0, emailaddress, '0775004178', image_data, createddate, 'awfwfa', onlinestatus))
+                await cursor.execute(insert_query, (user_id, username, birthdate, 0, emailaddress, '0775004178', avatarkey, createddate, 'awfwfa', onlinestatus))
                 await conn.commit()
 
-        return JSONResponse(content={"message": "User created successfully", "userid": user_id}, status_code=201)
+        return ORJSONResponse(content={"message": "User created successfully", "userid": user_id}, status_code=201)
 
     except Exception as e:
         print(f"Error creating user: {e}")
@@ -1110,7 +2153,7 @@ async def check_password_for_reset(
                 admin_result = await cursor.fetchone()
 
                 if not admin_result:
-                    return JSONResponse(status_code=404, content={"message": "User not found"})
+                    return ORJSONResponse(status_code=404, content={"message": "User not found"})
 
                 databasepassword = admin_result['password']
                 useremailaddress = admin_result['emailaddress']
@@ -1229,7 +2272,7 @@ def add_to_blacklist(token: str):
 @app.post("/logout")
 async def logout(token: str = Depends(oauth2_scheme)):
     add_to_blacklist(token)  
-    return JSONResponse(
+    return ORJSONResponse(
         content={"message": "Logged out successfully"},
         status_code=200
     )
@@ -1542,7 +2585,7 @@ async def code_check(
                 result = await cursor.fetchone()
  
                 if not result:
-                    return JSONResponse(status_code=404, content={"message": "Code not found"})
+                    return ORJSONResponse(status_code=404, content={"message": "Code not found"})
 
                 if result['code'] != code:
                     return {"message": "notmatched"}
@@ -1616,7 +2659,7 @@ async def check_code_submit_forget_password(
                 result = await cursor.fetchone()
  
                 if not result:
-                    return JSONResponse(status_code=404, content={"message": "Code not found"})
+                    return ORJSONResponse(status_code=404, content={"message": "Code not found"})
 
                 if result['code'] != code:
                     return {"message": "notmatched"}
@@ -1818,19 +2861,17 @@ async def create_group(
                         raise HTTPException(status_code=500, detail="Failed to retrieve group ID")
                     groupid = groupid_row["groupid"]
 
-                    await cursor.execute("SELECT * FROM user WHERE userid = %s", (userid,))
-                    user_row = await cursor.fetchone()
+                    user_row = await run_query(cursor, "user_name", (userid,), fetch="one")
                     if not user_row:
                         raise HTTPException(status_code=404, detail="User not found")
 
-                    profileimage = user_row["profileimage"]
                     username = user_row["username"]
 
                     insert_group_user_query = """
-                    INSERT INTO group_users (groupid, userid, profileimage, username, usertype, joined_date)
-                    VALUES (%s, %s, %s, %s, 'admin', %s)
+                    INSERT INTO group_users (groupid, userid, username, usertype, joined_date)
+                    VALUES (%s, %s, %s, 'admin', %s)
                     """
-                    await cursor.execute(insert_group_user_query, (groupid, userid, profileimage, username, createdate))
+                    await cursor.execute(insert_group_user_query, (groupid, userid, username, createdate))
                     await conn.commit()
 
                     insert_group_member_count_query = """
@@ -1844,14 +2885,14 @@ async def create_group(
                     post_id = generate_combined_post_id(letter_string)
 
                     insert_init_post_query = """
-                    INSERT INTO post (postid, userid, username, groupname, posteddate, posttype, post, userprofile, groupid, grouptype, n_or_g)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                    INSERT INTO post (postid, userid, username, groupname, posteddate, posttype, post, groupid, grouptype, n_or_g)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
                     """
-                    await cursor.execute(insert_init_post_query, (post_id, userid, username, groupname, createdate, 'group', groupbackgroundimage_data, profileimage, groupid, grouptype, 'n'))
+                    await cursor.execute(insert_init_post_query, (post_id, userid, username, groupname, createdate, 'group', groupbackgroundimage_data, groupid, grouptype, 'n'))
                     await conn.commit()
             
 
-        return JSONResponse(content={"groupid": groupid, "message": "Group created successfully"}, status_code=201)
+        return ORJSONResponse(content={"groupid": groupid, "message": "Group created successfully"}, status_code=201)
 
     except aiomysql.MySQLError as e:
         print(f"Database error: {e}")
@@ -1884,17 +2925,15 @@ async def join_group(
         async with pool.acquire() as conn:
             async with conn.cursor(aiomysql.DictCursor) as cursor:
 
-                await cursor.execute("SELECT * FROM user WHERE userid = %s", (userid,))
-                user_row = await cursor.fetchone()
+                user_row = await run_query(cursor, "user_name", (userid,), fetch="one")
                 
                 if not user_row:
                     raise HTTPException(status_code=404, detail="User not found")
 
-                profileimage = user_row["profileimage"]
                 username = user_row["username"]
 
                 await cursor.execute(
-                    "SELECT * FROM group_users WHERE groupid = %s AND userid = %s",
+                    "SELECT groupuser_id FROM group_users WHERE groupid = %s AND userid = %s",
                     (groupid, userid)
                 )
                 group_user_row = await cursor.fetchone()
@@ -1907,7 +2946,7 @@ async def join_group(
                     await cursor.execute(delete_group_user_query, (groupid, userid))
                 
                 await cursor.execute(
-                    "SELECT * FROM iamfollowing WHERE myuserid = %s AND groupid = %s AND type = 'group'",
+                    "SELECT iamfollowingid FROM iamfollowing WHERE myuserid = %s AND groupid = %s AND type = 'group'",
                     (userid, groupid)
                 )
                 existing_following_record = await cursor.fetchone()
@@ -1918,6 +2957,9 @@ async def join_group(
                     WHERE myuserid = %s AND groupid = %s AND type = 'group'
                     """
                     await cursor.execute(delete_following_query, (userid, groupid))
+
+                    if TIMELINE_FANOUT_ENABLED:
+                        await timeline_store.remove_source(cursor, userid, 'g', groupid)
                     
                     await cursor.execute("SELECT members FROM groupmembercount WHERE groupid = %s", (groupid,))
                     existing_group = await cursor.fetchone()
@@ -1934,27 +2976,30 @@ async def join_group(
                 
                 if group_user_row or existing_following_record:
                     await conn.commit()   
-                    return JSONResponse(content={"groupid": groupid, "message": "User removed from the group and unfollowed"}, status_code=200)
+                    return ORJSONResponse(content={"groupid": groupid, "message": "User removed from the group and unfollowed"}, status_code=200)
 
                 insert_group_user_query = """
-                INSERT INTO group_users (groupid, userid, profileimage, username, usertype, joined_date)
-                VALUES (%s, %s, %s, %s, 'user', %s)
+                INSERT INTO group_users (groupid, userid, username, usertype, joined_date)
+                VALUES (%s, %s, %s, 'user', %s)
                 """
                 await cursor.execute(
                     insert_group_user_query,
-                    (groupid, userid, profileimage, username, joined_date)
+                    (groupid, userid, username, joined_date)
                 )
                 
                 insert_user_into_following_query = """
-                INSERT INTO iamfollowing (myuserid, otheruserid, username, profile, date, type, groupid)
-                VALUES (%s, %s, %s, %s, %s, %s, %s)
+                INSERT INTO iamfollowing (myuserid, otheruserid, username, date, type, groupid)
+                VALUES (%s, %s, %s, %s, %s, %s)
                 """
                 await cursor.execute(
                     insert_user_into_following_query,
-                    (userid, None, username, None, joined_date, 'group', groupid)
+                    (userid, None, username, joined_date, 'group', groupid)
                 )
                 
                 await conn.commit()  
+
+                if TIMELINE_FANOUT_ENABLED:
+                    await add_followee_to_timeline(cursor, userid, [], [groupid])
                 
                 
                 await cursor.execute("SELECT members FROM groupmembercount WHERE groupid = %s", (groupid,))
@@ -1970,7 +3015,7 @@ async def join_group(
                     await cursor.execute(update_group_member_count_query, (groupid,))
 
 
-        return JSONResponse(content={"groupid": groupid, "message": "User joined group successfully"}, status_code=201)
+        return ORJSONResponse(content={"groupid": groupid, "message": "User joined group successfully"}, status_code=201)
 
     except aiomysql.Error as e:
         print(f"Database error: {e}")
@@ -2121,12 +3166,17 @@ async def remove_replay_comment(
                 DELETE FROM commentreply
                 WHERE commentreplayid = %s 
                 """
-                await cursor.execute(
-                    remove_user_query,
-                    (commentreplayid)
-                )
-
-                await conn.commit()
+                async with transaction(conn):
+                    await cursor.execute(
+                        "SELECT commentid FROM commentreply WHERE commentreplayid = %s FOR UPDATE", (commentreplayid,)
+                    )
+                    reply = await cursor.fetchone()
+                    if reply:
+                        await cursor.execute(
+                            remove_user_query,
+                            (commentreplayid)
+                        )
+                        await bump_counter(cursor, "comment", "replycount", "commentid", reply['commentid'], -1)
 
         return {"message": "deleted"}
 
@@ -2197,6 +3247,7 @@ async def remove_group(
                 
                 
                 await conn.commit()
+                post_cache.invalidate('group', groupid)
 
         return {"message": "removed"}
 
@@ -2326,7 +3377,7 @@ async def update_groupmainimage(
 
 @app.post("/update-user-profile")
 async def update_user_profile(
-    userid: str = Form(...),
+    userid: int = Form(...),
     profileimage: UploadFile = File(...),
 ):
     try:
@@ -2334,21 +3385,18 @@ async def update_user_profile(
 
         async with pool.acquire() as conn:
             async with conn.cursor() as cursor:
+                avatarkey = await store_avatar(cursor, profileimage_data)
+
                 update_profile_image = """
                 UPDATE user
-                SET profileimage = %s
-                WHERE userid = %s
-                """
-                await cursor.execute(update_profile_image, (profileimage_data, userid))
-
-                update_post_user_profile = """
-                UPDATE post
-                SET userprofile = %s
+                SET avatarkey = %s, profileimage = NULL
                 WHERE userid = %s
                 """
-                await cursor.execute(update_post_user_profile, (profileimage_data, userid))
+                await cursor.execute(update_profile_image, (avatarkey, userid))
 
                 await conn.commit()
+                post_cache.invalidate('user', userid)
+                avatar_cache.invalidate(userid)
 
         return {"message": "done"}
 
@@ -2415,6 +3463,7 @@ async def update_groupinformation(
                     
                 
                 await conn.commit()
+                post_cache.invalidate('group', groupid)
 
         return {"message": "done"}
 
@@ -2462,30 +3511,23 @@ async def accept_user_from_group(
                     (groupid, userid)
                 )
                 
-                await cursor.execute(
-                    """ 
-                    SELECT username, profileimage FROM user WHERE userid = %s
-                    """,
-                    (userid,)
-                )
-                user_info = await cursor.fetchone()
+                user_info = await run_query(cursor, "user_name", (userid,), fetch="one")
                 if not user_info:
                     raise HTTPException(status_code=404, detail="User not found")
                 
                 username = user_info['username']
-                profileimage = user_info.get('profileimage', None)
                 
                 insert_notification_query = """
                 INSERT INTO notification (
                     postowneruserid, myuserid, username, notificationtype, commenttext,
-                    date, userprofile, seenstatus,groupid,groupname
-                ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s,%s,%s)
+                    date, seenstatus,groupid,groupname
+                ) VALUES (%s, %s, %s, %s, %s, %s, %s,%s,%s)
                 """
                 await cursor.execute(
                     insert_notification_query,
                     (
                        userid ,  groupownerid, username, 'grouppermission', f'your request is accepted for group {groupname}',
-                        createddate, profileimage, 0,groupid,groupname
+                        createddate, 0,groupid,groupname
                     )
                 )
                 
@@ -2574,7 +3616,7 @@ async def update_email_confirmation(userid: str = Form(...)):
                 await cursor.execute(update_user_query, (1, userid))
                 await conn.commit()
 
-        return JSONResponse(content={"message": "Email confirmation updated successfully"}, status_code=200)
+        return ORJSONResponse(content={"message": "Email confirmation updated successfully"}, status_code=200)
 
     except aiomysql.Error as e:
         print(f"Database error: {e}")
@@ -2610,35 +3652,30 @@ async def add_iamfollowed_users_into_group(
         async with pool.acquire() as conn:
             async with conn.cursor(aiomysql.DictCursor) as cursor:
                 
-                select_user_query = """
-                SELECT username, profileimage FROM user WHERE userid = %s
-                """
-                await cursor.execute(select_user_query, (userid,))
-                user_info = await cursor.fetchone()
+                user_info = await run_query(cursor, "user_name", (userid,), fetch="one")
 
                 if not user_info:
                     raise HTTPException(status_code=404, detail="User not found")
 
                 username = user_info['username']
-                profileimage = user_info['profileimage']
 
                 insert_query = """
-                INSERT INTO group_users (groupid, userid, username, profileimage, usertype, joined_date, status)
-                VALUES (%s, %s, %s, %s, %s, NOW(), 1)
+                INSERT INTO group_users (groupid, userid, username, usertype, joined_date, status)
+                VALUES (%s, %s, %s, %s, NOW(), 1)
                 """
                 await cursor.execute(
                     insert_query,
-                    (groupid, userid, username, profileimage, 'user')
+                    (groupid, userid, username, 'user')
                 )
 
                 insert_notification_query = """
                 INSERT INTO notification (
-                    postowneruserid, myuserid , username, notificationtype, commenttext, date, userprofile, seenstatus, groupid
-                ) VALUES (%s,%s, %s, %s, %s, %s, %s, %s, %s)
+                    postowneruserid, myuserid , username, notificationtype, commenttext, date, seenstatus, groupid
+                ) VALUES (%s,%s, %s, %s, %s, %s, %s, %s)
                 """
                 await cursor.execute(
                     insert_notification_query,
-                    (userid,'5', username, 'grouppermission', 'you are added to a group', createddate, profileimage, 0, groupid)
+                    (userid,'5', username, 'grouppermission', 'you are added to a group', createddate, 0, groupid)
                 )
 
                 await conn.commit()
@@ -2673,28 +3710,23 @@ async def add_iamfollowed_users_into_group(
 async def search_follower_users(
     groupid: str = Form(...),
     username: str = Form(...),
+    avatars: str = Form('url'),
 ):
+    resolver = AvatarResolver(avatars)
     try:
         async with pool.acquire() as conn:
             async with conn.cursor(aiomysql.DictCursor) as cursor:
-                get_user_detail_query = """
-                SELECT * FROM group_users
-                WHERE groupid = %s AND username LIKE %s
-                """
-                await cursor.execute(get_user_detail_query, (groupid, f"%{username}%"))
-                user_details = await cursor.fetchall()
+                user_details = await run_query(cursor, "group_users_by_name", (groupid, f"%{username}%"))
 
                 if not user_details:
-                    return {"message": "No users found"}  
+                    return {"message": "No users found"}
 
-            
-                for user in user_details:
-                    if user['profileimage']:
-                        user['profileimage'] = base64.b64encode(user['profileimage']).decode('utf-8')
-                    else:
-                        user['profileimage'] = None  
+                resolver.add(user_details, 'userid', 'profileimage')
+                avatar_table = await resolver.resolve(cursor)
 
-                return user_details
+        if avatar_table is not None:
+            return ORJSONResponse(content={"users": user_details, "avatars": avatar_table})
+        return ORJSONResponse(content=user_details)
 
     except aiomysql.Error as e:
         print(f"Database error: {e}")
@@ -2737,6 +3769,9 @@ async def remove_user_from_iamfollowing(
                 DELETE FROM iamfollowed WHERE myuserid = %s AND otheruserid = %s
                 """
                 await cursor.execute(delete_query_iamfollowed, (otheruserid , myuid ))
+
+                if TIMELINE_FANOUT_ENABLED:
+                    await timeline_store.remove_source(cursor, myuid, 'n', otheruserid)
                 
                 await conn.commit()
 
@@ -2805,7 +3840,7 @@ async def check_isa_member_of_group(
                 
    
                 get_user_detail_query = """
-                SELECT * FROM group_users
+                SELECT groupuser_id FROM group_users
                 WHERE userid = %s AND groupid = %s
                 """
                 await cursor.execute(
@@ -2817,9 +3852,9 @@ async def check_isa_member_of_group(
 
          
                 if user_record:
-                    return JSONResponse(content={"message": "yes"}, status_code=200)
+                    return ORJSONResponse(content={"message": "yes"}, status_code=200)
                 else:
-                    return JSONResponse(content={"message": "no"}, status_code=200)
+                    return ORJSONResponse(content={"message": "no"}, status_code=200)
 
     except aiomysql.Error as e:
         print(f"Database error: {e}")
@@ -2885,32 +3920,24 @@ async def change_user_type_mod_into_user(
 @app.post("/search-all-users")
 async def search_all_users(
     username: str = Form(...),
-    groupid: str = Form(...)
+    groupid: str = Form(...),
+    avatars: str = Form('url'),
 ):
+    resolver = AvatarResolver(avatars)
     try:
         async with pool.acquire() as conn:
             async with conn.cursor(aiomysql.DictCursor) as cursor:
-                get_user_detail_query = """
-                SELECT iamfollowed.otheruserid, iamfollowed.username, iamfollowed.profile 
-                FROM iamfollowed
-                WHERE  iamfollowed.username LIKE %s
-                AND iamfollowed.otheruserid NOT IN (
-                    SELECT userid FROM group_users WHERE groupid = %s
-                )
-                """
-                await cursor.execute(get_user_detail_query, ( f"%{username}%", groupid))
-                user_details = await cursor.fetchall()
+                user_details = await run_query(cursor, "followers_by_name_outside_group", (f"%{username}%", groupid))
 
                 if not user_details:
-                    return {"message": "No users found"}  
+                    return {"message": "No users found"}
 
-                for user in user_details:
-                    if user['profile']:
-                        user['profile'] = base64.b64encode(user['profile']).decode('utf-8')
-                    else:
-                        user['profile'] = None  
+                resolver.add(user_details, 'otheruserid', 'profile')
+                avatar_table = await resolver.resolve(cursor)
 
-                return user_details
+        if avatar_table is not None:
+            return ORJSONResponse(content={"users": user_details, "avatars": avatar_table})
+        return ORJSONResponse(content=user_details)
 
     except aiomysql.Error as e:
         print(f"Database error: {e}")
@@ -2937,33 +3964,23 @@ async def search_all_users(
 async def get_curruntuser_is_followed_list(
     userid: str = Form(...),
     groupid: str = Form(...),
+    avatars: str = Form('url'),
 ):
+    resolver = AvatarResolver(avatars)
     try:
         async with pool.acquire() as conn:
             async with conn.cursor(aiomysql.DictCursor) as cursor:
-                
-        
-                get_user_detail_query = """
-                SELECT iamfollowed.otheruserid, iamfollowed.username, iamfollowed.profile FROM iamfollowed
-                WHERE iamfollowed.myuserid = %s
-                AND iamfollowed.otheruserid NOT IN (
-                    SELECT userid FROM group_users WHERE groupid = %s
-                )
-                """
-                await cursor.execute(get_user_detail_query, (userid, groupid))
-                user_details = await cursor.fetchall()
-                
+                user_details = await run_query(cursor, "followers_outside_group", (userid, groupid))
+
                 if not user_details:
                     return {"message": "No users found"}, 404
-                
-                for user in user_details:
-                    if user['profile']:
-                        profile_image_base64 = user['profile']
-                        user['profile'] = base64.b64encode(profile_image_base64).decode('utf-8')
-                    else:
-                        user['profile'] = None   
 
-                return user_details
+                resolver.add(user_details, 'otheruserid', 'profile')
+                avatar_table = await resolver.resolve(cursor)
+
+        if avatar_table is not None:
+            return ORJSONResponse(content={"users": user_details, "avatars": avatar_table})
+        return ORJSONResponse(content=user_details)
 
     except aiomysql.Error as e:
         print(f"Database error: {e}")
@@ -3003,7 +4020,7 @@ async def get_number_of_group_followers(
                 result = await cursor.fetchone()
                 count = result['count'] if result else 0
 
-        return JSONResponse(content={"count": count}, status_code=200)
+        return ORJSONResponse(content={"count": count}, status_code=200)
 
     except aiomysql.Error as e:
         print(f"Database error: {e}")
@@ -3054,7 +4071,7 @@ async def check_group_join_accepted(
                     )
                     await conn.commit()
                     
-                    return JSONResponse(content={"message": message}, status_code=200)
+                    return ORJSONResponse(content={"message": message}, status_code=200)
                 else:
                     raise HTTPException(status_code=404, detail="User not found in group")
 
@@ -3094,7 +4111,7 @@ async def update_user_notification_seen_status(
                 
                 await conn.commit()
 
-                return JSONResponse(content={"message": "seen"}, status_code=200)
+                return ORJSONResponse(content={"message": "seen"}, status_code=200)
 
     except aiomysql.Error as e:
         print(f"Database error: {e}")
@@ -3139,32 +4156,27 @@ async def ask_permission_from_admin_to_join_group(
                 if existing_user:
                     status = existing_user['status']
                     if status == 0:
-                        return JSONResponse(content={"message": "requestsent"}, status_code=200)
+                        return ORJSONResponse(content={"message": "requestsent"}, status_code=200)
                     elif status == 1:
-                        return JSONResponse(content={"message": "requestaccepted"}, status_code=200)
+                        return ORJSONResponse(content={"message": "requestaccepted"}, status_code=200)
 
-                await cursor.execute(
-                    "SELECT username, profileimage FROM user WHERE userid = %s",
-                    (groupownerid,)
-                )
-                group_owner = await cursor.fetchone()
+                group_owner = await run_query(cursor, "user_name", (groupownerid,), fetch="one")
                 
                 if not group_owner:
                     raise HTTPException(status_code=404, detail="Group owner not found")
                 
                 group_owner_username = group_owner['username']
-                group_owner_profileimage = group_owner.get('profileimage', None)
                 
                 await cursor.execute(
                     """
                     INSERT INTO notification (
                         postowneruserid, myuserid, username, notificationtype, commenttext,
-                        date, userprofile, seenstatus, groupid
-                    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+                        date, seenstatus, groupid
+                    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
                     """,
                     (
                         groupownerid, myuserid, group_owner_username, 'grouppermission', 'is asking permission to join your group',
-                        createddate, group_owner_profileimage, 0, groupid
+                        createddate, 0, groupid
                     )
                 )
                 
@@ -3177,28 +4189,23 @@ async def ask_permission_from_admin_to_join_group(
                 
                 
                 
-                await cursor.execute(
-                    "SELECT username, profileimage FROM user WHERE userid = %s",
-                    (myuserid,)
-                )
-                user = await cursor.fetchone()
+                user = await run_query(cursor, "user_name", (myuserid,), fetch="one")
                 
                 if not user:
                     raise HTTPException(status_code=404, detail="User not found")
                 
                 user_username = user['username']
-                user_profileimage = user.get('profileimage', None)
                 
                 await cursor.execute(
                     """
                     INSERT INTO notification (
                         postowneruserid, myuserid, username, notificationtype, commenttext,
-                        date, userprofile, seenstatus, groupid
-                    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+                        date, seenstatus, groupid
+                    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
                     """,
                     (
                         myuserid, groupownerid, user_username, 'grouppermission', 'your request is sent to the group admin',
-                        createddate, user_profileimage, 0, groupid
+                        createddate, 0, groupid
                     )
                 )
                 
@@ -3211,16 +4218,16 @@ async def ask_permission_from_admin_to_join_group(
                 
                 await cursor.execute(
                     """
-                    INSERT INTO group_users (groupid, userid, profileimage, username, usertype, status)
-                    VALUES (%s, %s, %s, %s, %s, %s)
+                    INSERT INTO group_users (groupid, userid, username, usertype, status)
+                    VALUES (%s, %s, %s, %s, %s)
                     """, (
-                        groupid, myuserid, user_profileimage, user_username, 'user', 0
+                        groupid, myuserid, user_username, 'user', 0
                     )
                 )
                 
                 await conn.commit()
                 
-        return JSONResponse(content={"message": "Permission request sent successfully"}, status_code=200)
+        return ORJSONResponse(content={"message": "Permission request sent successfully"}, status_code=200)
 
     except aiomysql.Error as e:
         print(f"Database error: {e}")
@@ -3252,7 +4259,7 @@ async def log_in(
     password: str = Form(...),
 ):
     if not emailaddress or not password:
-        return JSONResponse(content={"message": "Please enter credentials"}, status_code=400)
+        return ORJSONResponse(content={"message": "Please enter credentials"}, status_code=400)
 
     try:
         async with pool.acquire() as conn:
@@ -3266,13 +4273,13 @@ async def log_in(
 
                 if user:
                     if user['emailauth'] == 0:
-                        return JSONResponse(content={"message": "Please confirm the email"}, status_code=200)
+                        return ORJSONResponse(content={"message": "Please confirm the email"}, status_code=200)
                     else:
                         
                         token_data = {"userid": user["userid"]}
                         token = create_access_token(token_data)
 
-                        return JSONResponse(
+                        return ORJSONResponse(
                             content={"message": "Login successful", "userid": user["userid"], "token": token},
                             status_code=200
                         )
@@ -3280,7 +4287,68 @@ async def log_in(
                         
                         
                 else:
-                    return JSONResponse(content={"message": "No user found"}, status_code=200)
+                    return ORJSONResponse(content={"message": "No user found"}, status_code=200)
+
+    except aiomysql.Error as e:
+        print(f"Database error: {e}")
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+    except Exception as e:
+        print(f"Unexpected error: {e}")
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+@app.post("/log-in-with-google")
+async def log_in_with_google(
+    emailaddress: str = Form(...),
+):
+    try:
+        async with pool.acquire() as conn:
+            async with conn.cursor(aiomysql.DictCursor) as cursor:
+                query = """
+                SELECT emailaddress, userid, emailauth FROM user 
+                WHERE emailaddress = %s
+                """
+                await cursor.execute(query, (emailaddress,))
+                user = await cursor.fetchone()
+
+                if user:
+                    if user['emailauth'] == 0:
+                        return ORJSONResponse(
+                            content={"message": "Please confirm the email"},
+                            status_code=200
+                        )
+                    else:
+                        return ORJSONResponse(
+                            content={
+                                "message": "Email address already exists",
+                                "userid": user["userid"]
+                            },
+                            status_code=200
+                        )
+                else:
+                    return ORJSONResponse(
+                        content={"message": "No user found"},
+                        status_code=200
+                    )
 
     except aiomysql.Error as e:
         print(f"Database error: {e}")
@@ -3289,87 +4357,623 @@ async def log_in(
     except Exception as e:
         print(f"Unexpected error: {e}")
         raise HTTPException(status_code=500, detail="Internal Server Error")
+    
+    
+    
+    
+    
+    
+    
+    
+    
+    
+    
+    
+    
+    
+    
+    
+    
+    
+    
+    
+
+MEDIA_ROOT = os.getenv("MEDIA_ROOT", "media")
+MEDIA_BASE_URL = os.getenv("MEDIA_BASE_URL", "").rstrip("/")
+MEDIA_KEY_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+
+def is_valid_media_key(mediakey: str) -> bool:
+    return bool(mediakey) and MEDIA_KEY_PATTERN.match(mediakey) is not None
+
+
+class MediaStore(ABC):
+    """
+    Content-addressed blob storage. Objects are keyed by the SHA-256 of their bytes,
+    so identical uploads are stored once.
+
+    Backends implement exists/write/read/size/delete; an object-store backend only
+    has to map those onto its own head/put/get/delete calls.
+    """
+
+    def put(self, data: bytes) -> str:
+        mediakey = hashlib.sha256(data).hexdigest()
+        if not self.exists(mediakey):
+            self.write(mediakey, data)
+        return mediakey
+
+    @abstractmethod
+    def exists(self, mediakey: str) -> bool:
+        raise NotImplementedError
 
+    @abstractmethod
+    def write(self, mediakey: str, data: bytes) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def read(self, mediakey: str) -> bytes:
+        raise NotImplementedError
+
+    @abstractmethod
+    def size(self, mediakey: str) -> int:
+        raise NotImplementedError
+
+    def iter_range(self, mediakey: str, start: int, end: int, chunk_size: int = 64 * 1024):
+        """
+        Yield bytes start..end (inclusive). Backends with ranged reads should override this.
+        """
+        data = self.read(mediakey)[start:end + 1]
+        for offset in range(0, len(data), chunk_size):
+            yield data[offset:offset + chunk_size]
+
+    @abstractmethod
+    def delete(self, mediakey: str) -> None:
+        raise NotImplementedError
+
+
+class LocalMediaStore(MediaStore):
+    """
+    Keeps objects on the local filesystem, sharded as <root>/ab/cd/<key>.
+    """
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def path_for(self, mediakey: str) -> Path:
+        if not is_valid_media_key(mediakey):
+            raise ValueError(f"Invalid media key: {mediakey}")
+        return self.root / mediakey[:2] / mediakey[2:4] / mediakey
+
+    def exists(self, mediakey: str) -> bool:
+        return self.path_for(mediakey).is_file()
+
+    def write(self, mediakey: str, data: bytes) -> None:
+        path = self.path_for(mediakey)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        # Write to a temp file first so readers never see a half-written object.
+        fd, temp_path = tempfile.mkstemp(dir=path.parent, prefix=".upload-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def read(self, mediakey: str) -> bytes:
+        with open(self.path_for(mediakey), "rb") as f:
+            return f.read()
+
+    def size(self, mediakey: str) -> int:
+        return self.path_for(mediakey).stat().st_size
+
+    def iter_range(self, mediakey: str, start: int, end: int, chunk_size: int = 64 * 1024):
+        with open(self.path_for(mediakey), "rb") as f:
+            f.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = f.read(min(chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+
+    def delete(self, mediakey: str) -> None:
+        try:
+            self.path_for(mediakey).unlink()
+        except FileNotFoundError:
+            pass
+
+
+media_store = LocalMediaStore(MEDIA_ROOT)
+
+
+def guess_media_type(data: bytes, default: str = "application/octet-stream") -> str:
+    """
+    Sniff the MIME type of stored bytes from their magic numbers.
+    """
+    if data.startswith(b'\xff\xd8\xff'):
+        return "image/jpeg"
+    if data.startswith(b'\x89PNG\r\n\x1a\n'):
+        return "image/png"
+    if data.startswith((b'GIF87a', b'GIF89a')):
+        return "image/gif"
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return "image/webp"
+    if data[:4] == b'RIFF' and data[8:12] == b'WAVE':
+        return "audio/wav"
+    if data[4:8] == b'ftyp':
+        return "video/mp4"
+    if data.startswith(b'\x1a\x45\xdf\xa3'):
+        return "video/webm"
+    if data.startswith(b'OggS'):
+        return "audio/ogg"
+    if data.startswith(b'ID3') or data[:2] in (b'\xff\xfb', b'\xff\xf3', b'\xff\xf2'):
+        return "audio/mpeg"
+    return default
+
+
+async def save_media(cursor, data: bytes, mediatype: str) -> str:
+    """
+    Write bytes to the media store and register them in the media table.
+    Returns the media key to store on the post/image row.
+    """
+    mediakey = await run_in_threadpool(media_store.put, data)
+    await cursor.execute(
+        "INSERT IGNORE INTO media (mediakey, mediasize, mediatype) VALUES (%s, %s, %s)",
+        (mediakey, len(data), mediatype)
+    )
+    return mediakey
+
+
+def media_url(mediakey: str) -> str:
+    return f"{MEDIA_BASE_URL}/media/{mediakey}"
+
+
+def attach_media_urls(records, blob_field: str, key_field: str = 'mediakey'):
+    """
+    Point rows whose bytes live in the media store at /media/{key} instead of
+    inlining them. The URL goes in '<blob_field>url'; rows that still carry their
+    blob (not yet migrated) keep it.
+    """
+    url_field = f"{blob_field}url"
+    for record in records:
+        if not record:
+            continue
+
+        mediakey = record.get(key_field)
+        if mediakey:
+            record[url_field] = media_url(mediakey)
+            record[blob_field] = None
+        else:
+            record[url_field] = None
+
+    return records
+
+
+def attach_video_previews(records):
+    """
+    Feed cards only need a poster and a short preview: expose those as URLs and never
+    inline the video itself. The full video stays reachable through posturl.
+    """
+    for record in records:
+        if not record or record.get('posttype') != 'video':
+            continue
+
+        posterkey = record.get('posterkey')
+        previewkey = record.get('previewkey')
+        record['posterurl'] = media_url(posterkey) if posterkey else None
+        record['previewurl'] = media_url(previewkey) if previewkey else None
+        record['post'] = None
+
+    return records
+
+
+def attach_avatar_urls(records, blob_field: str):
+    """
+    Avatars live once per user, in the media store under user.avatarkey. Rows read
+    with their user's avatarkey get its URL in '<blob_field>url'; the key is the
+    image's content hash, so a new avatar is a new, immutable URL.
+    """
+    return attach_media_urls(records, blob_field, 'avatarkey')
+
+
+AVATAR_CACHE_SIZE = int(os.getenv("AVATAR_CACHE_SIZE", "50000"))
+AVATAR_CACHE_TTL_SECONDS = int(os.getenv("AVATAR_CACHE_TTL_SECONDS", "600"))
+AVATAR_MODES = ('url', 'table')
+
+
+class AvatarCache:
+    """
+    LRU of userid -> avatar URL (None for users without an avatar). Only avatars in
+    the media store are cached: their URL is a few dozen bytes, while a not yet
+    migrated avatar is the whole image. Per process; update-user-profile drops the
+    user's entry here and other workers pick the change up when theirs expires.
+    """
+
+    def __init__(self, max_entries: int = AVATAR_CACHE_SIZE, ttl_seconds: int = AVATAR_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, userid):
+        """
+        (True, url) for a cached user, (False, None) otherwise.
+        """
+        entry = self.entries.get(userid)
+        if entry is None or entry[0] < time.monotonic():
+            self.entries.pop(userid, None)
+            self.misses += 1
+            return False, None
+        self.entries.move_to_end(userid)
+        self.hits += 1
+        return True, entry[1]
+
+    def put(self, userid, url: Optional[str]):
+        self.entries[userid] = (time.monotonic() + self.ttl_seconds, url)
+        self.entries.move_to_end(userid)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def invalidate(self, userid):
+        self.entries.pop(userid, None)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self.entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+        }
+
+
+avatar_cache = AvatarCache()
+
+
+class AvatarResolver:
+    """
+    Avatars for one response. Rows are registered with add(); resolve() then looks
+    each distinct userid up once, in avatar_cache and then with a single
+    WHERE userid IN (...) query for the rest, however many rows share it.
+
+    With mode 'url' the avatars are written into the rows the way attach_avatar_urls
+    does ('<field>url', and '<field>' for users not yet migrated) and resolve()
+    returns None. With mode 'table' the rows are left without avatars and resolve()
+    returns {userid: url}, not yet migrated avatars being data: URLs, for the
+    response to send once alongside the rows.
+    """
+
+    def __init__(self, mode: str = 'url'):
+        if mode not in AVATAR_MODES:
+            raise HTTPException(status_code=400, detail=f"avatars must be one of: {', '.join(AVATAR_MODES)}")
+        self.mode = mode
+        self.targets = []
+
+    def add(self, rows, userid_field: str = 'userid', avatar_field: str = 'profileimage'):
+        self.targets.append((rows, userid_field, avatar_field))
+        return rows
+
+    async def resolve(self, cursor) -> Optional[dict]:
+        userids = {
+            row[userid_field]
+            for rows, userid_field, _ in self.targets
+            for row in rows
+            if row.get(userid_field) is not None
+        }
+
+        avatars = {}
+        missing = []
+        for userid in userids:
+            found, url = avatar_cache.get(userid)
+            if found:
+                avatars[userid] = (url, None)
+            else:
+                missing.append(userid)
+
+        if missing:
+            placeholders = ", ".join(["%s"] * len(missing))
+            for row in await run_query(cursor, "user_avatars", missing, ids=placeholders):
+                if row['avatarkey']:
+                    url = media_url(row['avatarkey'])
+                    avatar_cache.put(row['userid'], url)
+                    avatars[row['userid']] = (url, None)
+                elif row['profileimage']:
+                    avatars[row['userid']] = (None, bytes(row['profileimage']))
+                else:
+                    avatar_cache.put(row['userid'], None)
+                    avatars[row['userid']] = (None, None)
+
+        if self.mode == 'table':
+            table = {}
+            for userid, (url, data) in avatars.items():
+                if data:
+                    url = f"data:{guess_media_type(data, 'image/jpeg')};base64,{base64.b64encode(data).decode('ascii')}"
+                table[userid] = url
+            return table
+
+        for rows, userid_field, avatar_field in self.targets:
+            for row in rows:
+                url, data = avatars.get(row.get(userid_field), (None, None))
+                row[f"{avatar_field}url"] = url
+                row[avatar_field] = data
+        return None
+
+
+async def attach_avatars(cursor, records, blob_field: str, userid_field: str = 'userid'):
+    """
+    attach_avatar_urls for rows read with avatar_expressions(). Rows whose user has
+    no avatarkey yet get the legacy profileimage from an AvatarResolver: one query
+    for the page instead of a blob subquery per row.
+    """
+    attach_avatar_urls(records, blob_field)
+    legacy = [record for record in records if record and not record.get('avatarkey')]
+    if legacy:
+        resolver = AvatarResolver()
+        resolver.add(legacy, userid_field, blob_field)
+        await resolver.resolve(cursor)
+    return records
+
+
+async def load_legacy_avatars(cursor, table: str, postids) -> dict:
+    """
+    {userid: profileimage} for the authors of `postids` (in `table`, post or
+    grouppost) whose avatar is not in the media store yet, for rows that are
+    streamed and so cannot go through attach_avatars. Empty once migrate_avatars
+    has run.
+    """
+    if not postids:
+        return {}
+    placeholders = ", ".join(["%s"] * len(postids))
+    rows = await run_query(cursor, f"legacy_{table}_avatars", list(postids), ids=placeholders)
+    return {row['userid']: row['profileimage'] for row in rows}
+
+
+def fill_legacy_avatar(record, legacy_avatars, blob_field: str = 'userprofile'):
+    if legacy_avatars and not record.get('avatarkey'):
+        record[blob_field] = legacy_avatars.get(record['userid'])
+    return record
+
+
+MEDIA_BLOB_COLUMNS = [
+    # (table, id column, blob column, rows that hold uploaded media)
+    ("post", "postid", "post", "posttype IN ('image', 'video', 'audio')"),
+    ("grouppost", "postid", "post", "posttype IN ('image', 'video', 'audio')"),
+    ("image", "imageid", "image", "1 = 1"),
+    ("groupimage", "imageid", "image", "1 = 1"),
+]
+
+
+async def migrate_media_blobs(batch_size: int = 50):
+    """
+    One-shot move of LONGBLOB media into the media store. Safe to re-run: rows that
+    already have a media key are skipped.
+    """
+    for table, id_column, blob_column, row_filter in MEDIA_BLOB_COLUMNS:
+        moved = 0
+        last_id = -1
+
+        while True:
+            async with pool.acquire() as conn:
+                async with conn.cursor(aiomysql.DictCursor) as cursor:
+                    await cursor.execute(f"""
+                        SELECT {id_column} AS id_value, {blob_column} AS data FROM {table}
+                        WHERE {id_column} > %s AND mediakey IS NULL AND {blob_column} IS NOT NULL AND {row_filter}
+                        ORDER BY {id_column}
+                        LIMIT %s
+                    """, (last_id, batch_size))
+                    rows = await cursor.fetchall()
+
+                    if not rows:
+                        break
+
+                    for row in rows:
+                        data = bytes(row['data'])
+                        mediatype = guess_media_type(data)
+                        mediakey = await save_media(cursor, data, mediatype)
+
+                        await cursor.execute(f"""
+                            UPDATE {table}
+                            SET mediakey = %s, mediasize = %s, mediatype = %s, {blob_column} = NULL
+                            WHERE {id_column} = %s
+                        """, (mediakey, len(data), mediatype, row['id_value']))
+
+                    await conn.commit()
+
+            last_id = rows[-1]['id_value']
+            moved += len(rows)
+
+        print(f"Moved {moved} blobs out of '{table}'.")
+
+
+async def store_avatar(cursor, data: bytes) -> str:
+    """
+    Store a profile image, metadata stripped, and return its media key.
+    """
+    data, mediatype, *_ = await run_in_threadpool(strip_image_metadata, data, guess_media_type(data, "image/jpeg"))
+    return await save_media(cursor, data, mediatype)
+
+
+# Copies of the user's profile image that used to be written next to every post,
+# comment, like, follow, membership and notification. Reads now take the avatar
+# from the user row, so migrate_avatars drops these columns.
+AVATAR_COPY_COLUMNS = [
+    ("post", "userprofile"),
+    ("grouppost", "userprofile"),
+    ("comment", "userprofile"),
+    ("groupcomment", "userprofile"),
+    ("commentreply", "userprofile"),
+    ("groupcommentreplay", "userprofile"),
+    ("post_like", "profileimage"),
+    ("group_post_like", "profileimage"),
+    ("group_users", "profileimage"),
+    ("iamfollowing", "profile"),
+    ("iamfollowed", "profile"),
+    ("notification", "userprofile"),
+    ("user_blocked", "blockeduserprofile"),
+]
+
+
+async def migrate_avatars(batch_size: int = 50):
+    """
+    One-shot move of user.profileimage into the media store (user.avatarkey), then
+    drop the per-row copies in AVATAR_COPY_COLUMNS. Safe to re-run: migrated users
+    and already dropped columns are skipped.
+    """
+    moved = 0
+    last_userid = -1
+    while True:
+        async with pool.acquire() as conn:
+            async with conn.cursor(aiomysql.DictCursor) as cursor:
+                await cursor.execute("""
+                    SELECT userid, profileimage FROM user
+                    WHERE userid > %s AND avatarkey IS NULL AND profileimage IS NOT NULL
+                    ORDER BY userid
+                    LIMIT %s
+                """, (last_userid, batch_size))
+                rows = await cursor.fetchall()
+
+                if not rows:
+                    break
+
+                for row in rows:
+                    avatarkey = await store_avatar(cursor, bytes(row['profileimage']))
+                    await cursor.execute(
+                        "UPDATE user SET avatarkey = %s, profileimage = NULL WHERE userid = %s",
+                        (avatarkey, row['userid'])
+                    )
+
+                await conn.commit()
+
+        last_userid = rows[-1]['userid']
+        moved += len(rows)
+
+    print(f"Moved {moved} avatars out of 'user'.")
+
+    async with pool.acquire() as conn:
+        async with conn.cursor() as cursor:
+            for table, column in AVATAR_COPY_COLUMNS:
+                await cursor.execute("""
+                    SELECT 1 FROM information_schema.COLUMNS
+                    WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s
+                """, (table, column))
+                if await cursor.fetchone():
+                    await cursor.execute(f"ALTER TABLE {table} DROP COLUMN {column}")
+                    print(f"Column '{table}.{column}' dropped.")
+
+
+
+
+
+MEDIA_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+def parse_range_header(range_header: Optional[str], size: int):
+    """
+    Parse a single 'bytes=start-end' range into inclusive offsets.
+    Returns None when the whole object should be sent and raises ValueError
+    when the range cannot be satisfied.
+    """
+    if not range_header or not range_header.startswith("bytes="):
+        return None
 
+    ranges = range_header[len("bytes="):].split(",")
+    if len(ranges) != 1:
+        # Multipart ranges are not worth supporting for media playback.
+        return None
 
+    start_text, _, end_text = ranges[0].strip().partition("-")
+    try:
+        if start_text == "":
+            suffix_length = int(end_text)
+            if suffix_length <= 0:
+                raise ValueError("Empty suffix range")
+            start = max(size - suffix_length, 0)
+            end = size - 1
+        else:
+            start = int(start_text)
+            end = int(end_text) if end_text else size - 1
+            end = min(end, size - 1)
+    except ValueError:
+        raise ValueError(f"Malformed range: {range_header}")
 
+    if start >= size or start > end:
+        raise ValueError(f"Unsatisfiable range: {range_header}")
 
+    return start, end
 
 
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
 
 
+@app.get("/media/{mediakey}")
+async def get_media(mediakey: str, request: Request):
+    """
+    Serve an object from the media store. Keys are content hashes, so the key doubles
+    as a strong ETag and responses can be cached forever.
+    """
+    if not is_valid_media_key(mediakey):
+        raise HTTPException(status_code=404, detail="Media not found")
 
+    etag = f'"{mediakey}"'
+    cache_headers = {"ETag": etag, "Cache-Control": MEDIA_CACHE_CONTROL}
 
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=cache_headers)
 
+    try:
+        size = await run_in_threadpool(media_store.size, mediakey)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Media not found")
 
+    mediatype = None
+    async with pool.acquire() as conn:
+        async with conn.cursor(aiomysql.DictCursor) as cursor:
+            await cursor.execute("SELECT mediatype FROM media WHERE mediakey = %s", (mediakey,))
+            record = await cursor.fetchone()
+            if record:
+                mediatype = record['mediatype']
 
+    headers = {**cache_headers, "Accept-Ranges": "bytes"}
 
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if if_range and if_range.strip() != etag:
+        range_header = None
 
+    try:
+        byte_range = parse_range_header(range_header, size)
+    except ValueError:
+        return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
 
+    if byte_range is None:
+        start, end, status_code = 0, size - 1, 200
+    else:
+        start, end = byte_range
+        status_code = 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
 
+    headers["Content-Length"] = str(end - start + 1)
 
+    return StreamingResponse(
+        media_store.iter_range(mediakey, start, end),
+        status_code=status_code,
+        media_type=mediatype or "application/octet-stream",
+        headers=headers,
+    )
 
-@app.post("/log-in-with-google")
-async def log_in_with_google(
-    emailaddress: str = Form(...),
-):
-    try:
-        async with pool.acquire() as conn:
-            async with conn.cursor(aiomysql.DictCursor) as cursor:
-                query = """
-                SELECT emailaddress, userid, emailauth FROM user 
-                WHERE emailaddress = %s
-                """
-                await cursor.execute(query, (emailaddress,))
-                user = await cursor.fetchone()
 
-                if user:
-                    if user['emailauth'] == 0:
-                        return JSONResponse(
-                            content={"message": "Please confirm the email"},
-                            status_code=200
-                        )
-                    else:
-                        return JSONResponse(
-                            content={
-                                "message": "Email address already exists",
-                                "userid": user["userid"]
-                            },
-                            status_code=200
-                        )
-                else:
-                    return JSONResponse(
-                        content={"message": "No user found"},
-                        status_code=200
-                    )
 
-    except aiomysql.Error as e:
-        print(f"Database error: {e}")
-        raise HTTPException(status_code=500, detail="Internal Server Error")
 
-    except Exception as e:
-        print(f"Unexpected error: {e}")
-        raise HTTPException(status_code=500, detail="Internal Server Error")
-    
-    
-    
-    
-    
-    
-    
-    
-    
-    
-    
-    
-    
-    
-    
-    
-    
-    
-    
-    
 
 VIDEO_UPLOAD_DIR = "../ravoom/ravoom_social/src/assets/video_files"
 AUDIO_UPLOAD_DIR = "../ravoom/ravoom_social/src/assets/audio_files"
@@ -3401,7 +5005,7 @@ def compress_video(input_video: BytesIO) -> BytesIO:
 
     except Exception as e:
         print(f"Error compressing video: {e}")
-        raise HTTPException(status_code=500, detail=f"Error compressing video: {str(e)}")
+        raise RuntimeError(f"Error compressing video: {str(e)}")
 
     finally:
          
@@ -3414,6 +5018,693 @@ def compress_video(input_video: BytesIO) -> BytesIO:
             print(f"Error during cleanup: {cleanup_error}")
 
 
+
+
+TRANSCODE_WORKER_ENABLED = os.getenv("TRANSCODE_WORKER_ENABLED", "true").lower() in ("1", "true", "yes")
+TRANSCODE_CONCURRENCY = max(1, int(os.getenv("TRANSCODE_CONCURRENCY", "2")))
+TRANSCODE_POLL_SECONDS = float(os.getenv("TRANSCODE_POLL_SECONDS", "2"))
+TRANSCODE_LEASE_MINUTES = int(os.getenv("TRANSCODE_LEASE_MINUTES", "30"))
+TRANSCODE_MAX_ATTEMPTS = int(os.getenv("TRANSCODE_MAX_ATTEMPTS", "3"))
+
+
+HLS_SEGMENT_SECONDS = int(os.getenv("HLS_SEGMENT_SECONDS", "4"))
+HLS_DEFAULT_BANDWIDTH = int(os.getenv("HLS_DEFAULT_BANDWIDTH", "1200000"))
+
+# (name, height, video bitrate, audio bitrate)
+HLS_LADDER = [
+    ("240p", 240, "300k", "64k"),
+    ("480p", 480, "900k", "96k"),
+    ("720p", 720, "2200k", "128k"),
+]
+
+
+def bitrate_to_bps(bitrate: str) -> int:
+    if bitrate.endswith("k"):
+        return int(bitrate[:-1]) * 1000
+    if bitrate.endswith("M"):
+        return int(bitrate[:-1]) * 1000000
+    return int(bitrate)
+
+
+def build_hls_ladder(source_path: str, work_dir: str):
+    """
+    Cut the source into one HLS rendition per ladder step (never upscaling past the
+    source height) and put every segment and rendition playlist in the media store.
+
+    Segment URIs in the stored playlists point at /media/{key}, so segments are served
+    with Range support and immutable caching like any other media object.
+    Returns (renditions, objects) where objects are (mediakey, size, mediatype) rows
+    to register in the media table.
+    """
+    ffmpeg = imageio_ffmpeg.get_ffmpeg_exe()
+
+    with VideoFileClip(source_path) as clip:
+        source_width, source_height = clip.size
+        fps = clip.fps or 30
+
+    ladder = [step for step in HLS_LADDER if step[1] <= source_height] or HLS_LADDER[:1]
+    gop = max(1, int(round(fps * HLS_SEGMENT_SECONDS)))
+
+    renditions = []
+    objects = []
+
+    for name, height, video_bitrate, audio_bitrate in ladder:
+        rendition_dir = os.path.join(work_dir, name)
+        os.makedirs(rendition_dir, exist_ok=True)
+        playlist_path = os.path.join(rendition_dir, "index.m3u8")
+
+        subprocess.run([
+            ffmpeg, "-y", "-loglevel", "error", "-i", source_path,
+            "-vf", f"scale=-2:{height}",
+            "-c:v", "libx264", "-preset", "veryfast", "-profile:v", "main",
+            "-b:v", video_bitrate, "-maxrate", video_bitrate, "-bufsize", f"{bitrate_to_bps(video_bitrate) * 2 // 1000}k",
+            "-g", str(gop), "-keyint_min", str(gop), "-sc_threshold", "0",
+            "-c:a", "aac", "-b:a", audio_bitrate, "-ac", "2",
+            "-hls_time", str(HLS_SEGMENT_SECONDS), "-hls_playlist_type", "vod",
+            "-hls_segment_filename", os.path.join(rendition_dir, "segment_%05d.ts"),
+            playlist_path,
+        ], check=True, capture_output=True)
+
+        playlist_lines = []
+        rendition_size = 0
+        segment_count = 0
+        with open(playlist_path) as f:
+            for line in f.read().splitlines():
+                if line and not line.startswith("#"):
+                    with open(os.path.join(rendition_dir, line), "rb") as segment_file:
+                        segment = segment_file.read()
+                    segment_key = media_store.put(segment)
+                    objects.append((segment_key, len(segment), "video/mp2t"))
+                    rendition_size += len(segment)
+                    segment_count += 1
+                    line = media_url(segment_key)
+                playlist_lines.append(line)
+
+        playlist = ("\n".join(playlist_lines) + "\n").encode("utf-8")
+        playlist_key = media_store.put(playlist)
+        objects.append((playlist_key, len(playlist), "application/vnd.apple.mpegurl"))
+
+        renditions.append({
+            "rendition": name,
+            "width": int(round(source_width * height / source_height / 2)) * 2,
+            "height": height,
+            "bandwidth": bitrate_to_bps(video_bitrate) + bitrate_to_bps(audio_bitrate),
+            "playlistkey": playlist_key,
+            "mediasize": rendition_size,
+            "segmentcount": segment_count,
+        })
+
+    return renditions, objects
+
+
+VIDEO_POSTER_WIDTH = 720
+VIDEO_PREVIEW_SECONDS = int(os.getenv("VIDEO_PREVIEW_SECONDS", "3"))
+
+
+def build_video_previews(source_path: str, work_dir: str):
+    """
+    Grab a WebP poster frame and, unless VIDEO_PREVIEW_SECONDS is 0, a short muted
+    360p preview clip, so feeds can show a video card without its full bytes.
+    Returns (posterkey, previewkey, placeholder, objects).
+    """
+    objects = []
+
+    with VideoFileClip(source_path) as clip:
+        frame = clip.get_frame(min(1.0, (clip.duration or 0) / 2))
+
+    poster = Image.fromarray(frame)
+    placeholder = make_lqip(poster)
+    if poster.width > VIDEO_POSTER_WIDTH:
+        poster = poster.resize((VIDEO_POSTER_WIDTH, round(poster.height * VIDEO_POSTER_WIDTH / poster.width)), Image.LANCZOS)
+    poster_stream = BytesIO()
+    poster.save(poster_stream, format="WEBP", quality=80)
+    poster_bytes = poster_stream.getvalue()
+    posterkey = media_store.put(poster_bytes)
+    objects.append((posterkey, len(poster_bytes), "image/webp"))
+
+    previewkey = None
+    if VIDEO_PREVIEW_SECONDS > 0:
+        preview_path = os.path.join(work_dir, "preview.mp4")
+        subprocess.run([
+            imageio_ffmpeg.get_ffmpeg_exe(), "-y", "-loglevel", "error", "-i", source_path,
+            "-t", str(VIDEO_PREVIEW_SECONDS), "-an",
+            "-vf", "scale=-2:360", "-c:v", "libx264", "-preset", "veryfast", "-crf", "30",
+            "-pix_fmt", "yuv420p", "-movflags", "+faststart",
+            preview_path,
+        ], check=True, capture_output=True)
+        with open(preview_path, "rb") as f:
+            preview_bytes = f.read()
+        previewkey = media_store.put(preview_bytes)
+        objects.append((previewkey, len(preview_bytes), "video/mp4"))
+
+    return posterkey, previewkey, placeholder, objects
+
+
+def transcode_video_job(sourcekey: str):
+    """
+    Runs inside a worker process: read the uploaded source from the media store,
+    compress it to the progressive MP4 and build the HLS ladder from the original.
+    """
+    source_bytes = media_store.read(sourcekey)
+    compressed = compress_video(BytesIO(source_bytes)).getvalue()
+    mediakey = media_store.put(compressed)
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        source_path = os.path.join(work_dir, "source")
+        with open(source_path, "wb") as f:
+            f.write(source_bytes)
+        renditions, objects = build_hls_ladder(source_path, work_dir)
+        posterkey, previewkey, placeholder, preview_objects = build_video_previews(source_path, work_dir)
+
+    return {
+        "mediakey": mediakey,
+        "mediasize": len(compressed),
+        "renditions": renditions,
+        "posterkey": posterkey,
+        "previewkey": previewkey,
+        "placeholder": placeholder,
+        "objects": objects + preview_objects,
+    }
+
+
+def backfill_video_job(sourcekey: str):
+    """
+    Build the HLS ladder, poster and preview for a video that is already transcoded.
+    """
+    with tempfile.TemporaryDirectory() as work_dir:
+        source_path = os.path.join(work_dir, "source")
+        with open(source_path, "wb") as f:
+            f.write(media_store.read(sourcekey))
+        renditions, objects = build_hls_ladder(source_path, work_dir)
+        posterkey, previewkey, placeholder, preview_objects = build_video_previews(source_path, work_dir)
+
+    return {
+        "mediakey": sourcekey,
+        "mediasize": None,
+        "renditions": renditions,
+        "posterkey": posterkey,
+        "previewkey": previewkey,
+        "placeholder": placeholder,
+        "objects": objects + preview_objects,
+    }
+
+
+async def record_video_renditions(cursor, mediakey: str, renditions):
+    for rendition in renditions:
+        await cursor.execute("""
+            INSERT INTO videorendition (mediakey, rendition, width, height, bandwidth, playlistkey, mediasize, segmentcount)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE width = VALUES(width), height = VALUES(height), bandwidth = VALUES(bandwidth),
+                playlistkey = VALUES(playlistkey), mediasize = VALUES(mediasize), segmentcount = VALUES(segmentcount)
+        """, (
+            mediakey, rendition['rendition'], rendition['width'], rendition['height'], rendition['bandwidth'],
+            rendition['playlistkey'], rendition['mediasize'], rendition['segmentcount']
+        ))
+
+
+async def record_video_job(cursor, job, result):
+    mediakey = result['mediakey']
+    mediasize = result['mediasize']
+
+    await record_video_renditions(cursor, mediakey, result['renditions'])
+
+    if job['postid']:
+        await cursor.execute("""
+            UPDATE post SET mediakey = %s, mediasize = %s, mediatype = 'video/mp4', mediastatus = 'ready'
+            WHERE postid = %s
+        """, (mediakey, mediasize, job['postid']))
+    if job['grouppostid']:
+        await cursor.execute("""
+            UPDATE grouppost SET mediakey = %s, mediasize = %s, mediatype = 'video/mp4', mediastatus = 'ready'
+            WHERE postid = %s
+        """, (mediakey, mediasize, job['grouppostid']))
+
+    # Keyed by media rather than post so backfills reach every post sharing the video.
+    for table in ("post", "grouppost"):
+        await cursor.execute(
+            f"UPDATE {table} SET posterkey = %s, previewkey = %s, placeholder = %s WHERE mediakey = %s",
+            (result['posterkey'], result['previewkey'], result['placeholder'], mediakey)
+        )
+
+    # Video posts reach timelines only once playable.
+    if TIMELINE_FANOUT_ENABLED:
+        await fan_out_posts(cursor, [('n', job['postid']), ('g', job['grouppostid'])])
+
+
+
+
+IMAGE_DERIVATIVE_WIDTHS = [160, 480, 1080]
+IMAGE_CARD_WIDTH = int(os.getenv("IMAGE_CARD_WIDTH", "480"))
+
+
+def snap_card_width(cardwidth: int) -> int:
+    """
+    The derivative width attach_image_derivatives would pick for `cardwidth`: the
+    smallest one at least that wide, or the largest. Feed rows are cached per width,
+    so client-chosen widths are snapped to these few values.
+    """
+    fitting = [width for width in IMAGE_DERIVATIVE_WIDTHS if width >= cardwidth]
+    return fitting[0] if fitting else IMAGE_DERIVATIVE_WIDTHS[-1]
+
+
+def open_upright_image(data: bytes):
+    """
+    Decode an image and apply its EXIF orientation, so the pixels are upright once the
+    EXIF block is dropped.
+    """
+    image = Image.open(BytesIO(data))
+    image_format = image.format
+    image = ImageOps.exif_transpose(image)
+    return image, image_format
+
+
+LQIP_SIZE = 16
+
+
+def make_lqip(image) -> str:
+    """
+    Tiny blurred stand-in for an image (a ~16px WebP as a data URI, usually 150-300
+    bytes) that clients can stretch into the card while the real media loads.
+    """
+    thumbnail = image.convert("RGB")
+    thumbnail.thumbnail((LQIP_SIZE, LQIP_SIZE))
+    output = BytesIO()
+    thumbnail.save(output, format="WEBP", quality=40)
+    return "data:image/webp;base64," + base64.b64encode(output.getvalue()).decode('utf-8')
+
+
+def strip_image_metadata(data: bytes, mediatype: str):
+    """
+    Re-encode an uploaded image without its EXIF/XMP metadata (GPS position, device
+    serials) and compute its placeholder. Returns (data, mediatype, width, height,
+    placeholder); animated images are kept as-is and undecodable ones come back with
+    no dimensions or placeholder.
+    """
+    try:
+        image, image_format = open_upright_image(data)
+    except UnidentifiedImageError:
+        # Formats Pillow cannot decode (e.g. HEIC) are stored untouched.
+        return data, mediatype, None, None, None
+
+    placeholder = make_lqip(image)
+    if getattr(image, "is_animated", False) or image_format not in ("JPEG", "PNG", "WEBP"):
+        return data, mediatype, image.width, image.height, placeholder
+
+    output = BytesIO()
+    if image_format == "JPEG":
+        image.convert("RGB").save(output, format="JPEG", quality=90, optimize=True)
+    elif image_format == "WEBP":
+        image.save(output, format="WEBP", quality=90)
+    else:
+        image.save(output, format="PNG", optimize=True)
+    return output.getvalue(), Image.MIME[image_format], image.width, image.height, placeholder
+
+
+def image_derivative_job(sourcekey: str):
+    """
+    Runs inside a worker process: render fixed-width WebP derivatives of a stored
+    image. Widths never exceed the original, and derivatives carry no metadata.
+    Content-addressed keys make re-running the job for the same image a no-op.
+    """
+    image, _ = open_upright_image(media_store.read(sourcekey))
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if "transparency" in image.info or image.mode in ("LA", "P") else "RGB")
+
+    derivatives = []
+    objects = []
+    for variant in IMAGE_DERIVATIVE_WIDTHS:
+        width = min(variant, image.width)
+        height = max(1, round(image.height * width / image.width))
+        resized = image if width == image.width else image.resize((width, height), Image.LANCZOS)
+
+        output = BytesIO()
+        resized.save(output, format="WEBP", quality=80, method=4)
+        derivative = output.getvalue()
+        mediakey = media_store.put(derivative)
+
+        objects.append((mediakey, len(derivative), "image/webp"))
+        derivatives.append({
+            "variant": variant,
+            "mediakey": mediakey,
+            "width": width,
+            "height": height,
+            "mediasize": len(derivative),
+        })
+
+    return {
+        "mediakey": sourcekey,
+        "width": image.width,
+        "height": image.height,
+        "placeholder": make_lqip(image),
+        "derivatives": derivatives,
+        "objects": objects,
+    }
+
+
+async def record_image_job(cursor, job, result):
+    sourcekey = result['mediakey']
+    for derivative in result['derivatives']:
+        await cursor.execute("""
+            INSERT INTO imagederivative (sourcekey, variant, mediakey, width, height, mediasize)
+            VALUES (%s, %s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE mediakey = VALUES(mediakey), width = VALUES(width),
+                height = VALUES(height), mediasize = VALUES(mediasize)
+        """, (
+            sourcekey, derivative['variant'], derivative['mediakey'],
+            derivative['width'], derivative['height'], derivative['mediasize']
+        ))
+
+    for table in ("image", "groupimage"):
+        await cursor.execute(
+            f"UPDATE {table} SET width = %s, height = %s WHERE mediakey = %s AND width IS NULL",
+            (result['width'], result['height'], sourcekey)
+        )
+
+    # Image posts carry their first image's key, so they pick up its placeholder too.
+    for table in ("image", "groupimage", "post", "grouppost"):
+        await cursor.execute(
+            f"UPDATE {table} SET placeholder = %s WHERE mediakey = %s AND placeholder IS NULL",
+            (result['placeholder'], sourcekey)
+        )
+
+    # Feed rows cached before the job finished still point at the original image.
+    await cursor.execute("""
+        SELECT 'n' AS n_or_g, postid FROM image WHERE mediakey = %s
+        UNION SELECT 'g', postid FROM groupimage WHERE mediakey = %s
+        UNION SELECT 'n', postid FROM post WHERE mediakey = %s
+        UNION SELECT 'g', postid FROM grouppost WHERE mediakey = %s
+    """, (sourcekey, sourcekey, sourcekey, sourcekey))
+    for row in await cursor.fetchall():
+        post_cache.invalidate_post(row['n_or_g'], row['postid'])
+
+
+async def store_uploaded_image(cursor, data: bytes, mediatype: str):
+    """
+    Strip metadata off an uploaded image (in the threadpool), store it and queue its
+    derivatives. Returns (mediakey, mediasize, mediatype, width, height, placeholder).
+    Images over Pillow's decompression bomb limit are rejected with a 413.
+    """
+    try:
+        data, mediatype, width, height, placeholder = await run_in_threadpool(strip_image_metadata, data, mediatype)
+    except Image.DecompressionBombError:
+        raise HTTPException(status_code=413, detail="Image dimensions are too large")
+    mediakey = await save_media(cursor, data, mediatype)
+
+    # A retried or repeated upload of the same content must not queue a second job.
+    if width:
+        await cursor.execute("""
+            INSERT INTO mediajob (jobtype, sourcekey)
+            SELECT 'image', %s FROM DUAL
+            WHERE NOT EXISTS (SELECT 1 FROM imagederivative WHERE sourcekey = %s)
+            AND NOT EXISTS (
+                SELECT 1 FROM mediajob WHERE sourcekey = %s AND jobtype = 'image' AND status IN ('queued', 'running')
+            )
+        """, (mediakey, mediakey, mediakey))
+        if cursor.rowcount and TRANSCODE_WORKER_ENABLED:
+            transcode_worker.notify()
+
+    return mediakey, len(data), mediatype, width, height, placeholder
+
+
+async def load_image_derivatives(cursor, mediakeys):
+    """
+    Fetch the derivatives for a batch of images, keyed by source mediakey and sorted by width.
+    """
+    mediakeys = list({key for key in mediakeys if key})
+    if not mediakeys:
+        return {}
+
+    placeholders = ", ".join(["%s"] * len(mediakeys))
+    await cursor.execute(f"""
+        SELECT sourcekey, variant, mediakey, width, height, mediasize
+        FROM imagederivative
+        WHERE sourcekey IN ({placeholders})
+        ORDER BY width
+    """, mediakeys)
+
+    derivatives = {}
+    for row in await cursor.fetchall():
+        derivatives.setdefault(row['sourcekey'], []).append(row)
+    return derivatives
+
+
+async def attach_image_derivatives(cursor, records, cardwidth: int = IMAGE_CARD_WIDTH, key_field: str = 'imagemediakey', url_field: str = 'imageurl'):
+    """
+    Swap the original image URL for the smallest derivative at least `cardwidth` wide
+    (or the largest one available). Images without derivatives yet keep the original.
+    """
+    derivatives = await load_image_derivatives(cursor, [record.get(key_field) for record in records if record])
+
+    for record in records:
+        if not record:
+            continue
+        variants = derivatives.get(record.get(key_field))
+        if not variants:
+            continue
+        fitting = [variant for variant in variants if variant['width'] >= cardwidth]
+        chosen = fitting[0] if fitting else variants[-1]
+        record[url_field] = media_url(chosen['mediakey'])
+        record['imagewidth'] = chosen['width']
+        record['imageheight'] = chosen['height']
+
+    return records
+
+
+async def enqueue_image_backfill_jobs():
+    """
+    Queue a derivative job for every stored image that has none yet (idempotent).
+    """
+    async with pool.acquire() as conn:
+        async with conn.cursor(aiomysql.DictCursor) as cursor:
+            await cursor.execute("""
+                SELECT DISTINCT i.mediakey FROM (
+                    SELECT mediakey FROM image WHERE mediakey IS NOT NULL
+                    UNION
+                    SELECT mediakey FROM groupimage WHERE mediakey IS NOT NULL
+                ) i
+                LEFT JOIN imagederivative d ON d.sourcekey = i.mediakey
+                LEFT JOIN mediajob j ON j.sourcekey = i.mediakey AND j.jobtype = 'image' AND j.status IN ('queued', 'running')
+                WHERE d.sourcekey IS NULL AND j.jobid IS NULL
+            """)
+            records = await cursor.fetchall()
+            for record in records:
+                await enqueue_transcode_job(cursor, record['mediakey'], jobtype='image')
+
+    print(f"Queued {len(records)} image derivative job(s).")
+
+
+# jobtype -> (worker process function, coroutine recording its result)
+MEDIA_JOB_HANDLERS = {
+    "transcode": (transcode_video_job, record_video_job),
+    "backfill": (backfill_video_job, record_video_job),
+    "image": (image_derivative_job, record_image_job),
+}
+
+
+async def enqueue_transcode_job(cursor, sourcekey: str, postid: Optional[int] = None, grouppostid: Optional[int] = None, jobtype: str = 'transcode'):
+    await cursor.execute(
+        "INSERT INTO mediajob (jobtype, postid, grouppostid, sourcekey) VALUES (%s, %s, %s, %s)",
+        (jobtype, postid, grouppostid, sourcekey)
+    )
+
+
+async def enqueue_video_backfill_jobs():
+    """
+    Queue a backfill job for every ready video missing its HLS ladder or poster.
+    """
+    async with pool.acquire() as conn:
+        async with conn.cursor(aiomysql.DictCursor) as cursor:
+            await cursor.execute("""
+                SELECT DISTINCT v.mediakey FROM (
+                    SELECT mediakey, posterkey FROM post WHERE posttype = 'video' AND mediastatus = 'ready' AND mediakey IS NOT NULL
+                    UNION
+                    SELECT mediakey, posterkey FROM grouppost WHERE posttype = 'video' AND mediastatus = 'ready' AND mediakey IS NOT NULL
+                ) v
+                LEFT JOIN videorendition r ON r.mediakey = v.mediakey
+                LEFT JOIN mediajob j ON j.sourcekey = v.mediakey AND j.jobtype = 'backfill' AND j.status IN ('queued', 'running')
+                WHERE (r.mediakey IS NULL OR v.posterkey IS NULL) AND j.jobid IS NULL
+            """)
+            records = await cursor.fetchall()
+            for record in records:
+                await enqueue_transcode_job(cursor, record['mediakey'], jobtype='backfill')
+
+    print(f"Queued {len(records)} video backfill job(s).")
+
+
+class TranscodeWorker:
+    """
+    Pulls queued jobs from the mediajob table and transcodes them in a process pool,
+    so moviepy never runs on the event loop. Each worker runs at most `concurrency`
+    jobs at once, and every process that starts one (each uvicorn worker, unless
+    TRANSCODE_WORKER_ENABLED is off there) has its own, so a host runs up to
+    `concurrency` x processes. Any number of workers can share the queue because a
+    job is only taken by the worker whose claim token landed on it, and a running
+    job's lease is renewed until it finishes.
+    """
+
+    def __init__(self, concurrency: int = TRANSCODE_CONCURRENCY, poll_seconds: float = TRANSCODE_POLL_SECONDS):
+        self.concurrency = concurrency
+        self.poll_seconds = poll_seconds
+        self.host = f"{socket.gethostname()}:{os.getpid()}"
+        self.executor = None
+        self.task = None
+        self.running = set()
+        self.wakeup = asyncio.Event()
+
+    async def start(self):
+        self.executor = ProcessPoolExecutor(max_workers=self.concurrency)
+        self.task = asyncio.create_task(self.run())
+        print(f"Transcode worker started on {self.host} with concurrency {self.concurrency}.")
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+        if self.running:
+            await asyncio.gather(*self.running, return_exceptions=True)
+        if self.executor:
+            self.executor.shutdown(wait=True)
+        print("Transcode worker stopped.")
+
+    def notify(self):
+        self.wakeup.set()
+
+    async def renew_lease(self, job):
+        """
+        Keep a running job's updateddate fresh so requeue_expired_jobs does not hand
+        a long transcode to another worker while this one is still on it.
+        """
+        while True:
+            await asyncio.sleep(TRANSCODE_LEASE_MINUTES * 60 / 3)
+            try:
+                async with pool.acquire() as conn:
+                    async with conn.cursor(aiomysql.DictCursor) as cursor:
+                        await cursor.execute(
+                            "UPDATE mediajob SET updateddate = NOW() WHERE jobid = %s AND claimtoken = %s AND status = 'running'",
+                            (job['jobid'], job['claimtoken'])
+                        )
+            except aiomysql.Error as e:
+                print(f"Error renewing lease of media job {job['jobid']}: {e}")
+
+    async def run(self):
+        while True:
+            try:
+                await self.requeue_expired_jobs()
+                while len(self.running) < self.concurrency:
+                    job = await self.claim_job()
+                    if not job:
+                        break
+                    task = asyncio.create_task(self.process(job))
+                    self.running.add(task)
+                    task.add_done_callback(self.running.discard)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Transcode worker error: {e}")
+
+            self.wakeup.clear()
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout=self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+    async def claim_job(self):
+        claimtoken = secrets.token_hex(16)
+        async with pool.acquire() as conn:
+            async with conn.cursor(aiomysql.DictCursor) as cursor:
+                await cursor.execute("""
+                    UPDATE mediajob
+                    SET status = 'running', claimtoken = %s, claimedby = %s, attempts = attempts + 1
+                    WHERE status = 'queued'
+                    ORDER BY jobid
+                    LIMIT 1
+                """, (claimtoken, self.host))
+                if cursor.rowcount == 0:
+                    return None
+                await cursor.execute("SELECT * FROM mediajob WHERE claimtoken = %s", (claimtoken,))
+                return await cursor.fetchone()
+
+    async def requeue_expired_jobs(self):
+        """
+        Jobs left 'running' past the lease belong to a worker that died; put them back
+        on the queue, or fail them once they have used up their attempts.
+        """
+        async with pool.acquire() as conn:
+            async with conn.cursor(aiomysql.DictCursor) as cursor:
+                await cursor.execute("""
+                    SELECT jobid, postid, grouppostid, attempts FROM mediajob
+                    WHERE status = 'running' AND updateddate < NOW() - INTERVAL %s MINUTE
+                """, (TRANSCODE_LEASE_MINUTES,))
+                for job in await cursor.fetchall():
+                    if job['attempts'] >= TRANSCODE_MAX_ATTEMPTS:
+                        await self.mark_failed(cursor, job, "Transcode lease expired")
+                    else:
+                        await cursor.execute(
+                            "UPDATE mediajob SET status = 'queued', claimtoken = NULL WHERE jobid = %s AND status = 'running'",
+                            (job['jobid'],)
+                        )
+
+    async def process(self, job):
+        loop = asyncio.get_running_loop()
+        handler, recorder = MEDIA_JOB_HANDLERS[job['jobtype']]
+        lease = asyncio.create_task(self.renew_lease(job))
+        try:
+            result = await loop.run_in_executor(self.executor, handler, job['sourcekey'])
+        except Exception as e:
+            print(f"Error processing media job {job['jobid']}: {e}")
+            async with pool.acquire() as conn:
+                async with conn.cursor(aiomysql.DictCursor) as cursor:
+                    if job['attempts'] >= TRANSCODE_MAX_ATTEMPTS:
+                        await self.mark_failed(cursor, job, str(e))
+                    else:
+                        await cursor.execute(
+                            "UPDATE mediajob SET status = 'queued', claimtoken = NULL, error = %s WHERE jobid = %s AND claimtoken = %s",
+                            (str(e)[:1000], job['jobid'], job['claimtoken'])
+                        )
+            return
+        finally:
+            lease.cancel()
+
+        async with pool.acquire() as conn:
+            async with conn.cursor(aiomysql.DictCursor) as cursor:
+                await conn.begin()
+                try:
+                    objects = list(result['objects'])
+                    if result.get('mediasize') is not None:
+                        objects.append((result['mediakey'], result['mediasize'], 'video/mp4'))
+                    if objects:
+                        await cursor.executemany(
+                            "INSERT IGNORE INTO media (mediakey, mediasize, mediatype) VALUES (%s, %s, %s)",
+                            objects
+                        )
+                    await recorder(cursor, job, result)
+                    await cursor.execute(
+                        "UPDATE mediajob SET status = 'done', error = NULL WHERE jobid = %s",
+                        (job['jobid'],)
+                    )
+                    await conn.commit()
+                except Exception:
+                    await conn.rollback()
+                    raise
+        print(f"Media job {job['jobid']} ({job['jobtype']}) finished: {result['mediakey']}")
+
+    async def mark_failed(self, cursor, job, error: str):
+        await cursor.execute(
+            "UPDATE mediajob SET status = 'failed', error = %s WHERE jobid = %s",
+            (error[:1000], job['jobid'])
+        )
+        if job['postid']:
+            await cursor.execute("UPDATE post SET mediastatus = 'failed' WHERE postid = %s", (job['postid'],))
+        if job['grouppostid']:
+            await cursor.execute("UPDATE grouppost SET mediastatus = 'failed' WHERE postid = %s", (job['grouppostid'],))
+
+
+transcode_worker = TranscodeWorker()
+
+
 def generate_random_letter_string(length=30) -> str:
     if length <= 0:
         raise ValueError("Length must be positive")
@@ -3465,12 +5756,15 @@ async def add_post(
 
         if mediafile.content_type.startswith('video'):
             posttype = 'video'
-            media_data_stream = compress_video(media_data_stream)
+            mediatype = mediafile.content_type
         elif mediafile.content_type.startswith('audio'):
             posttype = 'audio'
+            mediatype = mediafile.content_type
         else:
             raise HTTPException(status_code=400, detail="Unsupported media type")
 
+        media_bytes = media_data_stream.getvalue()
+
     except Exception as e:
         print(f"Error processing media file: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error processing media file: {str(e)}")
@@ -3478,28 +5772,44 @@ async def add_post(
     try:
         async with pool.acquire() as conn:
             async with conn.cursor(aiomysql.DictCursor) as cursor:
-                await cursor.execute("SELECT username, profileimage FROM user WHERE userid = %s", (uid,))
-                user = await cursor.fetchone()
+                user = await run_query(cursor, "user_name", (uid,), fetch="one")
 
                 if not user:
                     raise HTTPException(status_code=404, detail="User not found")
 
                 username = user['username']
-                userprofile = user.get('profileimage', None)
                 letter_string = generate_random_letter_string()
                 post_id = generate_combined_post_id(letter_string)
 
+                mediakey = await save_media(cursor, media_bytes, mediatype)
+
+                # Videos are transcoded by the background worker; the post stays hidden
+                # from feeds until the worker flips it to 'ready'.
+                if posttype == 'video':
+                    mediastatus = 'processing'
+                    post_media = (None, None, None)
+                else:
+                    mediastatus = 'ready'
+                    post_media = (mediakey, len(media_bytes), mediatype)
+
                 insert_query = """
-                INSERT INTO post (postid, userid, username, postdescription, posteddate, posttype, userprofile, post)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+                INSERT INTO post (postid, userid, username, postdescription, posteddate, posttype, mediakey, mediasize, mediatype, mediastatus)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
                 """
+                await conn.begin()
                 await cursor.execute(
                     insert_query, 
-                    (post_id, uid, username, postdescription, createddate, posttype, userprofile, media_data_stream.read())
+                    (post_id, uid, username, postdescription, createddate, posttype, *post_media, mediastatus)
                 )
 
+                if posttype == 'video':
+                    await enqueue_transcode_job(cursor, mediakey, postid=post_id)
+
                 await conn.commit()
 
+                if posttype == 'video' and TRANSCODE_WORKER_ENABLED:
+                    transcode_worker.notify()
+
     except aiomysql.MySQLError as err:
         print(f"Database error: {err}")
         raise HTTPException(status_code=500, detail="Error storing media post in database")
@@ -3508,7 +5818,9 @@ async def add_post(
         print(f"Error: {e}")
         raise HTTPException(status_code=500, detail="Error storing media post in database")
 
-    return JSONResponse(content={"message": "Post added successfully"}, status_code=201)
+    schedule_fan_out(('n', post_id))
+
+    return ORJSONResponse(content={"message": "Post added successfully", "postid": post_id, "mediastatus": mediastatus}, status_code=201)
 
 
 
@@ -3543,13 +5855,14 @@ async def add_post_group(
 
         if mediafile.content_type.startswith('video'):
             posttype = 'video'
-            media_data_stream = compress_video(media_data_stream)
+            mediatype = mediafile.content_type
         elif mediafile.content_type.startswith('audio'):
             posttype = 'audio'
+            mediatype = mediafile.content_type
         else:
             raise HTTPException(status_code=400, detail="Unsupported media type")
 
-        media_data_stream.seek(0)
+        media_bytes = media_data_stream.getvalue()
 
     except Exception as e:
         print(f"Error processing media file: {str(e)}")
@@ -3558,40 +5871,57 @@ async def add_post_group(
     try:
         async with pool.acquire() as conn:
             async with conn.cursor(aiomysql.DictCursor) as cursor:
-                await cursor.execute("SELECT username, profileimage FROM user WHERE userid = %s", (uid,))
-                user = await cursor.fetchone()
+                user = await run_query(cursor, "user_name", (uid,), fetch="one")
 
                 if not user:
                     raise HTTPException(status_code=404, detail="User not found")
 
                 username = user['username']
-                userprofile = user.get('profileimage', None)
-
                 letter_string = generate_random_letter_string()
                 post_id = generate_combined_post_id(letter_string)
 
                 letter_string_group_post = generate_random_letter_string()
                 post_id_group_post = generate_combined_post_id(letter_string_group_post)
 
+                mediakey = await save_media(cursor, media_bytes, mediatype)
+
+                if posttype == 'video':
+                    mediastatus = 'processing'
+                    post_media = (None, None, None)
+                else:
+                    mediastatus = 'ready'
+                    post_media = (mediakey, len(media_bytes), mediatype)
+
+                await conn.begin()
                 if grouptype == "public":
                     await cursor.execute("""
-                        INSERT INTO post (postid, groupid, userid, username, postdescription, groupname, posteddate, posttype, userprofile, post, grouptype)
-                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                        INSERT INTO post (postid, groupid, userid, username, postdescription, groupname, posteddate, posttype, mediakey, mediasize, mediatype, mediastatus, grouptype)
+                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
                     """, (
                         post_id, groupid, uid, username, postdescription, groupname, createddate, posttype,
-                        userprofile, media_data_stream.getvalue(), grouptype
+                        *post_media, mediastatus, grouptype
                     ))
 
                 await cursor.execute("""
-                    INSERT INTO grouppost (postid, groupid, userid, username, postdescription, posteddate, posttype, userprofile, post)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+                    INSERT INTO grouppost (postid, groupid, userid, username, postdescription, posteddate, posttype, mediakey, mediasize, mediatype, mediastatus)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
                 """, (
                     post_id_group_post, groupid, uid, username, postdescription, createddate, posttype,
-                    userprofile, media_data_stream.getvalue()
+                    *post_media, mediastatus
                 ))
 
+                if posttype == 'video':
+                    await enqueue_transcode_job(
+                        cursor, mediakey,
+                        postid=post_id if grouptype == "public" else None,
+                        grouppostid=post_id_group_post
+                    )
+
                 await conn.commit()
 
+                if posttype == 'video' and TRANSCODE_WORKER_ENABLED:
+                    transcode_worker.notify()
+
     except aiomysql.MySQLError as err:
         print(f"Database error: {err}")
         raise HTTPException(status_code=500, detail="Error storing media post in database")
@@ -3600,7 +5930,137 @@ async def add_post_group(
         print(f"Error: {e}")
         raise HTTPException(status_code=500, detail="Error storing media post in database")
 
-    return JSONResponse(content={"message": "Post added successfully"}, status_code=201)
+    schedule_fan_out(('n', post_id), ('g', post_id_group_post))
+
+    return ORJSONResponse(content={
+        "message": "Post added successfully",
+        "postid": post_id if grouptype == "public" else None,
+        "grouppostid": post_id_group_post,
+        "mediastatus": mediastatus,
+    }, status_code=201)
+
+
+
+
+
+@app.get("/get_post_media_status")
+async def get_post_media_status(postid: int = Query(...), n_or_g: str = Query('n')):
+    """
+    Poll target for uploads: 'processing' until the transcode job finishes, then 'ready'
+    (or 'failed').
+    """
+    table = "grouppost" if n_or_g == 'g' else "post"
+    job_column = "grouppostid" if n_or_g == 'g' else "postid"
+
+    async with pool.acquire() as conn:
+        async with conn.cursor(aiomysql.DictCursor) as cursor:
+            await cursor.execute(f"SELECT postid, mediakey, mediastatus, posterkey FROM {table} WHERE postid = %s", (postid,))
+            record = await cursor.fetchone()
+
+            if not record:
+                raise HTTPException(status_code=404, detail="Post not found")
+
+            await cursor.execute(
+                f"SELECT status, attempts, error FROM mediajob WHERE {job_column} = %s ORDER BY jobid DESC LIMIT 1",
+                (postid,)
+            )
+            job = await cursor.fetchone()
+
+    return ORJSONResponse(content={
+        "postid": record['postid'],
+        "mediastatus": record['mediastatus'],
+        "posturl": media_url(record['mediakey']) if record['mediakey'] else None,
+        "posterurl": media_url(record['posterkey']) if record['posterkey'] else None,
+        "jobstatus": job['status'] if job else None,
+        "attempts": job['attempts'] if job else 0,
+        "error": job['error'] if job and record['mediastatus'] == 'failed' else None,
+    }, status_code=200)
+
+
+
+
+
+async def load_video_renditions(cursor, mediakeys):
+    """
+    Fetch the HLS renditions for a batch of videos, keyed by mediakey and sorted by bandwidth.
+    """
+    mediakeys = list({key for key in mediakeys if key})
+    if not mediakeys:
+        return {}
+
+    placeholders = ", ".join(["%s"] * len(mediakeys))
+    await cursor.execute(f"""
+        SELECT mediakey, rendition, width, height, bandwidth, playlistkey, mediasize, segmentcount
+        FROM videorendition
+        WHERE mediakey IN ({placeholders})
+        ORDER BY bandwidth
+    """, mediakeys)
+
+    renditions = {}
+    for row in await cursor.fetchall():
+        renditions.setdefault(row['mediakey'], []).append(row)
+    return renditions
+
+
+def pick_rendition(renditions, bandwidth: int):
+    """
+    Highest rendition that fits the bandwidth budget, or the lowest one if none fit.
+    """
+    if not renditions:
+        return None
+    fitting = [r for r in renditions if r['bandwidth'] <= bandwidth]
+    return fitting[-1] if fitting else renditions[0]
+
+
+def client_bandwidth(request: Request, maxbandwidth: Optional[int]) -> int:
+    """
+    Bandwidth budget in bits/s: an explicit maxbandwidth wins, then the Save-Data and
+    Downlink (Mbps) client hints, then HLS_DEFAULT_BANDWIDTH.
+    """
+    if maxbandwidth:
+        return maxbandwidth
+    if request.headers.get("save-data", "").lower() == "on":
+        return 0
+    downlink = request.headers.get("downlink")
+    if downlink:
+        try:
+            # Leave headroom so playback does not stall at the measured rate.
+            return int(float(downlink) * 1000000 * 0.8)
+        except ValueError:
+            pass
+    return HLS_DEFAULT_BANDWIDTH
+
+
+@app.get("/hls/{mediakey}/master.m3u8")
+async def get_hls_master_playlist(mediakey: str):
+    if not is_valid_media_key(mediakey):
+        raise HTTPException(status_code=404, detail="Video not found")
+
+    async with pool.acquire() as conn:
+        async with conn.cursor(aiomysql.DictCursor) as cursor:
+            renditions = (await load_video_renditions(cursor, [mediakey])).get(mediakey)
+
+    if not renditions:
+        raise HTTPException(status_code=404, detail="Video not found")
+
+    lines = ["#EXTM3U", "#EXT-X-VERSION:3"]
+    for rendition in renditions:
+        lines.append(
+            f"#EXT-X-STREAM-INF:BANDWIDTH={rendition['bandwidth']},"
+            f"RESOLUTION={rendition['width']}x{rendition['height']},"
+            f"CODECS=\"avc1.4d401f,mp4a.40.2\",NAME=\"{rendition['rendition']}\""
+        )
+        lines.append(media_url(rendition['playlistkey']))
+
+    return Response(
+        content="\n".join(lines) + "\n",
+        media_type="application/vnd.apple.mpegurl",
+        headers={"Cache-Control": "public, max-age=300"},
+    )
+
+
+def hls_master_url(mediakey: str) -> str:
+    return f"{MEDIA_BASE_URL}/hls/{mediakey}/master.m3u8"
 
 
 
@@ -3633,51 +6093,47 @@ async def add_post_image(
 
         async with pool.acquire() as conn:
             async with conn.cursor(aiomysql.DictCursor) as cursor:
-                await cursor.execute("SELECT username, profileimage FROM user WHERE userid = %s", (uid,))
-                user = await cursor.fetchone()
+                user = await run_query(cursor, "user_name", (uid,), fetch="one")
 
                 if not user:
                     raise HTTPException(status_code=404, detail="User not found")
                 
-                print("Profile image data:", user.get('profileimage'))
-
                 username = user['username']
-                userprofile = user.get('profileimage', None)
-
                 letter_string = generate_random_letter_string()
                 post_id = generate_combined_post_id(letter_string)
 
-                first_image_data = None
-                if len(imagefile) > 0 and imagefile[0].content_type.startswith('image'):
-                    first_image_data = await imagefile[0].read()
+                stored_images = []
+                for file in imagefile:
+                    if file.content_type.startswith('image'):
+                        media_data = await file.read()
+                        stored_images.append(await store_uploaded_image(cursor, media_data, file.content_type))
+
+                first_image = (*stored_images[0][:3], stored_images[0][5]) if stored_images else (None, None, None, None)
 
                 await cursor.execute(
                     """
-                    INSERT INTO post (postid, userid, username, postdescription, posteddate, posttype, post, userprofile)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+                    INSERT INTO post (postid, userid, username, postdescription, posteddate, posttype, mediakey, mediasize, mediatype, placeholder)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
                     """,
-                    (post_id, uid, username, imagePostdescription, createddate, 'image', first_image_data, userprofile)
+                    (post_id, uid, username, imagePostdescription, createddate, 'image', *first_image)
                 )
 
                 await conn.commit()
 
-                for index, file in enumerate(imagefile):
-                    if file.content_type.startswith('image'):
-                        if index == 0:
-                            media_data = first_image_data
-                        else:
-                            media_data = await file.read()
-
-                        await cursor.execute(
-                            """
-                            INSERT INTO image (postid, image)
-                            VALUES (%s, %s)
-                            """,
-                            (post_id, media_data)
-                        )
+                for mediakey, mediasize, mediatype, width, height, placeholder in stored_images:
+                    await cursor.execute(
+                        """
+                        INSERT INTO image (postid, mediakey, mediasize, mediatype, width, height, placeholder)
+                        VALUES (%s, %s, %s, %s, %s, %s, %s)
+                        """,
+                        (post_id, mediakey, mediasize, mediatype, width, height, placeholder)
+                    )
 
                 await conn.commit()
 
+    except HTTPException:
+        raise
+
     except aiomysql.MySQLError as err:
         print(f"Database error: {err}")
         raise HTTPException(status_code=500, detail="Error storing image post in database")
@@ -3686,7 +6142,9 @@ async def add_post_image(
         print(f"Error: {e}")
         raise HTTPException(status_code=500, detail="Error processing request")
 
-    return JSONResponse(content={"message": "Post added successfully"}, status_code=201)
+    schedule_fan_out(('n', post_id))
+
+    return ORJSONResponse(content={"message": "Post added successfully"}, status_code=201)
 
 
 
@@ -3719,69 +6177,69 @@ async def add_post_image_group(
 
         async with pool.acquire() as conn:
             async with conn.cursor(aiomysql.DictCursor) as cursor:
-                await cursor.execute("SELECT username, profileimage FROM user WHERE userid = %s", (uid,))
-                user = await cursor.fetchone()
+                user = await run_query(cursor, "user_name", (uid,), fetch="one")
 
                 if not user:
                     raise HTTPException(status_code=404, detail="User not found")
 
                 username = user['username']
-                userprofile = user.get('profileimage', None)
-
                 letter_string = generate_random_letter_string()
                 post_id = generate_combined_post_id(letter_string)
 
                 letter_string_group_post = generate_random_letter_string()
                 post_id_group_post = generate_combined_post_id(letter_string_group_post)
 
-                image_data_list = []
+                stored_images = []
                 for index, file in enumerate(imagefile):
                     if file.content_type.startswith('image'):
                         media_data = await file.read()
                         if not media_data:
                             raise ValueError(f"Image data is empty for image index {index}")
-                        image_data_list.append(media_data)
+                        stored_images.append(await store_uploaded_image(cursor, media_data, file.content_type))
 
-                first_image_data = image_data_list[0] if image_data_list else None
+                first_image = (*stored_images[0][:3], stored_images[0][5]) if stored_images else (None, None, None, None)
 
                 if grouptype == "public":
                     await cursor.execute(
                         """
-                        INSERT INTO post (postid, groupid, userid, username, postdescription, groupname, posteddate, posttype, post, userprofile, grouptype)
-                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                        INSERT INTO post (postid, groupid, userid, username, postdescription, groupname, posteddate, posttype, grouptype, mediakey, mediasize, mediatype, placeholder)
+                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
                         """,
-                        (post_id, groupid, uid, username, imagePostdescription, groupname, createddate, 'image', first_image_data, userprofile, grouptype)
+                        (post_id, groupid, uid, username, imagePostdescription, groupname, createddate, 'image', grouptype, *first_image)
                     )
 
-                    for index, media_data in enumerate(image_data_list):
+                    for mediakey, mediasize, mediatype, width, height, placeholder in stored_images:
                         await cursor.execute(
                             """
-                            INSERT INTO image (postid, image)
-                            VALUES (%s, %s)
+                            INSERT INTO image (postid, mediakey, mediasize, mediatype, width, height, placeholder)
+                            VALUES (%s, %s, %s, %s, %s, %s, %s)
                             """,
-                            (post_id, media_data)
+                            (post_id, mediakey, mediasize, mediatype, width, height, placeholder)
                         )
 
                 await cursor.execute(
                     """
-                    INSERT INTO grouppost (postid, groupid, userid, username, postdescription, posteddate, posttype, post, userprofile)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+                    INSERT INTO grouppost (postid, groupid, userid, username, postdescription, posteddate, posttype, mediakey, mediasize, mediatype, placeholder)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
                     """,
-                    (post_id_group_post, groupid, uid, username, imagePostdescription, createddate, 'image', first_image_data, userprofile)
+                    (post_id_group_post, groupid, uid, username, imagePostdescription, createddate, 'image', *first_image)
                 )
 
-                for index, media_data in enumerate(image_data_list):
+                for index, (mediakey, mediasize, mediatype, width, height, placeholder) in enumerate(stored_images):
                     await cursor.execute(
                         """
-                        INSERT INTO groupimage (postid, image)
-                        VALUES (%s, %s)
+                        INSERT INTO groupimage (postid, mediakey, mediasize, mediatype, width, height, placeholder)
+                        VALUES (%s, %s, %s, %s, %s, %s, %s)
                         """,
-                        (post_id_group_post, media_data)
+                        (post_id_group_post, mediakey, mediasize, mediatype, width, height, placeholder)
                     )
                     print(f"Inserted image {index + 1} into groupimage table")
 
                 await conn.commit()
-                print(f"Total images inserted: {len(image_data_list)}")
+                print(f"Total images inserted: {len(stored_images)}")
+
+    except HTTPException:
+        raise
 
     except aiomysql.MySQLError as err:
         print(f"Database error: {err}")
@@ -3791,7 +6249,9 @@ async def add_post_image_group(
         print(f"Error: {e}")
         raise HTTPException(status_code=500, detail="Error processing request")
 
-    return JSONResponse(content={"message": "Post added successfully"}, status_code=201)
+    schedule_fan_out(('n', post_id), ('g', post_id_group_post))
+
+    return ORJSONResponse(content={"message": "Post added successfully"}, status_code=201)
 
 
 
@@ -3822,15 +6282,12 @@ async def add_post_link(
     try:
         async with pool.acquire() as conn:
             async with conn.cursor(aiomysql.DictCursor) as cursor:
-                await cursor.execute("SELECT username, profileimage FROM user WHERE userid = %s", (uid,))
-                user = await cursor.fetchone()
+                user = await run_query(cursor, "user_name", (uid,), fetch="one")
 
                 if not user:
                     raise HTTPException(status_code=404, detail="User not found")
 
                 username = user['username']
-                userprofile = user.get('profileimage', None)
-
                 letter_string = generate_random_letter_string()
                 post_id = generate_combined_post_id(letter_string)
 
@@ -3840,9 +6297,9 @@ async def add_post_link(
                     """
                     INSERT INTO post (
                         postid, userid, username, postdescription, posteddate, 
-                        posttype, post, userprofile, filepath, textbody, thelink
+                        posttype, post, filepath, textbody, thelink
                     )
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
                     """,
                     (
                         post_id,
@@ -3852,7 +6309,6 @@ async def add_post_link(
                         createddate,
                         'link',
                         linkimageinsert,  # 'post' field for storing preview image
-                        userprofile,
                         linktitle,         # 'filepath' for storing link title
                         linkimageinsert,   # reuse in 'textbody' if needed
                         thelink
@@ -3868,7 +6324,9 @@ async def add_post_link(
         print(f"Error: {e}")
         raise HTTPException(status_code=500, detail="Error processing request")
 
-    return JSONResponse(content={"message": "Link post added successfully"}, status_code=201)
+    schedule_fan_out(('n', post_id))
+
+    return ORJSONResponse(content={"message": "Link post added successfully"}, status_code=201)
 
 
 
@@ -3904,15 +6362,12 @@ async def add_post_link_group(
                 if str(current_user) != str(uid):
                     raise HTTPException(status_code=401, detail="Unauthorized access")
 
-                await cursor.execute("SELECT username, profileimage FROM user WHERE userid = %s", (uid,))
-                user = await cursor.fetchone()
+                user = await run_query(cursor, "user_name", (uid,), fetch="one")
 
                 if not user:
                     raise HTTPException(status_code=404, detail="User not found")
 
                 username = user['username']
-                userprofile = user.get('profileimage', None)
-
                 letter_string = generate_random_letter_string()
                 post_id = generate_combined_post_id(letter_string)
 
@@ -3926,10 +6381,10 @@ async def add_post_link_group(
                         """
                         INSERT INTO post (
                             postid, groupid, userid, username, postdescription, posteddate, posttype,
-                            userprofile, filepath, textbody, thelink, groupname, grouptype
-                        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                            filepath, textbody, thelink, groupname, grouptype
+                        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
                         """,
-                        (post_id, groupid, uid, username, imagePostdescription, createddate, 'link', userprofile,
+                        (post_id, groupid, uid, username, imagePostdescription, createddate, 'link',
                          linktitle, linkimageinsert, thelink, groupname, grouptype)
                     )
                     await conn.commit()
@@ -3937,12 +6392,12 @@ async def add_post_link_group(
                 await cursor.execute(
                     """
                     INSERT INTO grouppost (
-                        postid, groupid, userid, username, postdescription, posteddate, posttype, userprofile,
+                        postid, groupid, userid, username, postdescription, posteddate, posttype,
                         filepath, textbody, thelink
-                    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
                     """,
                     (post_id_group_post, groupid, uid, username, imagePostdescription, createddate, 'link',
-                     userprofile, linktitle, linkimageinsert, thelink)
+                     linktitle, linkimageinsert, thelink)
                 )
 
                 await conn.commit()
@@ -3954,7 +6409,9 @@ async def add_post_link_group(
         print(f"Error: {e}")
         raise HTTPException(status_code=500, detail="Error processing request")
     
-    return JSONResponse(content={"message": "Post added successfully"}, status_code=201)
+    schedule_fan_out(('n', post_id), ('g', post_id_group_post))
+
+    return ORJSONResponse(content={"message": "Post added successfully"}, status_code=201)
 
 
 
@@ -3985,14 +6442,12 @@ async def add_text_post(
                 if str(current_user) != userid:
                     raise HTTPException(status_code=401, detail="Unauthorized access")
 
-                await cursor.execute("SELECT username, profileimage FROM user WHERE userid = %s", (userid,))
-                user = await cursor.fetchone()
+                user = await run_query(cursor, "user_name", (userid,), fetch="one")
 
                 if not user:
                     raise HTTPException(status_code=404, detail="User not found")
 
                 username = user['username']
-                userprofile = user.get('profileimage', None)
                 letter_string = generate_random_letter_string()
                 post_id = generate_combined_post_id(letter_string)
 
@@ -4000,11 +6455,11 @@ async def add_text_post(
                     """
                     INSERT INTO post (
                         postid, userid, username, postdescription, posteddate, posttype,
-                        post, userprofile, filepath, textcolor, textbody
-                    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                        post, filepath, textcolor, textbody
+                    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
                     """,
                     (post_id, userid, username, textPostdescription, createddate, 'text', "",
-                     userprofile, "", selectedColor, textPostbody)
+                     "", selectedColor, textPostbody)
                 )
                 
                 await conn.commit()
@@ -4016,7 +6471,9 @@ async def add_text_post(
         print(f"Error: {e}")
         raise HTTPException(status_code=500, detail="Error processing request")
 
-    return JSONResponse(content={"message": "Post added successfully"}, status_code=201)
+    schedule_fan_out(('n', post_id))
+
+    return ORJSONResponse(content={"message": "Post added successfully"}, status_code=201)
 
 
 
@@ -4049,180 +6506,1036 @@ async def add_text_post_group(
     async with pool.acquire() as conn:
         async with conn.cursor(aiomysql.DictCursor) as cursor:
             try:
-                await cursor.execute("SELECT username, profileimage FROM user WHERE userid = %s", (userid,))
-                user = await cursor.fetchone()
+                user = await run_query(cursor, "user_name", (userid,), fetch="one")
+
+                if not user:
+                    raise HTTPException(status_code=404, detail="User not found")
+
+                username = user['username']
+                letter_string = generate_random_letter_string()  
+                post_id = generate_combined_post_id(letter_string)  
+                
+                letter_string_group_post = generate_random_letter_string()  
+                post_id_group_post = generate_combined_post_id(letter_string_group_post)  
+
+                if grouptype == "public":
+                    await cursor.execute(
+                        """
+                        INSERT INTO post (
+                            postid, groupid, userid, username, postdescription, posteddate, posttype, textcolor, textbody, groupname, grouptype
+                        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                        """,
+                        (post_id, groupid, userid, username, textPostdescription, createddate, 'text', selectedColor, textPostbody, groupname, grouptype)
+                    )
+
+                await cursor.execute(
+                    """
+                    INSERT INTO grouppost (
+                        postid, groupid, userid, username, postdescription, posteddate, posttype, textcolor, textbody
+                    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+                    """,
+                    (post_id_group_post, groupid, userid, username, textPostdescription, createddate, 'text', selectedColor, textPostbody)
+                )
+                
+                await conn.commit()
+
+            except aiomysql.MySQLError as err:
+                print(f"Database error: {err}")
+                raise HTTPException(status_code=500, detail="Error storing text post in database")
+            except Exception as e:
+                print(f"Error: {e}")
+                raise HTTPException(status_code=500, detail="Error processing request")
+
+    schedule_fan_out(('n', post_id), ('g', post_id_group_post))
+
+    return ORJSONResponse(content={"message": "Post added successfully"}, status_code=201)
+
+
+
+ 
+ 
+
+
+
+
+
+
+
+
+
+
+@app.get("/delete_post")
+async def delete_post(
+    postid: int = Query(...),
+    userid: int = Query(...),
+    current_user: str = Depends(get_current_user),
+):
+    """
+    Delete a post by its ID.
+
+    Args:
+    postid (int): The ID of the post to be deleted.
+
+    Returns:
+    JSONResponse: A JSON response indicating the result of the deletion.
+    """
+    try:
+        if str(current_user) != str(userid):
+            raise HTTPException(status_code=401, detail="Unauthorized access")
+
+        async with pool.acquire() as conn:
+            async with conn.cursor() as cursor:
+                result = await cursor.execute("DELETE FROM post WHERE postid=%s", (postid,))
+                
+                if result == 0:
+                    raise HTTPException(status_code=404, detail="Post not found")
+
+                await conn.commit()
+                post_cache.invalidate_post('n', postid)
+                note_write()
+
+        return ORJSONResponse(content={"message": "Deleted"}, status_code=200)
+    
+    except aiomysql.MySQLError as err:
+        print(f"Database error: {err}")
+        raise HTTPException(status_code=500, detail="Error deleting post from database")
+    
+    except Exception as e:
+        print(f"Error: {e}")
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+            
+            
+          
+
+            
+            
+            
+            
+            
+            
+            
+            
+            
+            
+            
+def encode_cursor(state: dict) -> str:
+    """
+    Opaque pagination token handed back to clients in the X-Next-Cursor header.
+    """
+    return base64.urlsafe_b64encode(json.dumps(state, separators=(',', ':')).encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token: str) -> dict:
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        state = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, UnicodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(state, dict):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return state
+
+
+FEED_INDEX_CACHE_MB = int(os.getenv("FEED_INDEX_CACHE_MB", "64"))
+FEED_INDEX_TTL_SECONDS = int(os.getenv("FEED_INDEX_TTL_SECONDS", "3600"))
+FEED_INDEX_SEEDS = int(os.getenv("FEED_INDEX_SEEDS", "8"))
+FEED_INDEX_BUCKET_SECONDS = int(os.getenv("FEED_INDEX_BUCKET_SECONDS", "300"))
+
+
+def shuffle_key(seed: int, postid: int) -> int:
+    """
+    Position of `postid` in the shuffle for `seed`: the splitmix64 finalizer of the
+    two, a bijection on 64-bit IDs, so every post gets its own key.
+    """
+    x = (postid ^ (seed * 0x9E3779B97F4A7C15)) & 0xFFFFFFFFFFFFFFFF
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & 0xFFFFFFFFFFFFFFFF
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & 0xFFFFFFFFFFFFFFFF
+    return x ^ (x >> 31)
+
+
+class ShuffledFeedIndex:
+    """
+    Shuffled feeds without ORDER BY RAND().
+
+    The first page of a session picks one of FEED_INDEX_SEEDS seeds and the current
+    FEED_INDEX_BUCKET_SECONDS snapshot. Every session that lands on the same (feed,
+    seed, snapshot) shares one permutation, so the candidate post IDs are loaded
+    (an index-only query) and shuffled at most once per seed and bucket, however
+    many sessions start in it. Permutations are compact arrays in an LRU bounded
+    by their size in bytes.
+
+    The shuffle orders posts by shuffle_key(seed, postid) and the cursor carries
+    the key of the last post sent, so a page starts with a binary search and pages
+    never overlap. An evicted index is rebuilt from the posts that existed at the
+    snapshot; posts deleted or hidden since then are simply missing from it, and
+    the next page still starts right after the last post sent.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = FEED_INDEX_CACHE_MB * 1024 * 1024,
+        ttl_seconds: int = FEED_INDEX_TTL_SECONDS,
+        seeds: int = FEED_INDEX_SEEDS,
+        bucket_seconds: int = FEED_INDEX_BUCKET_SECONDS,
+    ):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.seeds = max(1, seeds)
+        self.bucket_seconds = max(1, bucket_seconds)
+        self.entries = OrderedDict()
+        self.loading = {}
+        self.bytes = 0
+        self.builds = 0
+        self.hits = 0
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        expires, ids = entry
+        if expires < time.monotonic():
+            self.remove(key)
+            return None
+        self.entries.move_to_end(key)
+        return ids
+
+    def put(self, key, ids):
+        if key in self.entries:
+            self.remove(key)
+        size = len(ids) * ids.itemsize
+        if size > self.max_bytes:
+            return
+        self.entries[key] = (time.monotonic() + self.ttl_seconds, ids)
+        self.bytes += size
+        while self.bytes > self.max_bytes:
+            self.remove(next(iter(self.entries)))
+
+    def remove(self, key):
+        expires, ids = self.entries.pop(key)
+        self.bytes -= len(ids) * ids.itemsize
+
+    def current_snapshot(self) -> str:
+        now = int(time.time())
+        return datetime.fromtimestamp(now - now % self.bucket_seconds).strftime('%Y-%m-%d %H:%M:%S')
+
+    async def build(self, key, seed: int, snapshot: str, load_candidates):
+        """
+        The permutation for `key`, loading it once even when several sessions ask
+        for it at the same time. `load_candidates` runs on the caller's connection,
+        so if the request building it goes away the next waiter builds it instead.
+        """
+        while (loading := self.loading.get(key)) is not None:
+            try:
+                return await asyncio.shield(loading)
+            except asyncio.CancelledError:
+                if not loading.cancelled():
+                    raise
+            ids = self.get(key)
+            if ids is not None:
+                return ids
+
+        loading = asyncio.get_running_loop().create_future()
+        self.loading[key] = loading
+        try:
+            candidates = sorted(set(await load_candidates(snapshot)), key=lambda postid: shuffle_key(seed, postid))
+            ids = array('q', candidates)
+            self.builds += 1
+            self.put(key, ids)
+            loading.set_result(ids)
+            return ids
+        except BaseException as e:
+            if isinstance(e, asyncio.CancelledError):
+                loading.cancel()
+            else:
+                loading.set_exception(e)
+                loading.exception()
+            raise
+        finally:
+            if self.loading.get(key) is loading:
+                del self.loading[key]
+
+    async def page(self, feed: str, load_candidates, limit: int, cursor_token: Optional[str] = None):
+        """
+        Return (ids, next_cursor) for one page. `load_candidates(snapshot)` must return
+        the integer IDs eligible for the feed as of `snapshot`.
+        """
+        if cursor_token:
+            state = decode_cursor(cursor_token)
+            try:
+                seed, snapshot, after = int(state['seed']), str(state['snapshot']), int(state['after'])
+            except (KeyError, TypeError, ValueError):
+                raise HTTPException(status_code=400, detail="Invalid cursor")
+        else:
+            seed = secrets.randbelow(self.seeds)
+            snapshot = self.current_snapshot()
+            after = None
+
+        key = (feed, seed, snapshot)
+        ids = self.get(key)
+        if ids is None:
+            ids = await self.build(key, seed, snapshot, load_candidates)
+        else:
+            self.hits += 1
+
+        position = 0
+        if after is not None:
+            low, high = 0, len(ids)
+            while low < high:
+                middle = (low + high) // 2
+                if shuffle_key(seed, ids[middle]) <= after:
+                    low = middle + 1
+                else:
+                    high = middle
+            position = low
+
+        page_ids = ids[position:position + limit].tolist()
+        next_cursor = None
+        if page_ids and position + len(page_ids) < len(ids):
+            next_cursor = encode_cursor({'seed': seed, 'snapshot': snapshot, 'after': shuffle_key(seed, page_ids[-1])})
+        return page_ids, next_cursor
+
+    def stats(self) -> dict:
+        return {
+            'entries': len(self.entries),
+            'bytes': self.bytes,
+            'max_bytes': self.max_bytes,
+            'builds': self.builds,
+            'hits': self.hits,
+        }
+
+
+feed_index = ShuffledFeedIndex()
+
+
+async def fetch_rows_in_order(cursor, name: str, ids, key: str = 'postid'):
+    """
+    Run the registered query `name` (which must contain one IN ({ids}) placeholder)
+    for a page of IDs and return the rows in the order of `ids`, skipping IDs that
+    no longer exist.
+    """
+    if not ids:
+        return []
+    placeholders = ", ".join(["%s"] * len(ids))
+    rows = await run_query(cursor, name, list(ids), ids=placeholders)
+    rows_by_id = {row[key]: row for row in rows}
+    return [rows_by_id[id] for id in ids if id in rows_by_id]
+
+
+
+
+def keyset_filter(columns, cursor_token: Optional[str]):
+    """
+    SQL condition selecting the rows after a keyset cursor for a query ordered by
+    `columns`, all DESC. Returns ("1 = 1", []) when there is no cursor.
+    """
+    if not cursor_token:
+        return "1 = 1", []
+
+    values = decode_cursor(cursor_token).get('after')
+    if not isinstance(values, list) or len(values) != len(columns):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    clauses = []
+    args = []
+    for index, column in enumerate(columns):
+        parts = [f"{previous} = %s" for previous in columns[:index]] + [f"{column} < %s"]
+        clauses.append("(" + " AND ".join(parts) + ")")
+        args.extend(values[:index + 1])
+    return "(" + " OR ".join(clauses) + ")", args
+
+
+def next_keyset_cursor(records, fields, limit: int) -> Optional[str]:
+    """
+    Cursor pointing after the last row of a full page; None once the page comes back short.
+    Must be taken before the rows are serialized.
+    """
+    if not records or len(records) < limit:
+        return None
+    last = records[-1]
+    return encode_cursor({'after': [
+        str(last[field]) if isinstance(last[field], (datetime, Decimal)) else last[field]
+        for field in fields
+    ]})
+
+
+
+
+async def load_feed_images(cursor, records, image_table: str = 'image', cardwidth: int = IMAGE_CARD_WIDTH):
+    """
+    Fetch the images of every image post on a feed page in one query and group them
+    by postid, instead of one post/image join per post.
+    """
+    postids = [record['postid'] for record in records if record['posttype'] == 'image']
+    return await load_images_by_post(cursor, postids, image_table, cardwidth)
+
+
+async def load_images_by_post(cursor, postids, image_table: str = 'image', cardwidth: int = IMAGE_CARD_WIDTH):
+    """
+    The feed images of `postids` grouped by postid; posts without images are absent.
+    """
+    if not postids:
+        return {}
+
+    placeholders = ", ".join(["%s"] * len(postids))
+    name = "feed_groupimages" if image_table == 'groupimage' else "feed_images"
+    image_rows = await run_query(cursor, name, list(postids), ids=placeholders)
+    attach_media_urls(image_rows, 'image', 'imagemediakey')
+    await attach_image_derivatives(cursor, image_rows, cardwidth)
+
+    images_by_post = {}
+    for row in image_rows:
+        images_by_post.setdefault(row['postid'], []).append(row)
+    return images_by_post
+
+
+def compile_row_serializer(fields, blob_fields=(), datetime_fields=()):
+    """
+    Compile a function turning a database row into a dict with exactly `fields`, in
+    order (columns missing from the row become None). `blob_fields` (bytes or None)
+    are base64 encoded, empty blobs becoming None, and `datetime_fields` are ISO
+    formatted. The field list is resolved once, here: the generated function is a
+    single dict display with the encoding inlined, with no per-row walk over the
+    keys and no type checks on fields that cannot hold bytes or datetimes.
+    """
+    items = []
+    for field in fields:
+        if field in blob_fields:
+            value = f"b64encode(value).decode('ascii') if (value := get({field!r})) else None"
+        elif field in datetime_fields:
+            value = f"value.isoformat() if (value := get({field!r})) is not None else None"
+        else:
+            value = f"get({field!r})"
+        items.append(f"{field!r}: {value}")
+
+    source = "def serialize(record):\n    get = record.get\n    return {" + ", ".join(items) + "}\n"
+    namespace = {'b64encode': base64.b64encode}
+    exec(source, namespace)
+    return namespace['serialize']
+
+
+# Columns of the post and grouppost tables, for routes returning whole post rows,
+# followed by the URLs attach_media_urls/attach_video_previews/attach_avatar_urls add.
+POST_COLUMNS = (
+    'postid', 'userid', 'username', 'postdescription', 'groupname', 'posteddate', 'posttype', 'post',
+    'userprofile', 'filepath', 'textcolor', 'textbody', 'popularcount', 'thelink', 'groupid', 'grouptype',
+    'n_or_g', 'mediakey', 'mediasize', 'mediatype', 'mediastatus', 'posterkey', 'previewkey', 'placeholder',
+    'likecount', 'commentcount',
+)
+GROUPPOST_COLUMNS = (
+    'postid', 'groupid', 'userid', 'username', 'postdescription', 'posteddate', 'posttype', 'post',
+    'userprofile', 'filepath', 'groupname', 'textcolor', 'textbody', 'popularcount', 'thelink', 'n_or_g',
+    'mediakey', 'mediasize', 'mediatype', 'mediastatus', 'posterkey', 'previewkey', 'placeholder',
+    'likecount', 'commentcount',
+)
+POST_URL_FIELDS = ('posturl', 'posterurl', 'previewurl', 'userprofileurl')
+POST_BLOB_FIELDS = ('post', 'userprofile')
+
+serialize_post = compile_row_serializer(POST_COLUMNS + POST_URL_FIELDS, POST_BLOB_FIELDS, ('posteddate',))
+serialize_group_post = compile_row_serializer(GROUPPOST_COLUMNS + POST_URL_FIELDS, POST_BLOB_FIELDS, ('posteddate',))
+serialize_video_slide = compile_row_serializer(
+    POST_COLUMNS + POST_URL_FIELDS + ('hlsurl', 'rendition'), POST_BLOB_FIELDS, ('posteddate',)
+)
+
+
+# Fields of a serialized feed row. Image posts expand to one row per image, each
+# with these fields plus image/imagemediakey/imageurl/imagewidth/imageheight.
+FEED_POST_FIELDS = (
+    'postid', 'userid', 'username', 'postdescription', 'posteddate', 'posttype', 'post',
+    'posturl', 'posterurl', 'previewurl', 'placeholder', 'userprofile', 'userprofileurl', 'filepath',
+    'textcolor', 'textbody', 'thelink', 'groupid', 'grouptype', 'groupname', 'n_or_g', 'popularcount',
+    'likecount', 'commentcount',
+)
+FEED_IMAGE_FIELDS = ('image', 'imagemediakey', 'imageurl', 'imagewidth', 'imageheight')
+EMPTY_FEED_IMAGE = {'image': None, 'imagemediakey': None, 'placeholder': None, 'imageurl': None}
+
+serialize_feed_post = compile_row_serializer(FEED_POST_FIELDS, POST_BLOB_FIELDS)
+serialize_feed_image = compile_row_serializer(FEED_IMAGE_FIELDS, ('image',))
+
+
+def projection(columns, expressions=None) -> str:
+    """
+    SELECT list naming `columns`, with `expressions` ({column: SQL}) selected AS the
+    column instead. Queries spell out their columns rather than SELECT * so LONGBLOB
+    columns are only read from MySQL when the route sends them (lint_sql.py checks).
+    """
+    expressions = expressions or {}
+    return ", ".join(f"{expressions[column]} AS {column}" if column in expressions else column for column in columns)
+
+
+def avatar_expressions(userid_sql: str, blob_field: str) -> dict:
+    """
+    projection() expressions reading a row's avatar from its user rather than from a
+    per-row copy: only 'avatarkey', for attach_avatar_urls. `blob_field` comes back
+    NULL; the legacy profileimage of users migrate_avatars has not reached yet is
+    filled in after the read (attach_avatars, load_legacy_avatars), once per user
+    rather than once per row.
+    """
+    return {
+        'avatarkey': f"(SELECT avatar.avatarkey FROM user avatar WHERE avatar.userid = {userid_sql})",
+        blob_field: "NULL",
+    }
+
+
+# Blobs already copied to the media store are replaced by their URL after the read
+# (attach_media_urls/attach_video_previews), so MySQL need not send them at all.
+MIGRATED_POST_BLOB = "IF(mediakey IS NULL, post, NULL)"
+MIGRATED_IMAGE_BLOB = "IF(mediakey IS NULL, image, NULL)"
+PREVIEW_POST_BLOB = "IF(mediakey IS NOT NULL OR posttype = 'video', NULL, post)"
+
+POST_AVATAR = avatar_expressions('post.userid', 'userprofile')
+GROUPPOST_AVATAR = avatar_expressions('grouppost.userid', 'userprofile')
+
+POST_SELECT = projection(POST_COLUMNS + ('avatarkey',), {'post': MIGRATED_POST_BLOB, **POST_AVATAR})
+GROUPPOST_SELECT = projection(GROUPPOST_COLUMNS + ('avatarkey',), {'post': MIGRATED_POST_BLOB, **GROUPPOST_AVATAR})
+# For rows that also go through attach_video_previews, which never inlines a video.
+POST_PREVIEW_SELECT = projection(POST_COLUMNS + ('avatarkey',), {'post': PREVIEW_POST_BLOB, **POST_AVATAR})
+
+# What build_post_rows reads: the feed fields stored in the table plus the media keys
+# the URLs are built from. grouppost has no grouptype column.
+FEED_SOURCE_COLUMNS = tuple(
+    field for field in FEED_POST_FIELDS if field not in POST_URL_FIELDS
+) + ('mediakey', 'posterkey', 'previewkey')
+FEED_POST_SELECT = projection(FEED_SOURCE_COLUMNS + ('avatarkey',), {'post': PREVIEW_POST_BLOB, **POST_AVATAR})
+FEED_GROUPPOST_SELECT = projection(
+    [column for column in FEED_SOURCE_COLUMNS if column in GROUPPOST_COLUMNS] + ['avatarkey'],
+    {'post': PREVIEW_POST_BLOB, **GROUPPOST_AVATAR},
+)
+
+IMAGE_COLUMNS = ('imageid', 'postid', 'image', 'mediakey', 'mediasize', 'mediatype', 'width', 'height', 'placeholder')
+IMAGE_SELECT = projection(IMAGE_COLUMNS, {'image': MIGRATED_IMAGE_BLOB})
+
+# Every user column but the password hash, which no route sends.
+USER_COLUMNS = (
+    'userid', 'username', 'birthdate', 'age', 'emailaddress', 'phonenumber', 'profileimage',
+    'avatarkey', 'createddate', 'onlinestatus', 'emailauth', 'notificationstatus',
+)
+USER_SELECT = projection(USER_COLUMNS)
+# For lists whose avatars come from an AvatarResolver instead.
+USER_SUMMARY_SELECT = projection(column for column in USER_COLUMNS if column not in ('profileimage', 'avatarkey'))
+GROUP_SELECT = projection((
+    'groupid', 'groupownerid', 'groupname', 'grouptype', 'groupimage', 'groupimageupdateddate',
+    'groupbackgroundimage', 'groupbackgroundimageupdateddate', 'createdate',
+))
+GROUP_USER_SELECT = projection((
+    'groupuser_id', 'groupid', 'userid', 'profileimage', 'avatarkey', 'username', 'usertype', 'joined_date', 'status',
+), avatar_expressions('group_users.userid', 'profileimage'))
+GROUP_USER_SUMMARY_SELECT = projection((
+    'groupuser_id', 'groupid', 'userid', 'username', 'usertype', 'joined_date', 'status',
+))
+
+# Feed, search and follower-list queries, named so /internal/db-stats reports them.
+# {ids}, {userids} and {groupids} are IN-list placeholders, {after}, {user_after} and
+# {group_after} keyset_filter conditions; run_query/iter_query_rows fill them in.
+register_query("feed_posts", f"SELECT {FEED_POST_SELECT} FROM post WHERE postid IN ({{ids}})")
+register_query("feed_groupposts", f"SELECT {FEED_GROUPPOST_SELECT} FROM grouppost WHERE postid IN ({{ids}})")
+register_query("preview_posts", f"SELECT {POST_PREVIEW_SELECT} FROM post WHERE postid IN ({{ids}})")
+register_query("posts_by_id", f"SELECT {POST_SELECT} FROM post WHERE postid IN ({{ids}})")
+register_query("legacy_post_avatars", """
+    SELECT DISTINCT user.userid, user.profileimage FROM post JOIN user ON user.userid = post.userid
+    WHERE post.postid IN ({ids}) AND user.avatarkey IS NULL AND user.profileimage IS NOT NULL
+""")
+register_query("legacy_grouppost_avatars", """
+    SELECT DISTINCT user.userid, user.profileimage FROM grouppost JOIN user ON user.userid = grouppost.userid
+    WHERE grouppost.postid IN ({ids}) AND user.avatarkey IS NULL AND user.profileimage IS NOT NULL
+""")
+register_query("feed_images", """
+    SELECT postid, image, mediakey AS imagemediakey, placeholder
+    FROM image WHERE postid IN ({ids}) ORDER BY imageid
+""")
+register_query("feed_groupimages", """
+    SELECT postid, image, mediakey AS imagemediakey, placeholder
+    FROM groupimage WHERE postid IN ({ids}) ORDER BY imageid
+""")
+register_query("post_images", f"SELECT {IMAGE_SELECT} FROM image WHERE postid = %s")
+register_query("grouppost_images", f"SELECT {IMAGE_SELECT} FROM groupimage WHERE postid = %s")
+
+register_query("feed_candidates", "SELECT postid FROM post WHERE mediastatus = 'ready' AND posteddate <= %s")
+register_query("feed_candidates_excluding_users", """
+    SELECT postid FROM post WHERE mediastatus = 'ready' AND posteddate <= %s AND userid NOT IN ({ids})
+""")
+register_query("video_candidates", """
+    SELECT postid FROM post WHERE posttype = 'video' AND mediastatus = 'ready' AND posteddate <= %s
+""")
+register_query("group_feed_page", """
+    SELECT postid, posteddate FROM grouppost WHERE groupid = %s AND mediastatus = 'ready' AND {after}
+    ORDER BY posteddate DESC, postid DESC LIMIT %s OFFSET %s
+""")
+register_query("user_feed_page", """
+    SELECT postid, posteddate FROM post WHERE userid = %s AND mediastatus = 'ready' AND {after}
+    ORDER BY posteddate DESC, postid DESC LIMIT %s OFFSET %s
+""")
+register_query("posttype_feed_page", """
+    SELECT postid FROM post WHERE posttype = %s AND mediastatus = 'ready'
+    ORDER BY posteddate DESC LIMIT %s OFFSET %s
+""")
+register_query("fav_feed_page", """
+    SELECT favpostid, postid, saveeddate FROM favpost WHERE userid = %s AND {after}
+    ORDER BY saveeddate DESC, favpostid DESC LIMIT %s OFFSET %s
+""")
+
+FOLLOWEE_USER_POSTS = """
+    (SELECT 'n' AS n_or_g, postid, posteddate, userid AS source FROM post
+     WHERE userid IN ({userids}) AND mediastatus = 'ready' AND posteddate IS NOT NULL AND {user_after}
+     ORDER BY posteddate DESC, postid DESC LIMIT %s)
+"""
+FOLLOWEE_GROUP_POSTS = """
+    (SELECT 'g' AS n_or_g, postid, posteddate, groupid AS source FROM grouppost
+     WHERE groupid IN ({groupids}) AND mediastatus = 'ready' AND posteddate IS NOT NULL AND {group_after}
+     ORDER BY posteddate DESC, postid DESC LIMIT %s)
+"""
+register_query("followee_posts", f"""
+    {FOLLOWEE_USER_POSTS} UNION ALL {FOLLOWEE_GROUP_POSTS}
+    ORDER BY posteddate DESC, postid DESC, n_or_g DESC LIMIT %s
+""")
+register_query("followee_user_posts", f"{FOLLOWEE_USER_POSTS} ORDER BY posteddate DESC, postid DESC LIMIT %s")
+register_query("followee_group_posts", f"{FOLLOWEE_GROUP_POSTS} ORDER BY posteddate DESC, postid DESC LIMIT %s")
+
+register_query("search_users", f"SELECT {USER_SUMMARY_SELECT} FROM user WHERE username LIKE %s")
+register_query("search_groups", f"SELECT {GROUP_SELECT} FROM groups WHERE groupname LIKE %s")
+register_query("search_users_page", f"""
+    SELECT {USER_SELECT} FROM user WHERE username LIKE %s
+    ORDER BY createddate DESC LIMIT %s OFFSET %s
+""")
+register_query("search_groups_page", f"""
+    SELECT {GROUP_SELECT} FROM groups WHERE groupname LIKE %s
+    ORDER BY createdate DESC LIMIT %s OFFSET %s
+""")
+register_query("search_video_posts_page", """
+    SELECT postid, posteddate FROM post
+    WHERE postdescription LIKE %s AND posttype = 'video' AND mediastatus = 'ready' AND {after}
+    ORDER BY posteddate DESC, postid DESC LIMIT %s OFFSET %s
+""")
+register_query("search_text_posts_page", """
+    SELECT postid, posteddate FROM post
+    WHERE (posttype = 'text' OR posttype = 'link') AND (postdescription LIKE %s OR textbody LIKE %s) AND {after}
+    ORDER BY posteddate DESC, postid DESC LIMIT %s OFFSET %s
+""")
+# Relevance is the number of occurrences of the search text.
+register_query("search_posts_by_relevance", """
+    SELECT postid,
+    COALESCE((LENGTH(postdescription) - LENGTH(REPLACE(postdescription, %s, ''))) / LENGTH(%s), 0) AS relevance_desc,
+    COALESCE((LENGTH(textbody) - LENGTH(REPLACE(textbody, %s, ''))) / LENGTH(%s), 0) AS relevance_text
+    FROM post
+    WHERE (posttype = 'text' OR posttype = 'link' OR posttype = 'image')
+    AND (postdescription LIKE %s OR textbody LIKE %s)
+    HAVING {after}
+    ORDER BY relevance_desc DESC, relevance_text DESC, postid DESC
+    LIMIT %s OFFSET %s
+""")
+
+register_query("user_avatars", "SELECT userid, avatarkey, profileimage FROM user WHERE userid IN ({ids})")
+register_query("following_users", """
+    SELECT iamfollowingid, myuserid, otheruserid, username, date, type, groupid
+    FROM iamfollowing WHERE myuserid = %s AND type = 'user'
+""")
+register_query("followers", """
+    SELECT iamfollowedid, myuserid, otheruserid, username, date
+    FROM iamfollowed WHERE myuserid = %s
+""")
+register_query("group_users_by_name", f"""
+    SELECT {GROUP_USER_SUMMARY_SELECT} FROM group_users WHERE groupid = %s AND username LIKE %s
+""")
+register_query("followers_by_name_outside_group", """
+    SELECT otheruserid, username FROM iamfollowed
+    WHERE username LIKE %s
+    AND otheruserid NOT IN (SELECT userid FROM group_users WHERE groupid = %s)
+""")
+register_query("followers_outside_group", """
+    SELECT otheruserid, username FROM iamfollowed
+    WHERE myuserid = %s
+    AND otheruserid NOT IN (SELECT userid FROM group_users WHERE groupid = %s)
+""")
+
+
+def build_post_rows(record, images_by_post):
+    """
+    Serialized feed rows for one post/grouppost record (see FEED_POST_FIELDS). An
+    image post without images still yields one row with empty image fields, like
+    the old post/image LEFT JOIN.
+    """
+    row = serialize_feed_post(record)
+    if record['posttype'] != 'image':
+        return [row]
+
+    rows = []
+    for image in images_by_post.get(record['postid']) or [EMPTY_FEED_IMAGE]:
+        image_row = dict(row)
+        image_row.update(serialize_feed_image(image))
+        image_row['placeholder'] = image.get('placeholder') or row['placeholder']
+        rows.append(image_row)
+    return rows
+
+
+POST_CACHE_MAX_MB = int(os.getenv("POST_CACHE_MAX_MB", "64"))
+POST_CACHE_TTL_SECONDS = int(os.getenv("POST_CACHE_TTL_SECONDS", "300"))
+
+
+def estimate_rows_size(rows) -> int:
+    return sum(sys.getsizeof(row) + sum(sys.getsizeof(value) for value in row.values()) for row in rows)
+
+
+class PostCache:
+    """
+    LRU of hydrated feed rows, bounded by their estimated size in bytes rather than
+    by entry count: one image post with inline base64 blobs outweighs hundreds of
+    text posts. Entries expire after `ttl_seconds` and are tagged ('post', n_or_g,
+    postid), ('user', userid) and ('group', groupid) so a write can drop every cached
+    row it affects. The cache is per process; other workers pick a write up when
+    their copy expires. Rows read from a replica are not cached if one of their
+    tags was invalidated within REPLICA_STALE_SECONDS of the read, since the
+    replica may not have had the write yet.
+    """
+
+    def __init__(self, max_bytes: int = POST_CACHE_MAX_MB * 1024 * 1024, ttl_seconds: int = POST_CACHE_TTL_SECONDS):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.entries = OrderedDict()
+        self.keys_by_tag = {}
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.invalidated_at = {}
+        self.stale_skips = 0
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires, size, tags, rows = entry
+        if expires < time.monotonic():
+            self.remove(key)
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return rows
+
+    def put(self, key, rows, tags, replica_read_at: Optional[float] = None):
+        if key in self.entries:
+            self.remove(key)
+        size = estimate_rows_size(rows)
+        if size > self.max_bytes:
+            return
+
+        tags = [(kind, *map(str, ids)) for kind, *ids in tags if None not in ids]
+        if replica_read_at is not None and any(
+            self.invalidated_at.get(tag, float("-inf")) >= replica_read_at - REPLICA_STALE_SECONDS for tag in tags
+        ):
+            self.stale_skips += 1
+            return
+        self.entries[key] = (time.monotonic() + self.ttl_seconds, size, tags, rows)
+        self.bytes += size
+        for tag in tags:
+            self.keys_by_tag.setdefault(tag, set()).add(key)
+
+        while self.bytes > self.max_bytes:
+            self.remove(next(iter(self.entries)))
+            self.evictions += 1
+
+    def remove(self, key):
+        expires, size, tags, rows = self.entries.pop(key)
+        self.bytes -= size
+        for tag in tags:
+            keys = self.keys_by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.keys_by_tag[tag]
+
+    def invalidate(self, kind: str, *ids):
+        """
+        Drop every entry tagged (kind, *ids), e.g. invalidate('user', userid).
+        """
+        tag = (kind, *map(str, ids))
+        for key in list(self.keys_by_tag.get(tag, ())):
+            self.remove(key)
+            self.invalidations += 1
+
+        if replica_pool is not None:
+            now = time.monotonic()
+            if len(self.invalidated_at) > 10000:
+                self.invalidated_at = {
+                    tag: at for tag, at in self.invalidated_at.items() if at >= now - REPLICA_STALE_SECONDS
+                }
+            self.invalidated_at[tag] = now
+
+    def invalidate_post(self, n_or_g: str, postid):
+        self.invalidate('post', n_or_g, postid)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+            "stale_skips": self.stale_skips,
+        }
+
+
+post_cache = PostCache()
+
+
+def cache_post_rows(n_or_g: str, record, images_by_post, cardwidth: int, replica_read_at: Optional[float] = None):
+    """
+    Build the feed rows of one post record and store them in the post cache.
+    `replica_read_at` is when the record was read, if it came from a replica.
+    """
+    rows = build_post_rows(record, images_by_post)
+    post_cache.put((n_or_g, record['postid'], cardwidth), rows, [
+        ('post', n_or_g, record['postid']),
+        ('user', record['userid']),
+        ('group', record.get('groupid')),
+    ], replica_read_at)
+    return rows
+
+
+async def hydrate_posts(cursor, refs, cardwidth: int = IMAGE_CARD_WIDTH):
+    """
+    Serialized feed rows for ('n' | 'g', postid) refs, in ref order; posts that no
+    longer exist are skipped. Cached posts cost nothing; the rest are loaded with
+    one query per table plus one for their images. Returned rows are shared with
+    the cache and must not be modified.
+    """
+    cardwidth = snap_card_width(cardwidth)
+    rows_by_ref = {}
+    missing = {'n': [], 'g': []}
+    for n_or_g, postid in refs:
+        rows = post_cache.get((n_or_g, postid, cardwidth))
+        if rows is None:
+            missing[n_or_g].append(postid)
+        else:
+            rows_by_ref[(n_or_g, postid)] = rows
+
+    for n_or_g, postids in missing.items():
+        if not postids:
+            continue
+        name, image_table = ("feed_groupposts", "groupimage") if n_or_g == 'g' else ("feed_posts", "image")
+
+        records = await fetch_rows_in_order(cursor, name, postids)
+        attach_media_urls(records, 'post')
+        attach_video_previews(records)
+        await attach_avatars(cursor, records, 'userprofile')
+        images_by_post = await load_feed_images(cursor, records, image_table, cardwidth)
+
+        for record in records:
+            rows_by_ref[(n_or_g, record['postid'])] = cache_post_rows(n_or_g, record, images_by_post, cardwidth)
+
+    processed_records = []
+    for ref in refs:
+        processed_records.extend(rows_by_ref.get(ref, ()))
+    return processed_records
 
-                if not user:
-                    raise HTTPException(status_code=404, detail="User not found")
 
-                username = user['username']
-                userprofile = user.get('profileimage', None)
-                letter_string = generate_random_letter_string()  
-                post_id = generate_combined_post_id(letter_string)  
-                
-                letter_string_group_post = generate_random_letter_string()  
-                post_id_group_post = generate_combined_post_id(letter_string_group_post)  
+async def iter_query_rows(name: str, args=None, source=None, order_by: Optional[str] = None, **fragments):
+    """
+    Yield the rows of the registered query `name` one at a time from an unbuffered
+    SSDictCursor, so only the row being sent is held in memory. The connection (from
+    `source`, by default read_pool()) stays checked out until the rows are exhausted
+    or the consumer stops (e.g. the client disconnects). Query stats count the time
+    spent in MySQL, not the time the consumer holds each row.
+    """
+    sql = QUERIES[name].sql.format(**fragments) if fragments else QUERIES[name].sql
+    if order_by:
+        sql = f"{sql} ORDER BY {order_by}"
+    elapsed = 0.0
+    rows = nbytes = 0
+    try:
+        async with (source or read_pool()).acquire() as conn:
+            async with conn.cursor(aiomysql.SSDictCursor) as cursor:
+                started = time.perf_counter()
+                await cursor.execute(sql, args)
+                while (row := await cursor.fetchone()) is not None:
+                    elapsed += time.perf_counter() - started
+                    rows += 1
+                    nbytes += estimate_result_bytes([row])
+                    yield row
+                    started = time.perf_counter()
+                elapsed += time.perf_counter() - started
+    finally:
+        record_query(name, elapsed * 1000, rows, nbytes)
 
-                if grouptype == "public":
-                    await cursor.execute(
-                        """
-                        INSERT INTO post (
-                            postid, groupid, userid, username, postdescription, posteddate, posttype, userprofile, textcolor, textbody, groupname, grouptype
-                        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                        """,
-                        (post_id, groupid, userid, username, textPostdescription, createddate, 'text', userprofile, selectedColor, textPostbody, groupname, grouptype)
-                    )
 
-                await cursor.execute(
-                    """
-                    INSERT INTO grouppost (
-                        postid, groupid, userid, username, postdescription, posteddate, posttype, userprofile, textcolor, textbody
-                    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    """,
-                    (post_id_group_post, groupid, userid, username, textPostdescription, createddate, 'text', userprofile, selectedColor, textPostbody)
-                )
-                
-                await conn.commit()
+async def iter_rows_in_order(name: str, ids, key: str = 'postid', source=None):
+    """
+    Streaming counterpart of fetch_rows_in_order: yield the rows of the registered
+    query `name` (with one IN ({ids}) placeholder and no ORDER BY) in the order of `ids`.
+    """
+    if not ids:
+        return
+    placeholders = ", ".join(["%s"] * len(ids))
+    async for row in iter_query_rows(name, [*ids, *ids], source, order_by=f"FIELD({key}, {placeholders})", ids=placeholders):
+        yield row
 
-            except aiomysql.MySQLError as err:
-                print(f"Database error: {err}")
-                raise HTTPException(status_code=500, detail="Error storing text post in database")
-            except Exception as e:
-                print(f"Error: {e}")
-                raise HTTPException(status_code=500, detail="Error processing request")
 
-    return JSONResponse(content={"message": "Post added successfully"}, status_code=201)
+async def iter_hydrated_posts(refs, cardwidth: int = IMAGE_CARD_WIDTH):
+    """
+    Streaming hydrate_posts: yields the same feed rows in the same order, but posts
+    missing from the cache are read one row at a time from an SSDictCursor instead
+    of being loaded as a page. Their images (URLs only) are fetched up front, then
+    each run of consecutive uncached posts from one table is one streamed query.
+    """
+    cardwidth = snap_card_width(cardwidth)
+    cached = {}
+    missing = {'n': [], 'g': []}
+    for n_or_g, postid in refs:
+        rows = post_cache.get((n_or_g, postid, cardwidth))
+        if rows is None:
+            missing[n_or_g].append(postid)
+        else:
+            cached[(n_or_g, postid)] = rows
+
+    images_by_post = {'n': {}, 'g': {}}
+    legacy_avatars = {'n': {}, 'g': {}}
+    source = read_pool() if missing['n'] or missing['g'] else None
+    replica_read_at = time.monotonic() if source is not None and source is replica_pool else None
+    if source is not None:
+        async with source.acquire() as conn:
+            async with conn.cursor(aiomysql.DictCursor) as cursor:
+                for n_or_g, table, image_table in (('n', 'post', 'image'), ('g', 'grouppost', 'groupimage')):
+                    images_by_post[n_or_g] = await load_images_by_post(cursor, missing[n_or_g], image_table, cardwidth)
+                    legacy_avatars[n_or_g] = await load_legacy_avatars(cursor, table, missing[n_or_g])
+
+    index = 0
+    while index < len(refs):
+        n_or_g = refs[index][0]
+        if refs[index] in cached:
+            for row in cached[refs[index]]:
+                yield row
+            index += 1
+            continue
+
+        run = []
+        while index < len(refs) and refs[index][0] == n_or_g and refs[index] not in cached:
+            run.append(refs[index][1])
+            index += 1
+
+        name = "feed_groupposts" if n_or_g == 'g' else "feed_posts"
+        async for record in iter_rows_in_order(name, run, source=source):
+            attach_media_urls([record], 'post')
+            attach_video_previews([record])
+            attach_avatar_urls([record], 'userprofile')
+            fill_legacy_avatar(record, legacy_avatars[n_or_g])
+            for row in cache_post_rows(n_or_g, record, images_by_post[n_or_g], cardwidth, replica_read_at):
+                yield row
+
+
+async def peek_rows(rows):
+    """
+    (first row or None, the same rows again) for streaming endpoints that answer
+    404 when there is nothing to send.
+    """
+    first = await anext(rows, None)
+    if first is None:
+        return None, rows
 
+    async def chained():
+        yield first
+        async for row in rows:
+            yield row
 
+    return first, chained()
 
- 
- 
 
+def serialize_post_with_media(record, legacy_avatars=None):
+    attach_media_urls([record], 'post')
+    attach_video_previews([record])
+    attach_avatar_urls([record], 'userprofile')
+    fill_legacy_avatar(record, legacy_avatars)
+    return serialize_post(record)
 
 
+async def iter_json_array(rows, serialize=None):
+    """
+    Encode an async iterable of rows as one JSON array, a row per chunk.
+    """
+    separator = b"["
+    try:
+        async for row in rows:
+            yield separator + dump_json(serialize(row) if serialize else row)
+            separator = b","
+    except aiomysql.Error as err:
+        # The status line is already sent; aborting leaves the client with invalid
+        # JSON rather than a silently short page.
+        print(f"Error: {err}")
+        raise
+    yield b"]" if separator == b"," else b"[]"
 
 
+def stream_json(rows, serialize=None, headers=None, status_code: int = 200):
+    """
+    StreamingResponse sending `rows` (an async iterable) as a JSON array while they
+    are read, for list endpoints whose pages carry base64 media.
+    """
+    return StreamingResponse(
+        iter_json_array(rows, serialize), status_code=status_code, media_type="application/json", headers=headers
+    )
 
 
+@app.get("/internal/post-cache-stats")
+async def post_cache_stats():
+    """
+    Hit/miss/eviction counters of the post hydration cache, for sizing POST_CACHE_MAX_MB.
+    """
+    return post_cache.stats()
 
 
 
-@app.get("/delete_post")
-async def delete_post(
-    postid: int = Query(...),
-    userid: int = Query(...),
-    current_user: str = Depends(get_current_user),
-):
+@app.get("/internal/feed-index-stats")
+async def feed_index_stats():
     """
-    Delete a post by its ID.
+    Size and build/hit counters of the shuffled feed index, for sizing FEED_INDEX_CACHE_MB.
+    """
+    return feed_index.stats()
 
-    Args:
-    postid (int): The ID of the post to be deleted.
 
-    Returns:
-    JSONResponse: A JSON response indicating the result of the deletion.
+
+@app.get("/internal/avatar-cache-stats")
+async def avatar_cache_stats():
     """
-    try:
-        if str(current_user) != str(userid):
-            raise HTTPException(status_code=401, detail="Unauthorized access")
+    Hit/miss counters of the avatar cache behind AvatarResolver, for sizing AVATAR_CACHE_SIZE.
+    """
+    return avatar_cache.stats()
 
-        async with pool.acquire() as conn:
-            async with conn.cursor() as cursor:
-                result = await cursor.execute("DELETE FROM post WHERE postid=%s", (postid,))
-                
-                if result == 0:
-                    raise HTTPException(status_code=404, detail="Post not found")
 
-                await conn.commit()
 
-        return JSONResponse(content={"message": "Deleted"}, status_code=200)
-    
-    except aiomysql.MySQLError as err:
-        print(f"Database error: {err}")
-        raise HTTPException(status_code=500, detail="Error deleting post from database")
-    
-    except Exception as e:
-        print(f"Error: {e}")
-        raise HTTPException(status_code=500, detail="Internal Server Error")
-            
-            
-          
 
-            
-            
-            
-            
-            
-            
-            
-            
-            
-            
-            
 @app.get("/get_posts_feed_group")
 async def get_posts_feed_group(
     limit: int = Query(5, ge=1),
     offset: int = Query(0, ge=0),
     groupid:str =Query(...),
-    
+    cardwidth: int = Query(IMAGE_CARD_WIDTH, ge=1),
+    cursor_token: Optional[str] = Query(None, alias="cursor"),
     ):
+    """
+    Newest-first group feed. Pass the X-Next-Cursor header of the previous page as
+    `cursor`; `offset` is a deprecated fallback used only without a cursor.
+    """
     global pool
    
-    async with pool.acquire() as conn:
+    async with read_pool().acquire() as conn:
         async with conn.cursor(aiomysql.DictCursor) as cursor:
             try:
-                await cursor.execute("""
-                    SELECT * FROM grouppost WHERE groupid  =%s
-                    ORDER BY posteddate DESC
-                    LIMIT %s OFFSET %s
-                """, (groupid,limit, offset))
-                records = await cursor.fetchall()
-
-                processed_records = []
+                after, after_args = keyset_filter(["posteddate", "postid"], cursor_token)
+                records = await run_query(
+                    cursor, "group_feed_page", (groupid, *after_args, limit, 0 if cursor_token else offset), after=after
+                )
+                next_cursor = next_keyset_cursor(records, ["posteddate", "postid"], limit)
 
-                for record in records:
-                    if record['posttype'] == 'image':
-                        await cursor.execute("""
-                            SELECT p.userid, p.username, p.postdescription, p.posteddate, p.userprofile, p.posttype, p.postid,
-                                i.image,p.n_or_g
-                            FROM grouppost p
-                            LEFT JOIN groupimage i ON p.postid = i.postid
-                            WHERE p.posttype = 'image' AND p.postid = %s
-                            ORDER BY p.posteddate DESC
-                        """, (record['postid'],))
-                        image_records = await cursor.fetchall()
-
-                        for image_record in image_records:
-                            if image_record['image']:
-                                image_record['image'] = base64.b64encode(image_record['image']).decode('utf-8')
-                            if image_record['userprofile']:
-                                image_record['userprofile'] = base64.b64encode(image_record['userprofile']).decode('utf-8')
-
-                            processed_records.append(image_record)
-
-                    elif record['posttype'] in ['video', 'audio', 'text', 'link','group']:
-                        post_record = {
-                            'postid': record['postid'],
-                            'userid': record['userid'],
-                            'username': record['username'],
-                            'postdescription': record['postdescription'],
-                            'posteddate': record['posteddate'],
-                            'posttype': record['posttype'],
-                            'post': base64.b64encode(record['post']).decode('utf-8') if record['post'] else None,
-                            'userprofile': base64.b64encode(record['userprofile']).decode('utf-8') if record['userprofile'] else None,
-                            'filepath': record['filepath'] if 'filepath' in record else None,
-                            'textcolor': record['textcolor'] if 'textcolor' in record else None,
-                            'textbody': record['textbody'] if 'textbody' in record else None,
-                            'thelink': record['thelink'] if 'thelink' in record else None,
-                            'groupid': record['groupid'] if 'groupid' in record else None,
-                            'grouptype': record['grouptype'] if 'grouptype' in record else None,
-                            'popularcount': record['popularcount'] if 'popularcount' in record else None,
-                            'n_or_g': record['n_or_g'] if 'n_or_g' in record else None,
-                        }
-
-                        processed_records.append(post_record)
-
-                return processed_records
+                headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+                return stream_json(iter_hydrated_posts([('g', record['postid']) for record in records], cardwidth), headers=headers)
 
             except aiomysql.Error as err:
                 print(f"Error: {err}")
@@ -4236,78 +7549,39 @@ async def get_posts_feed_group(
 async def get_posts_feed(
     limit: int = Query(5, ge=1), 
     offset: int = Query(0, ge=0),
-    useridexported: str = Query(None)  
+    useridexported: str = Query(None),
+    cardwidth: int = Query(IMAGE_CARD_WIDTH, ge=1),
+    cursor_token: Optional[str] = Query(None, alias="cursor")
 ):
+    """
+    Shuffled public feed. Pass the X-Next-Cursor header of the previous page as
+    `cursor` to continue the same shuffle; `offset` is ignored (deprecated).
+    """
     global pool
-    async with pool.acquire() as conn:
+    async with read_pool().acquire() as conn:
         async with conn.cursor(aiomysql.DictCursor) as cursor:
             try:
+                blocked_user_ids = []
                 if useridexported:
-                    await cursor.execute("""
-                        SELECT blockeduserid FROM user_blocked WHERE userid = %s
-                    """, (useridexported,))
-                    blocked_users = await cursor.fetchall()
+                    blocked_users = await run_query(cursor, "blocked_userids", (useridexported,), fetch="all")
                     blocked_user_ids = [user['blockeduserid'] for user in blocked_users]
 
-                    await cursor.execute("""
-                        SELECT * FROM post
-                        WHERE userid NOT IN (%s)
-                        ORDER BY RAND()
-                        LIMIT %s OFFSET %s
-                    """, (', '.join(str(id) for id in blocked_user_ids), limit, offset))
-                else:
-                    await cursor.execute("""
-                        SELECT * FROM post
-                        ORDER BY RAND()
-                        LIMIT %s OFFSET %s
-                    """, (limit, offset))
-
-                records = await cursor.fetchall()
+                async def load_candidates(snapshot):
+                    if blocked_user_ids:
+                        rows = await run_query(
+                            cursor, "feed_candidates_excluding_users", [snapshot, *blocked_user_ids],
+                            ids=", ".join(["%s"] * len(blocked_user_ids)),
+                        )
+                    else:
+                        rows = await run_query(cursor, "feed_candidates", (snapshot,))
+                    return [row['postid'] for row in rows]
 
-                processed_records = []
+                # Only users with blocks need a candidate list of their own.
+                feed = f"posts:{useridexported}" if blocked_user_ids else "posts"
+                postids, next_cursor = await feed_index.page(feed, load_candidates, limit, cursor_token)
 
-                for record in records:
-                    if record['posttype'] == 'image':
-                        await cursor.execute("""
-                            SELECT p.userid, p.username, p.postdescription, p.posteddate, p.userprofile, p.posttype, p.postid, p.n_or_g, p.groupname, p.groupid, p.grouptype,
-                                i.image
-                            FROM post p
-                            LEFT JOIN image i ON p.postid = i.postid
-                            WHERE p.posttype = 'image' AND p.postid = %s
-                        """, (record['postid'],))
-                        image_records = await cursor.fetchall()
-
-                        for image_record in image_records:
-                            if image_record['image']:
-                                image_record['image'] = base64.b64encode(image_record['image']).decode('utf-8')
-                            if image_record['userprofile']:
-                                image_record['userprofile'] = base64.b64encode(image_record['userprofile']).decode('utf-8')
-
-                            processed_records.append(image_record)
-
-                    elif record['posttype'] in ['video', 'audio', 'text', 'link', 'group']:
-                        post_record = {
-                            'postid': record['postid'],
-                            'userid': record['userid'],
-                            'username': record['username'],
-                            'postdescription': record['postdescription'],
-                            'posteddate': record['posteddate'],
-                            'posttype': record['posttype'],
-                            'post': base64.b64encode(record['post']).decode('utf-8') if record['post'] else None,
-                            'userprofile': base64.b64encode(record['userprofile']).decode('utf-8') if record['userprofile'] else None,
-                            'filepath': record['filepath'] if 'filepath' in record else None,
-                            'textcolor': record['textcolor'] if 'textcolor' in record else None,
-                            'textbody': record['textbody'] if 'textbody' in record else None,
-                            'thelink': record['thelink'] if 'thelink' in record else None,
-                            'groupid': record['groupid'] if 'groupid' in record else None,
-                            'grouptype': record['grouptype'] if 'grouptype' in record else None,
-                            'n_or_g': record['n_or_g'] if 'n_or_g' in record else None,
-                            'groupname': record['groupname'] if 'groupname' in record else None,
-                        }
-
-                        processed_records.append(post_record)
-
-                return processed_records
+                headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+                return stream_json(iter_hydrated_posts([('n', postid) for postid in postids], cardwidth), headers=headers)
 
             except aiomysql.Error as err:
                 print(f"Error: {err}")
@@ -4335,16 +7609,13 @@ async def blocking_user(
     try:
         async with pool.acquire() as conn:
             async with conn.cursor(aiomysql.DictCursor) as cursor:
-                await cursor.execute(""" 
-                    SELECT username, profileimage FROM user WHERE userid = %s 
-                """, (blockeduserid,))
-                user_details = await cursor.fetchone()
+                user_details = await run_query(cursor, "user_name", (blockeduserid,), fetch="one")
 
                 if not user_details:
                     raise HTTPException(status_code=404, detail="User not found")
 
                 await cursor.execute(""" 
-                    SELECT * FROM user_blocked 
+                    SELECT blockedid FROM user_blocked 
                     WHERE userid = %s AND blockeduserid = %s 
                 """, (curruntuserid, blockeduserid))
                 existing_block = await cursor.fetchone()
@@ -4356,9 +7627,9 @@ async def blocking_user(
                     action = "unblocked"
                 else:
                     await cursor.execute(""" 
-                        INSERT INTO user_blocked (userid, blockeduserid, blockeddate, blockeduserprofile, username) 
-                        VALUES (%s, %s, %s, %s, %s)
-                    """, (curruntuserid, blockeduserid, datetime.now(), user_details['profileimage'], user_details['username']))
+                        INSERT INTO user_blocked (userid, blockeduserid, blockeddate, username) 
+                        VALUES (%s, %s, %s, %s)
+                    """, (curruntuserid, blockeduserid, datetime.now(), user_details['username']))
                     action = "blocked"
 
                 await conn.commit()
@@ -4402,62 +7673,17 @@ async def blocking_user(
 async def get_posts_feed_option(
     selectedOption: str = Form(),
     limit: int = Form(...),
-    offset: int = Form(...)
-    
+    offset: int = Form(...),
+    cardwidth: int = Form(IMAGE_CARD_WIDTH)
     ):
  
     global pool
-    async with pool.acquire() as conn:
+    async with read_pool().acquire() as conn:
         async with conn.cursor(aiomysql.DictCursor) as cursor:
             try:
-                await cursor.execute("""
-                    SELECT * FROM post WHERE posttype=%s
-                    ORDER BY posteddate DESC LIMIT %s OFFSET %s
-                """, (selectedOption,limit,offset))
-                records = await cursor.fetchall()
-
-                processed_records = []
+                records = await run_query(cursor, "posttype_feed_page", (selectedOption, limit, offset))
 
-                for record in records:
-                    if record['posttype'] == 'image':
-                        await cursor.execute("""
-                            SELECT p.userid, p.username, p.postdescription, p.posteddate, p.userprofile, p.posttype, p.postid,p.n_or_g,p.groupname,p.groupid,p.grouptype,
-                                i.image
-                            FROM post p
-                            LEFT JOIN image i ON p.postid = i.postid
-                            WHERE p.posttype = 'image' AND p.postid = %s
-                            ORDER BY p.posteddate DESC
-                        """, (record['postid'],))
-                        image_records = await cursor.fetchall()
-
-                        for image_record in image_records:
-                            if image_record['image']:
-                                image_record['image'] = base64.b64encode(image_record['image']).decode('utf-8')
-                            if image_record['userprofile']:
-                                image_record['userprofile'] = base64.b64encode(image_record['userprofile']).decode('utf-8')
-
-                            processed_records.append(image_record)
-
-                    elif record['posttype'] in ['video', 'audio', 'text', 'link']:
-                        post_record = {
-                            'postid': record['postid'],
-                            'userid': record['userid'],
-                            'username': record['username'],
-                            'postdescription': record['postdescription'],
-                            'posteddate': record['posteddate'],
-                            'posttype': record['posttype'],
-                            'post': base64.b64encode(record['post']).decode('utf-8') if record['post'] else None,
-                            'userprofile': base64.b64encode(record['userprofile']).decode('utf-8') if record['userprofile'] else None,
-                            'filepath': record['filepath'] if 'filepath' in record else None,
-                            'textcolor': record['textcolor'] if 'textcolor' in record else None,
-                            'textbody': record['textbody'] if 'textbody' in record else None,
-                            'thelink': record['thelink'] if 'thelink' in record else None,
-                            'n_or_g': record['n_or_g'] if 'n_or_g' in record else None,
-                        }
-
-                        processed_records.append(post_record)
-
-                return processed_records
+                return stream_json(iter_hydrated_posts([('n', record['postid']) for record in records], cardwidth))
 
             except aiomysql.Error as err:
                 print(f"Error: {err}")
@@ -4495,63 +7721,26 @@ async def get_posts_feed_option(
 async def get_posts_feed_user(
     userid: str = Form(...),
     limit: int = Form(...),
-    offset: int = Form(...)
+    offset: int = Form(0),
+    cardwidth: int = Form(IMAGE_CARD_WIDTH),
+    cursor_token: Optional[str] = Form(None, alias="cursor"),
 ):
+    """
+    Newest-first posts of one user, paged with the X-Next-Cursor header sent back
+    as `cursor` (`offset` is a deprecated fallback).
+    """
     cursor = None
     try:
-        async with pool.acquire() as conn:
+        async with read_pool().acquire() as conn:
             async with conn.cursor(aiomysql.DictCursor) as cursor:
-                await cursor.execute(
-                    "SELECT * FROM post WHERE userid = %s ORDER BY posteddate DESC LIMIT %s OFFSET %s",
-                    (userid, limit, offset)
+                after, after_args = keyset_filter(["posteddate", "postid"], cursor_token)
+                records = await run_query(
+                    cursor, "user_feed_page", (userid, *after_args, limit, 0 if cursor_token else offset), after=after
                 )
-                records = await cursor.fetchall()
-
-        processed_records = []
+                next_cursor = next_keyset_cursor(records, ["posteddate", "postid"], limit)
 
-        async with pool.acquire() as conn:
-            async with conn.cursor(aiomysql.DictCursor) as cursor:
-                for record in records:
-                    if record['posttype'] == 'image':
-                        await cursor.execute("""
-                            SELECT p.userid, p.username, p.postdescription, p.posteddate, p.userprofile, p.posttype, p.postid, p.n_or_g,
-                                   i.image
-                            FROM post p
-                            LEFT JOIN image i ON p.postid = i.postid
-                            WHERE p.postid = %s
-                            ORDER BY p.posteddate DESC
-                        """, (record['postid'],))
-                        image_records = await cursor.fetchall()
-
-                        for image_record in image_records:
-                            if image_record['image']:
-                                image_record['image'] = base64.b64encode(image_record['image']).decode('utf-8')
-                            if image_record['userprofile']:
-                                image_record['userprofile'] = base64.b64encode(image_record['userprofile']).decode('utf-8')
-                            processed_records.append(image_record)
-
-                    elif record['posttype'] in ['video', 'audio', 'text', 'link', 'group']:
-                        post_record = {
-                            'postid': record['postid'],
-                            'userid': record['userid'],
-                            'username': record['username'],
-                            'postdescription': record['postdescription'],
-                            'posteddate': record['posteddate'],
-                            'posttype': record['posttype'],
-                            'post': base64.b64encode(record['post']).decode('utf-8') if isinstance(record['post'], bytes) else record['post'],
-                            'userprofile': base64.b64encode(record['userprofile']).decode('utf-8') if isinstance(record['userprofile'], bytes) else record['userprofile'],
-                            'filepath': record['filepath'] if 'filepath' in record else None,
-                            'textcolor': record['textcolor'] if 'textcolor' in record else None,
-                            'textbody': record['textbody'] if 'textbody' in record else None,
-                            'thelink': record['thelink'] if 'thelink' in record else None,
-                            'groupid': record['groupid'] if 'groupid' in record else None,
-                            'grouptype': record['grouptype'] if 'grouptype' in record else None,
-                            'n_or_g': record['n_or_g'] if 'n_or_g' in record else None,
-                            'groupname': record['groupname'] if 'groupname' in record else None,
-                        }
-                        processed_records.append(post_record)
-
-        return processed_records
+                headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+                return stream_json(iter_hydrated_posts([('n', record['postid']) for record in records], cardwidth), headers=headers)
 
     except aiomysql.Error as err:
         print(f"Error: {err}")
@@ -4579,73 +7768,31 @@ async def get_posts_feed_user(
 async def get_posts_feed(
     userid: int = Query(...),
     limitfav: int = Query(5, ge=1),
-    offsetfav: int = Query(0, ge=0)
+    offsetfav: int = Query(0, ge=0),
+    cardwidth: int = Query(IMAGE_CARD_WIDTH, ge=1),
+    cursor_token: Optional[str] = Query(None, alias="cursor"),
 ):
+    """
+    A user's saved posts, most recently saved first. Paged by (saveeddate, favpostid)
+    through the X-Next-Cursor header; `offsetfav` is a deprecated fallback.
+    """
     global pool
-    async with pool.acquire() as conn:
+    async with read_pool().acquire() as conn:
         async with conn.cursor(aiomysql.DictCursor) as cursor:
             try:
-                await cursor.execute("""
-                    SELECT postid FROM favpost WHERE userid = %s ORDER BY saveeddate DESC  LIMIT %s OFFSET %s
-                """, (userid, limitfav, offsetfav))
-                fav_posts = await cursor.fetchall()
+                after, after_args = keyset_filter(["saveeddate", "favpostid"], cursor_token)
+                fav_posts = await run_query(
+                    cursor, "fav_feed_page", (userid, *after_args, limitfav, 0 if cursor_token else offsetfav), after=after
+                )
+                next_cursor = next_keyset_cursor(fav_posts, ["saveeddate", "favpostid"], limitfav)
 
                 post_ids = [post['postid'] for post in fav_posts]
 
                 if not post_ids:
                     return []
 
-                query = """
-                    SELECT * FROM post WHERE postid IN %s
-                """
-                await cursor.execute(query, (post_ids,))
-                records = await cursor.fetchall()
-
-                processed_records = []
-
-                for record in records:
-                    if record['posttype'] == 'image':
-                        await cursor.execute("""
-                            SELECT p.userid, p.username, p.postdescription, p.posteddate, p.userprofile, p.posttype, p.postid, p.n_or_g, p.groupname, p.groupid, p.grouptype,
-                                   i.image
-                            FROM post p
-                            LEFT JOIN image i ON p.postid = i.postid
-                            WHERE p.posttype = 'image' AND p.postid = %s
-                            ORDER BY p.posteddate DESC
-                        """, (record['postid'],))
-                        image_records = await cursor.fetchall()
-
-                        for image_record in image_records:
-                            if image_record['image']:
-                                image_record['image'] = base64.b64encode(image_record['image']).decode('utf-8')
-                            if image_record['userprofile']:
-                                image_record['userprofile'] = base64.b64encode(image_record['userprofile']).decode('utf-8')
-
-                            processed_records.append(image_record)
-
-                    elif record['posttype'] in ['video', 'audio', 'text', 'link', 'group']:
-                        post_record = {
-                            'postid': record['postid'],
-                            'userid': record['userid'],
-                            'username': record['username'],
-                            'postdescription': record['postdescription'],
-                            'posteddate': record['posteddate'],
-                            'posttype': record['posttype'],
-                            'post': base64.b64encode(record['post']).decode('utf-8') if record['post'] else None,
-                            'userprofile': base64.b64encode(record['userprofile']).decode('utf-8') if record['userprofile'] else None,
-                            'filepath': record['filepath'] if 'filepath' in record else None,
-                            'textcolor': record['textcolor'] if 'textcolor' in record else None,
-                            'textbody': record['textbody'] if 'textbody' in record else None,
-                            'thelink': record['thelink'] if 'thelink' in record else None,
-                            'groupid': record['groupid'] if 'groupid' in record else None,
-                            'grouptype': record['grouptype'] if 'grouptype' in record else None,
-                            'n_or_g': record['n_or_g'] if 'n_or_g' in record else None,
-                            'groupname': record['groupname'] if 'groupname' in record else None,
-                        }
-
-                        processed_records.append(post_record)
-
-                return processed_records
+                headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+                return stream_json(iter_hydrated_posts([('n', postid) for postid in post_ids], cardwidth), headers=headers)
 
             except aiomysql.Error as err:
                 print(f"Error: {err}")
@@ -4670,111 +7817,348 @@ async def get_posts_feed(
                            
                     
             
+async def get_following(cursor, myuserid):
+    """
+    Split a user's iamfollowing rows into followed user IDs and group IDs.
+    """
+    following_records = await run_query(cursor, "following", (myuserid,))
+
+    userids = [record['otheruserid'] for record in following_records if record['type'] == 'user']
+    groupids = [record['groupid'] for record in following_records if record['type'] == 'group']
+    return userids, groupids
+
+
+async def fetch_followee_posts(cursor, userids, groupids, limit: int, cursor_token: Optional[str] = None):
+    """
+    The newest `limit` posts across the given users (post) and groups (grouppost),
+    after the keyset cursor, as (n_or_g, postid, posteddate, source) rows. Each branch is
+    capped at `limit` before the merge, so this is a single bounded query whatever
+    the number of followees. Posts without a posteddate are left out.
+    """
+    if not userids and not groupids:
+        return []
+
+    # post and grouppost number their postids separately, so n_or_g breaks the
+    # (posteddate, postid) ties; within a branch it is the branch's literal.
+    user_after, after_args = keyset_filter(["posteddate", "postid", "'n'"], cursor_token)
+    group_after, _ = keyset_filter(["posteddate", "postid", "'g'"], cursor_token)
+    args = []
+    if userids:
+        args.extend([*userids, *after_args, limit])
+    if groupids:
+        args.extend([*groupids, *after_args, limit])
+    name = "followee_posts" if userids and groupids else "followee_user_posts" if userids else "followee_group_posts"
+
+    return await run_query(
+        cursor, name, (*args, limit), user_after=user_after, group_after=group_after,
+        userids=", ".join(["%s"] * len(userids)), groupids=", ".join(["%s"] * len(groupids)),
+    )
+
+
+async def load_follower_timeline(cursor, userids, groupids, limit: int, cursor_token: Optional[str] = None):
+    """
+    One page of the merged follower timeline, computed on read (fan-out-on-read).
+    Returns (refs, next_cursor).
+    """
+    rows = await fetch_followee_posts(cursor, userids, groupids, limit, cursor_token)
+    next_cursor = next_keyset_cursor(rows, ["posteddate", "postid", "n_or_g"], limit)
+    return [(row['n_or_g'], row['postid']) for row in rows], next_cursor
+
+
+# Fan-out-on-write home timelines. When enabled, a new post is pushed into the
+# timeline of every follower of its author (post) or group (grouppost), and the
+# follower feed pages that precomputed list instead of merging followees on read.
+# Authors and groups above TIMELINE_FANOUT_THRESHOLD followers are never pushed;
+# they are recorded in `timelinepull` and merged in on read instead.
+TIMELINE_FANOUT_ENABLED = os.getenv("TIMELINE_FANOUT_ENABLED", "false").lower() in ("1", "true", "yes")
+TIMELINE_FANOUT_THRESHOLD = int(os.getenv("TIMELINE_FANOUT_THRESHOLD", "5000"))
+TIMELINE_MAX_ENTRIES = int(os.getenv("TIMELINE_MAX_ENTRIES", "800"))
+TIMELINE_TRIM_EVERY = int(os.getenv("TIMELINE_TRIM_EVERY", "50"))
+
+
+class TimelineStore(ABC):
+    """
+    Per-user home timelines of (n_or_g, postid, posteddate) entries, newest first.
+    Each entry also carries its `source` (the followed userid for 'n', the groupid
+    for 'g') so an unfollow can drop exactly what that followee contributed. Any
+    backend with sorted-set semantics fits behind this, e.g. a Redis ZSET per user
+    scored by posteddate.
+    """
+
+    @abstractmethod
+    async def push(self, cursor, entries):
+        """
+        Insert (userid, n_or_g, postid, source, posteddate) entries; duplicates are ignored.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    async def page(self, cursor, userid, limit: int, cursor_token: Optional[str] = None):
+        """
+        `limit` entries after the keyset cursor as (n_or_g, postid, posteddate) rows.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    async def has_entries(self, cursor, userid) -> bool:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def remove_source(self, cursor, userid, n_or_g: str, source):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def trim(self, cursor, userid, keep: int = TIMELINE_MAX_ENTRIES):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def clear(self, cursor):
+        raise NotImplementedError
+
+
+class MySQLTimelineStore(TimelineStore):
+    """
+    Timelines in the `timeline` table, paged through (userid, posteddate, postid, n_or_g).
+    """
+
+    PUSH_BATCH_SIZE = 1000
+
+    async def push(self, cursor, entries):
+        for start in range(0, len(entries), self.PUSH_BATCH_SIZE):
+            await cursor.executemany("""
+                INSERT IGNORE INTO timeline (userid, n_or_g, postid, source, posteddate)
+                VALUES (%s, %s, %s, %s, %s)
+            """, entries[start:start + self.PUSH_BATCH_SIZE])
+
+    async def page(self, cursor, userid, limit: int, cursor_token: Optional[str] = None):
+        after, after_args = keyset_filter(["posteddate", "postid", "n_or_g"], cursor_token)
+        await cursor.execute(f"""
+            SELECT n_or_g, postid, posteddate FROM timeline
+            WHERE userid = %s AND {after}
+            ORDER BY posteddate DESC, postid DESC, n_or_g DESC
+            LIMIT %s
+        """, (userid, *after_args, limit))
+        return await cursor.fetchall()
+
+    async def has_entries(self, cursor, userid) -> bool:
+        await cursor.execute("SELECT 1 FROM timeline WHERE userid = %s LIMIT 1", (userid,))
+        return await cursor.fetchone() is not None
+
+    async def remove_source(self, cursor, userid, n_or_g: str, source):
+        await cursor.execute(
+            "DELETE FROM timeline WHERE userid = %s AND n_or_g = %s AND source = %s",
+            (userid, n_or_g, source)
+        )
+
+    async def trim(self, cursor, userid, keep: int = TIMELINE_MAX_ENTRIES):
+        # The LIMIT keeps the derived table materialized, which MySQL requires when
+        # deleting from the table it reads.
+        await cursor.execute("""
+            DELETE t FROM timeline t
+            JOIN (
+                SELECT posteddate, postid, n_or_g FROM timeline WHERE userid = %s
+                ORDER BY posteddate DESC, postid DESC, n_or_g DESC
+                LIMIT 1 OFFSET %s
+            ) edge
+            WHERE t.userid = %s
+              AND (t.posteddate, t.postid, t.n_or_g) <= (edge.posteddate, edge.postid, edge.n_or_g)
+        """, (userid, keep, userid))
+
+    async def clear(self, cursor):
+        await cursor.execute("DELETE FROM timeline")
+
+
+timeline_store = MySQLTimelineStore()
+fan_out_tasks = set()
+
+
+def timeline_source_filter(userids, groupids, alias: str = ""):
+    """
+    SQL matching ('n', userid) and ('g', groupid) sources, as (sql, args).
+    """
+    clauses = []
+    args = []
+    if userids:
+        clauses.append(f"({alias}n_or_g = 'n' AND {alias}source IN ({', '.join(['%s'] * len(userids))}))")
+        args.extend(userids)
+    if groupids:
+        clauses.append(f"({alias}n_or_g = 'g' AND {alias}source IN ({', '.join(['%s'] * len(groupids))}))")
+        args.extend(groupids)
+    return " OR ".join(clauses) or "1 = 0", args
+
+
+async def load_pulled_sources(cursor, userids, groupids):
+    """
+    The followed users and groups that are too large to fan out, as (userids, groupids).
+    """
+    if not userids and not groupids:
+        return [], []
+
+    sources, args = timeline_source_filter(userids, groupids)
+    await cursor.execute(f"SELECT n_or_g, source FROM timelinepull WHERE {sources}", args)
+    rows = await cursor.fetchall()
+    return (
+        [row['source'] for row in rows if row['n_or_g'] == 'n'],
+        [row['source'] for row in rows if row['n_or_g'] == 'g'],
+    )
+
+
+async def fan_out_posts(cursor, refs):
+    """
+    Push ready posts into their followers' timelines. `refs` are ('n' | 'g', postid)
+    pairs; refs without a row (e.g. the post mirror of a private group post) and
+    posts still processing are skipped.
+    """
+    for n_or_g, postid in refs:
+        if not postid:
+            continue
+        if n_or_g == 'g':
+            table, source_column, follow_type, follow_column = "grouppost", "groupid", "group", "groupid"
+        else:
+            table, source_column, follow_type, follow_column = "post", "userid", "user", "otheruserid"
+
+        await cursor.execute(
+            f"SELECT {source_column} AS source, posteddate, mediastatus FROM {table} WHERE postid = %s",
+            (postid,)
+        )
+        post = await cursor.fetchone()
+        if not post or post['source'] is None or post['mediastatus'] != 'ready' or post['posteddate'] is None:
+            continue
+
+        await cursor.execute(
+            "SELECT 1 FROM timelinepull WHERE n_or_g = %s AND source = %s", (n_or_g, post['source'])
+        )
+        if await cursor.fetchone():
+            continue
+
+        await cursor.execute(
+            f"SELECT myuserid FROM iamfollowing WHERE type = %s AND {follow_column} = %s LIMIT %s",
+            (follow_type, post['source'], TIMELINE_FANOUT_THRESHOLD + 1)
+        )
+        followerids = [row['myuserid'] for row in await cursor.fetchall()]
+
+        if len(followerids) > TIMELINE_FANOUT_THRESHOLD:
+            # Once pulled, always pulled: entries pushed earlier are de-duplicated on
+            # read, whereas flipping back to push would lose the posts in between.
+            await cursor.execute(
+                "INSERT IGNORE INTO timelinepull (n_or_g, source) VALUES (%s, %s)", (n_or_g, post['source'])
+            )
+            continue
+
+        await timeline_store.push(cursor, [
+            (followerid, n_or_g, postid, post['source'], post['posteddate']) for followerid in followerids
+        ])
+        for followerid in followerids:
+            if random.randrange(TIMELINE_TRIM_EVERY) == 0:
+                await timeline_store.trim(cursor, followerid)
+
+
+async def run_fan_out(refs):
+    try:
+        async with pool.acquire() as conn:
+            async with conn.cursor(aiomysql.DictCursor) as cursor:
+                await fan_out_posts(cursor, refs)
+    except Exception as e:
+        print(f"Timeline fan-out failed for {refs}: {e}")
+
+
+def schedule_fan_out(*refs):
+    """
+    Fan a just-committed post out in the background so the upload response does not
+    wait on follower writes. The task is referenced until done so it is not collected.
+    """
+    if not TIMELINE_FANOUT_ENABLED:
+        return
+
+    task = asyncio.create_task(run_fan_out(list(refs)))
+    fan_out_tasks.add(task)
+    task.add_done_callback(fan_out_tasks.discard)
+
+
+async def backfill_timeline(cursor, myuserid, userids, groupids):
+    """
+    Copy the newest posts of the given followees into a user's timeline: used when
+    the timeline is empty (fan-out just enabled, or a new user) and on a new follow.
+    """
+    rows = await fetch_followee_posts(cursor, userids, groupids, TIMELINE_MAX_ENTRIES)
+    if not rows:
+        return
+
+    await timeline_store.push(cursor, [
+        (myuserid, row['n_or_g'], row['postid'], row['source'], row['posteddate']) for row in rows
+    ])
+    await timeline_store.trim(cursor, myuserid)
+
+
+async def add_followee_to_timeline(cursor, myuserid, userids, groupids):
+    """
+    Bring a new followee's recent posts into an existing timeline. An empty timeline
+    is left alone: the first feed read backfills every followee at once.
+    """
+    if await timeline_store.has_entries(cursor, myuserid):
+        await backfill_timeline(cursor, myuserid, userids, groupids)
+
+
+async def load_home_timeline(cursor, myuserid, userids, groupids, limit: int, cursor_token: Optional[str] = None):
+    """
+    One page of the follower feed from the precomputed timeline, merged with the
+    posts of followees that are pulled on read. Returns (refs, next_cursor) with the
+    same keyset cursor as load_follower_timeline, so clients can switch modes freely.
+    """
+    pulled_userids, pulled_groupids = await load_pulled_sources(cursor, userids, groupids)
+
+    if cursor_token is None and not await timeline_store.has_entries(cursor, myuserid):
+        await backfill_timeline(
+            cursor, myuserid,
+            [userid for userid in userids if userid not in pulled_userids],
+            [groupid for groupid in groupids if groupid not in pulled_groupids],
+        )
+
+    rows = list(await timeline_store.page(cursor, myuserid, limit, cursor_token))
+    if pulled_userids or pulled_groupids:
+        rows.extend(await fetch_followee_posts(cursor, pulled_userids, pulled_groupids, limit, cursor_token))
+
+    merged = {}
+    for row in rows:
+        merged.setdefault((row['n_or_g'], row['postid']), row)
+    rows = sorted(
+        merged.values(), key=lambda row: (row['posteddate'], row['postid'], row['n_or_g']), reverse=True
+    )[:limit]
+
+    next_cursor = next_keyset_cursor(rows, ["posteddate", "postid", "n_or_g"], limit)
+    return [(row['n_or_g'], row['postid']) for row in rows], next_cursor
+
+
 @app.get("/get_followers_posts_feed")
 async def get_followers_posts_feed(
     myuserid: str = Query(...),
     limit: int = Query(5, ge=1),
-    offset: int = Query(0, ge=0)
+    offset: int = Query(0, ge=0),
+    cardwidth: int = Query(IMAGE_CARD_WIDTH, ge=1),
+    cursor_token: Optional[str] = Query(None, alias="cursor")
 ):
+    """
+    Newest-first posts from followed users and groups, exactly `limit` posts per page.
+    Continue with the X-Next-Cursor header sent back as `cursor` (`offset` is
+    deprecated and ignored).
+    """
     global pool
-    
-    async with pool.acquire() as conn:
+
+    # Only the fan-out timeline writes (it backfills an empty timeline); merging the
+    # followees' posts on read is a pure read and goes to the replica.
+    source = pool if TIMELINE_FANOUT_ENABLED else read_pool()
+    async with source.acquire() as conn:
         async with conn.cursor(aiomysql.DictCursor) as cursor:
             try:
-                processed_records = []
+                userids, groupids = await get_following(cursor, myuserid)
 
-                await cursor.execute("""
-                    SELECT otheruserid, type, groupid FROM iamfollowing WHERE myuserid = %s
-                """, (myuserid ))
-                following_records = await cursor.fetchall()
+                if TIMELINE_FANOUT_ENABLED:
+                    refs, next_cursor = await load_home_timeline(cursor, myuserid, userids, groupids, limit, cursor_token)
+                else:
+                    refs, next_cursor = await load_follower_timeline(cursor, userids, groupids, limit, cursor_token)
 
-                for record in following_records:
-                    if record['type'] == 'user':
-                        otheruserid = record['otheruserid']
-                        
-                        await cursor.execute("""
-                            SELECT p.userid, p.username, p.postdescription, p.posteddate, p.userprofile, p.posttype, p.postid,
-                                   p.grouptype, p.groupid, i.image, p.post, p.filepath, p.textcolor, p.textbody, p.thelink, p.n_or_g
-                            FROM post p
-                            LEFT JOIN image i ON p.postid = i.postid
-                            WHERE p.userid = %s
-                            ORDER BY  RAND() LIMIT %s OFFSET %s
-                        """, (otheruserid, limit, offset))
-                        
-                        user_posts = await cursor.fetchall()
-
-                        for post_record in user_posts:
-                            detailed_post = {
-                                'postid': post_record['postid'],
-                                'userid': post_record['userid'],
-                                'username': post_record['username'],
-                                'postdescription': post_record['postdescription'],
-                                'posteddate': post_record['posteddate'],
-                                'posttype': post_record['posttype'],
-                                'post': base64.b64encode(post_record['post']).decode('utf-8') if post_record['post'] else None,
-                                'userprofile': base64.b64encode(post_record['userprofile']).decode('utf-8') if post_record['userprofile'] else None,
-                                'filepath': post_record['filepath'] if 'filepath' in post_record else None,
-                                'textcolor': post_record['textcolor'] if 'textcolor' in post_record else None,
-                                'textbody': post_record['textbody'] if 'textbody' in post_record else None,
-                                'thelink': post_record['thelink'] if 'thelink' in post_record else None,
-                                'n_or_g': post_record['n_or_g'] if 'n_or_g' in post_record else None,
-                                'grouptype': post_record['grouptype'] if 'grouptype' in post_record else None,
-                                'groupid': post_record['groupid'] if 'groupid' in post_record else None,
-                     
-                            }
-
-                            if post_record['posttype'] == 'image' and 'image' in post_record:
-                                if post_record['image']:
-                                    detailed_post['image'] = base64.b64encode(post_record['image']).decode('utf-8')
-                                if post_record['userprofile']:
-                                    detailed_post['userprofile'] = base64.b64encode(post_record['userprofile']).decode('utf-8')
-                            elif post_record['posttype'] in ['video', 'audio', 'text', 'link']:
-                                if 'post' in post_record and post_record['post']:
-                                    detailed_post['post'] = base64.b64encode(post_record['post']).decode('utf-8')
-                                if 'userprofile' in post_record and post_record['userprofile']:
-                                    detailed_post['userprofile'] = base64.b64encode(post_record['userprofile']).decode('utf-8')
-
-                            processed_records.append(detailed_post)
-
-                    elif record['type'] == 'group':
-                        groupid = record['groupid']
-                        
-                        await cursor.execute("""
-                            SELECT gp.postid, gp.userid, gp.username, gp.postdescription, gp.posteddate, gp.posttype,
-                                   gp.post, gp.filepath, gp.textcolor, gp.textbody, gp.thelink, gp.groupid, gp.userprofile,gp.n_or_g,
-                                   gi.image
-                            FROM grouppost gp
-                            LEFT JOIN groupimage gi ON gp.postid = gi.postid
-                            WHERE gp.groupid = %s
-                            ORDER BY RAND()   LIMIT %s OFFSET %s
-                        """, (groupid, limit, offset))
-                        
-                        group_posts = await cursor.fetchall()
-
-                        for post_record in group_posts:
-                            detailed_post = {
-                                'postid': post_record['postid'],
-                                'userid': post_record['userid'],
-                                'username': post_record['username'],
-                                'postdescription': post_record['postdescription'],
-                                'posteddate': post_record['posteddate'],
-                                'posttype': post_record['posttype'],
-                                'post': base64.b64encode(post_record['post']).decode('utf-8') if post_record['post'] else None,
-                                'userprofile': base64.b64encode(post_record['userprofile']).decode('utf-8') if post_record['userprofile'] else None,
-                                'filepath': post_record['filepath'] if 'filepath' in post_record else None,
-                                'textcolor': post_record['textcolor'] if 'textcolor' in post_record else None,
-                                'textbody': post_record['textbody'] if 'textbody' in post_record else None,
-                                'thelink': post_record['thelink'] if 'thelink' in post_record else None,
-                                'n_or_g': post_record['n_or_g'] if 'n_or_g' in post_record else None,
-                                'groupid': post_record['groupid'],
-                            }
-
-                            if post_record['posttype'] == 'image' and post_record.get('image'):
-                                detailed_post['image'] = base64.b64encode(post_record['image']).decode('utf-8')
-
-                            processed_records.append(detailed_post)
-
-                return processed_records
+                headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+                return stream_json(iter_hydrated_posts(refs, cardwidth), headers=headers)
 
             except aiomysql.Error as err:
                 print(f"Error: {err}")
@@ -4800,18 +8184,105 @@ async def get_followers_posts_feed(
         
             
  
+# Materialized counters: (table, key column, counter column, counted table, its
+# column holding the key). Writes adjust them with bump_counter in the same
+# transaction as the row they count; reconcile_counters repairs any drift.
+COUNTERS = [
+    ("post", "postid", "likecount", "post_like", "postid"),
+    ("post", "postid", "commentcount", "comment", "postid"),
+    ("grouppost", "postid", "likecount", "group_post_like", "postid"),
+    ("grouppost", "postid", "commentcount", "groupcomment", "postid"),
+    ("comment", "commentid", "replycount", "commentreply", "commentid"),
+    ("groupcomment", "commentid", "replycount", "groupcommentreplay", "commentid"),
+]
+
+
+@asynccontextmanager
+async def transaction(conn):
+    """
+    BEGIN ... COMMIT on a pool connection (the pool runs in autocommit), rolled back
+    if the block raises.
+    """
+    await conn.begin()
+    try:
+        yield
+        await conn.commit()
+    except BaseException:
+        await conn.rollback()
+        raise
+
+
+async def bump_counter(cursor, table: str, column: str, key_column: str, key, delta: int):
+    await cursor.execute(
+        f"UPDATE {table} SET {column} = GREATEST({column} + %s, 0) WHERE {key_column} = %s", (delta, key)
+    )
+
+
+async def backfill_counter(cursor, table: str, column: str):
+    """
+    Set a just-added counter column from the rows it counts, so existing posts and
+    comments do not report 0 until reconcile_counters runs.
+    """
+    for counter_table, key_column, counter_column, counted_table, counted_column in COUNTERS:
+        if (counter_table, counter_column) == (table, column):
+            updated = await cursor.execute(f"""
+                UPDATE {table} t
+                SET t.{column} = (SELECT COUNT(*) FROM {counted_table} c WHERE c.{counted_column} = t.{key_column})
+            """)
+            print(f"Counter '{table}.{column}' backfilled for {updated} rows.")
+
+
+async def reconcile_counters(batch_size: int = 500):
+    """
+    Recompute every counter in COUNTERS from the rows it counts, a batch of keys at
+    a time, and rewrite the ones that drifted. Safe to run while serving: drifted
+    rows are fixed by an UPDATE that recounts them itself, so a like or comment
+    landing between the check and the fix is not lost. Cached feed rows pick the
+    new counts up when they expire. create_tables already counts a column when it
+    adds it; this is for drift.
+    """
+    for table, key_column, column, counted_table, counted_column in COUNTERS:
+        fixed = 0
+        last_key = -1
+        while True:
+            async with pool.acquire() as conn:
+                async with conn.cursor(aiomysql.DictCursor) as cursor:
+                    await cursor.execute(f"""
+                        SELECT t.{key_column} AS rowkey, t.{column} AS stored,
+                            (SELECT COUNT(*) FROM {counted_table} c WHERE c.{counted_column} = t.{key_column}) AS actual
+                        FROM {table} t
+                        WHERE t.{key_column} > %s
+                        ORDER BY t.{key_column}
+                        LIMIT %s
+                    """, (last_key, batch_size))
+                    rows = await cursor.fetchall()
+
+                    if not rows:
+                        break
+
+                    drifted = [row['rowkey'] for row in rows if row['stored'] != row['actual']]
+                    if drifted:
+                        placeholders = ", ".join(["%s"] * len(drifted))
+                        await cursor.execute(f"""
+                            UPDATE {table} t
+                            SET t.{column} = (SELECT COUNT(*) FROM {counted_table} c WHERE c.{counted_column} = t.{key_column})
+                            WHERE t.{key_column} IN ({placeholders})
+                        """, drifted)
+
+            last_key = rows[-1]['rowkey']
+            fixed += len(drifted)
+
+        print(f"Reconciled '{table}.{column}': {fixed} rows fixed.")
+
+
 @app.get("/get_comments_count")
 async def get_comment_count(postid: int = Query(...)):
-    global pool
-    async with pool.acquire() as conn:   
-        async with conn.cursor(aiomysql.DictCursor) as cursor:  
-            await cursor.execute("SELECT COUNT(*) as comment_count FROM comment WHERE postid=%s", (postid,))
-            record = await cursor.fetchone()
+    record = await db_fetch("comment_count", (postid,), fetch="one", replica=True)
     
     if record:
-        return JSONResponse(content={"comment_count": record['comment_count']}, status_code=200)
+        return ORJSONResponse(content={"comment_count": record['comment_count']}, status_code=200)
     else:
-        return JSONResponse(content={"comment_count": 0}, status_code=200)
+        return ORJSONResponse(content={"comment_count": 0}, status_code=200)
 
  
     
@@ -4820,23 +8291,6 @@ async def get_comment_count(postid: int = Query(...)):
 
 
 
-def serialize_blocked_user_data(record):
-    """
-    Serialize a single record (dictionary).
-    """
-    if not record:
-        return None
-
-    serialized_record = {}
-    for key, value in record.items():
-        if isinstance(value, datetime):
-            serialized_record[key] = value.isoformat()
-        elif isinstance(value, bytes):
-            serialized_record[key] = base64.b64encode(value).decode('utf-8')
-        else:
-            serialized_record[key] = value
-
-    return serialized_record
 
 @app.post("/get_blocked_user_list")
 async def get_blocked_user_list(userid: str = Form()):
@@ -4845,13 +8299,18 @@ async def get_blocked_user_list(userid: str = Form()):
         async with pool.acquire() as conn:
             async with conn.cursor(aiomysql.DictCursor) as cursor:
                 
-                await cursor.execute("""SELECT * FROM user_blocked WHERE userid = %s""", (userid,))
+                await cursor.execute("""
+                    SELECT b.blockedid, b.userid, b.username, b.blockeduserid, b.blockeddate,
+                        u.profileimage AS blockeduserprofile, u.avatarkey
+                    FROM user_blocked b
+                    LEFT JOIN user u ON u.userid = b.blockeduserid
+                    WHERE b.userid = %s
+                """, (userid,))
 
                 user_details = await cursor.fetchall()
+                attach_avatar_urls(user_details, 'blockeduserprofile')
                 
-                serialized_users = [serialize_blocked_user_data(record) for record in user_details]
-
-                return {"message": "Success", "blocked_users": serialized_users}
+                return ORJSONResponse(content={"message": "Success", "blocked_users": user_details})
 
     except aiomysql.Error as err:
         print(f"Database Error: {err}")
@@ -4872,23 +8331,6 @@ async def get_blocked_user_list(userid: str = Form()):
 
 
 
-def serialize_group_data(record):
-    """
-    Serialize a single record (dictionary).
-    """
-    if not record:
-        return None
-
-    serialized_record = {}
-    for key, value in record.items():
-        if isinstance(value, datetime):
-            serialized_record[key] = value.isoformat()
-        elif isinstance(value, bytes):  # Handling binary data for group image
-            serialized_record[key] = base64.b64encode(value).decode('utf-8')
-        else:
-            serialized_record[key] = value
-
-    return serialized_record
 
 
 @app.post("/get_my_group_list")
@@ -4897,12 +8339,10 @@ async def get_my_group_list(userid: str = Form(...)):
     try:
         async with pool.acquire() as conn:
             async with conn.cursor(aiomysql.DictCursor) as cursor:
-                await cursor.execute("SELECT * FROM groups WHERE groupownerid = %s", (userid,))
+                await cursor.execute(f"SELECT {GROUP_SELECT} FROM groups WHERE groupownerid = %s", (userid,))
                 user_details = await cursor.fetchall()
 
-                serialized_groups = [serialize_group_data(record) for record in user_details]
-
-                return {"message": "Success", "serialized_groups": serialized_groups}
+                return ORJSONResponse(content={"message": "Success", "serialized_groups": user_details})
 
     except aiomysql.Error as err:
         print(f"Database Error: {err}")
@@ -4932,12 +8372,10 @@ async def get_iamfollowing_group_list(userid: str = Form(...)):
                 group_ids = [group['groupid'] for group in group_ids]
                 
                 format_strings = ','.join(['%s'] * len(group_ids))   
-                await cursor.execute(f"SELECT * FROM groups WHERE groupid IN ({format_strings})", tuple(group_ids))
+                await cursor.execute(f"SELECT {GROUP_SELECT} FROM groups WHERE groupid IN ({format_strings})", tuple(group_ids))
                 groups_details = await cursor.fetchall()
                 
-                serialized_groups = [serialize_group_data(record) for record in groups_details]
-
-                return {"message": "Success", "serialized_my_follwoing_groups": serialized_groups}
+                return ORJSONResponse(content={"message": "Success", "serialized_my_follwoing_groups": groups_details})
     
     except aiomysql.Error as err:
         print(f"Database Error: {err}")
@@ -4986,40 +8424,22 @@ async def remove_blocked_user(
     
     
     
-def serialize_record_iamfollowing(record):
-    """
-    Serialize a single record (dictionary).
-    """
-    if not record:
-        return None
-    
-    serialized_record = {}
-    for key in record:
-        if isinstance(record[key], datetime):
-            serialized_record[key] = record[key].isoformat()
-        elif isinstance(record[key], bytes):
-            serialized_record[key] = base64.b64encode(record[key]).decode('utf-8')
-        else:
-            serialized_record[key] = record[key]
-    
-    return serialized_record
 
 @app.post("/get_iamfollowinguserlist")
 async def get_iamfollowinguserlist(
-    userid: int = Form(...)
+    userid: int = Form(...),
+    avatars: str = Form('url'),
 ):
+    resolver = AvatarResolver(avatars)
     try:
         async with pool.acquire() as conn:
             async with conn.cursor(aiomysql.DictCursor) as cursor:
-                await cursor.execute("""
-                    SELECT * FROM iamfollowing
-                    WHERE myuserid = %s AND type='user'
-                """, (userid,))
-                records = await cursor.fetchall()
-
-                processed_records = [serialize_record_iamfollowing(record) for record in records]
+                records = resolver.add(await run_query(cursor, "following_users", (userid,)), 'otheruserid', 'profile')
+                avatar_table = await resolver.resolve(cursor)
 
-        return processed_records
+        if avatar_table is not None:
+            return ORJSONResponse(content={"users": records, "avatars": avatar_table})
+        return ORJSONResponse(content=records)
 
     except aiomysql.Error as err:
         print(f"Error: {err}")
@@ -5059,14 +8479,13 @@ async def get_populargroup():
         async with pool.acquire() as conn:
             async with conn.cursor(aiomysql.DictCursor) as cursor:
                 await cursor.execute("""
-                    SELECT * FROM groupmembercount 
+                    SELECT groupmembercountid, groupid, groupownerid, grouptype, groupname, groupimage, members
+                    FROM groupmembercount
                     ORDER BY members DESC LIMIT 20
                 """)
                 records = await cursor.fetchall()
 
-                processed_records = [serialize_record_iamfollowing(record) for record in records]
-
-        return processed_records
+        return ORJSONResponse(content=records)
 
     except aiomysql.Error as err:
         print(f"Error: {err}")
@@ -5083,13 +8502,6 @@ async def get_populargroup():
     
     
     
-def serialize_record_user(record):
-    for key in record:
-        if isinstance(record[key], datetime):
-            record[key] = record[key].isoformat()
-        elif isinstance(record[key], bytes):
-            record[key] = base64.b64encode(record[key]).decode('utf-8')
-    return record
 
 @app.post("/get_userlist")
 async def get_userlist(
@@ -5111,14 +8523,15 @@ async def get_userlist(
                 processed_records = []
                 for result in user_ids:
                     otheruserid = result['userid']
-                    await cursor.execute("SELECT * FROM user WHERE userid=%s", (otheruserid,))
+                    await cursor.execute(f"SELECT {USER_SELECT} FROM user WHERE userid=%s", (otheruserid,))
                     record = await cursor.fetchone()
 
                     if record:
-                        processed_record = serialize_record_user(record)
-                        processed_records.append(processed_record)
+                        processed_records.append(record)
 
-        return JSONResponse(content=processed_records, status_code=200)
+                attach_avatar_urls(processed_records, 'profileimage')
+
+        return ORJSONResponse(content=processed_records, status_code=200)
 
     except aiomysql.Error as err:
         print(f"Error: {err}")
@@ -5157,53 +8570,29 @@ async def get_userlist(
 
 
 
-def serialize_record(record):
-    """
-    Serialize a single record (dictionary) or a list of records.
-    Returns None if the record is None or empty.
-    """
-    if not record:
-        return None
-    
-    if isinstance(record, dict):
-        serialized_record = {}
-        for key in record:
-            if isinstance(record[key], datetime):
-                serialized_record[key] = record[key].isoformat()
-            elif isinstance(record[key], bytes):
-                serialized_record[key] = base64.b64encode(record[key]).decode('utf-8')
-            else:
-                serialized_record[key] = record[key]
-        return serialized_record
-    
-    elif isinstance(record, list):
-        return [serialize_record(rec) for rec in record if rec]
-
-    return None
 
 @app.post("/get_notifications")
 async def get_notifications(
     userid: int = Form(...),
+    avatars: str = Form('url'),
 ):
+    resolver = AvatarResolver(avatars)
     try:
         async with pool.acquire() as conn:
             async with conn.cursor(aiomysql.DictCursor) as cursor:
                 await cursor.execute("""
-                    SELECT n.notificationid, n.postid, n.postowneruserid,n.commenttext,n.groupid,n.groupname,n.replaytext, n.myuserid, n.username, n.notificationtype, n.date, u.profileimage, n.seenstatus,n.n_or_g
+                    SELECT n.notificationid, n.postid, n.postowneruserid,n.commenttext,n.groupid,n.groupname,n.replaytext, n.myuserid, n.username, n.notificationtype, n.date, n.seenstatus,n.n_or_g
                     FROM notification n
                     JOIN user u ON n.myuserid = u.userid
                     WHERE n.postowneruserid = %s
                     ORDER BY n.date DESC LIMIT 30
                 """, (userid,))
-                records = await cursor.fetchall()
-
-                processed_records = []
-
-                for record in records:
-                    processed_record = serialize_record(record)
-                    processed_records.append(processed_record)
+                records = resolver.add(await cursor.fetchall(), 'myuserid', 'profileimage')
+                avatar_table = await resolver.resolve(cursor)
 
-        return processed_records
+        if avatar_table is not None:
+            return ORJSONResponse(content={"notifications": records, "avatars": avatar_table})
+        return ORJSONResponse(content=records)
 
     except aiomysql.Error as err:
         print(f"Error: {err}")
@@ -5236,40 +8625,22 @@ async def get_notifications(
     
     
     
-def serialize_record_iamfollowed(record):
-    """
-    Serialize a single record (dictionary).
-    """
-    if not record:
-        return None
-    
-    serialized_record = {}
-    for key in record:
-        if isinstance(record[key], datetime):
-            serialized_record[key] = record[key].isoformat()
-        elif isinstance(record[key], bytes):
-            serialized_record[key] = base64.b64encode(record[key]).decode('utf-8')
-        else:
-            serialized_record[key] = record[key]
-    
-    return serialized_record
 
 @app.post("/get_iamfolloweduserlist")
 async def get_iamfolloweduserlist(
-    userid: int = Form(...)
+    userid: int = Form(...),
+    avatars: str = Form('url'),
 ):
+    resolver = AvatarResolver(avatars)
     try:
         async with pool.acquire() as conn:
             async with conn.cursor(aiomysql.DictCursor) as cursor:
-                await cursor.execute("""
-                    SELECT * FROM iamfollowed
-                    WHERE myuserid = %s
-                """, (userid,))
-                records = await cursor.fetchall()
+                records = resolver.add(await run_query(cursor, "followers", (userid,)), 'otheruserid', 'profile')
+                avatar_table = await resolver.resolve(cursor)
 
-                processed_records = [serialize_record_iamfollowed(record) for record in records]
-
-        return processed_records
+        if avatar_table is not None:
+            return ORJSONResponse(content={"users": records, "avatars": avatar_table})
+        return ORJSONResponse(content=records)
 
     except aiomysql.Error as err:
         print(f"Error: {err}")
@@ -5295,44 +8666,30 @@ async def get_iamfolloweduserlist(
 
 
 
-def serialize_record_liked_members_details(record):
-    """
-    Serialize a single record (dictionary).
-    """
-    if not record:
-        return None
-    
-    serialized_record = {}
-    for key in record:
-        if isinstance(record[key], datetime):
-            serialized_record[key] = record[key].isoformat()
-        elif isinstance(record[key], bytes):
-            serialized_record[key] = base64.b64encode(record[key]).decode('utf-8')
-        else:
-            serialized_record[key] = record[key]
-    
-    return serialized_record
 
 @app.post("/get_liked_members")
 async def get_liked_members(
     postid: str = Form(...),
     limit: int = Form(...),
-    offset: int = Form(...)
+    offset: int = Form(...),
+    avatars: str = Form('url'),
 ):
+    resolver = AvatarResolver(avatars)
     try:
         async with pool.acquire() as conn:
             async with conn.cursor(aiomysql.DictCursor) as cursor:
                 await cursor.execute("""
-                    SELECT pl.currentuserid, u.username, u.profileimage
+                    SELECT pl.currentuserid, u.username
                     FROM post_like pl
                     INNER JOIN user u ON pl.currentuserid = u.userid
                     WHERE pl.postid = %s LIMIT %s OFFSET %s
                 """, (postid, limit, offset))
-                records = await cursor.fetchall()
+                records = resolver.add(await cursor.fetchall(), 'currentuserid', 'profileimage')
+                avatar_table = await resolver.resolve(cursor)
 
-                processed_records = [serialize_record_liked_members_details(record) for record in records]
-
-        return processed_records
+        if avatar_table is not None:
+            return ORJSONResponse(content={"members": records, "avatars": avatar_table})
+        return ORJSONResponse(content=records)
 
     except aiomysql.Error as err:
         print(f"Error: {err}")
@@ -5355,22 +8712,25 @@ async def get_liked_members(
 async def get_liked_members_group(
     postid: str = Form(...),
     limit: int = Form(...),
-    offset: int = Form(...)
+    offset: int = Form(...),
+    avatars: str = Form('url'),
 ):
+    resolver = AvatarResolver(avatars)
     try:
         async with pool.acquire() as conn:
             async with conn.cursor(aiomysql.DictCursor) as cursor:
                 await cursor.execute("""
-                    SELECT pl.currentuserid, u.username, u.profileimage
+                    SELECT pl.currentuserid, u.username
                     FROM group_post_like pl
                     INNER JOIN user u ON pl.currentuserid = u.userid
                     WHERE pl.postid = %s LIMIT %s OFFSET %s
                 """, (postid, limit, offset))
-                records = await cursor.fetchall()
+                records = resolver.add(await cursor.fetchall(), 'currentuserid', 'profileimage')
+                avatar_table = await resolver.resolve(cursor)
 
-                processed_records = [serialize_record_liked_members_details(record) for record in records]
-
-        return processed_records
+        if avatar_table is not None:
+            return ORJSONResponse(content={"members": records, "avatars": avatar_table})
+        return ORJSONResponse(content=records)
 
     except aiomysql.Error as err:
         print(f"Error: {err}")
@@ -5400,30 +8760,33 @@ async def add_post_like(
     userid: int = Form(...),
     currentuserid: int = Form(...),
     username: str = Form(...),
-    profileimage: str = Form(...)
 ):
     try:
         async with pool.acquire() as conn:
             async with conn.cursor(aiomysql.DictCursor) as cursor:
 
-                check_query = "SELECT * FROM post_like WHERE postid = %s AND currentuserid = %s"
+                check_query = "SELECT likeid FROM post_like WHERE postid = %s AND currentuserid = %s"
                 await cursor.execute(check_query, (postid, currentuserid))
                 existing_like = await cursor.fetchone()
 
                 if existing_like:
                     delete_query = "DELETE FROM post_like WHERE postid = %s AND currentuserid = %s"
-                    await cursor.execute(delete_query, (postid, currentuserid))
-                    await conn.commit()
-                    return JSONResponse(content={"message": "yes"}, status_code=200)
+                    async with transaction(conn):
+                        deleted = await cursor.execute(delete_query, (postid, currentuserid))
+                        await bump_counter(cursor, "post", "likecount", "postid", postid, -deleted)
+                    post_cache.invalidate_post('n', postid)
+                    return ORJSONResponse(content={"message": "yes"}, status_code=200)
                 
                 insert_query = """
-                INSERT INTO post_like (postid, userid, currentuserid, username, profileimage)
-                VALUES (%s, %s, %s, %s, %s)
+                INSERT INTO post_like (postid, userid, currentuserid, username)
+                VALUES (%s, %s, %s, %s)
                 """
-                await cursor.execute(insert_query, (postid, userid, currentuserid, username, profileimage))
-                await conn.commit()
+                async with transaction(conn):
+                    await cursor.execute(insert_query, (postid, userid, currentuserid, username))
+                    await bump_counter(cursor, "post", "likecount", "postid", postid, 1)
+                post_cache.invalidate_post('n', postid)
                 
-                return JSONResponse(content={"message": "no"}, status_code=201)
+                return ORJSONResponse(content={"message": "no"}, status_code=201)
 
     except aiomysql.Error as e:
         print(f"Database error: {e}")
@@ -5455,30 +8818,33 @@ async def add_post_like_group(
     userid: int = Form(...),
     currentuserid: int = Form(...),
     username: str = Form(...),
-    profileimage: str = Form(...)
 ):
     try:
         async with pool.acquire() as conn:
             async with conn.cursor(aiomysql.DictCursor) as cursor:
 
-                check_query = "SELECT * FROM group_post_like WHERE postid = %s AND currentuserid = %s"
+                check_query = "SELECT likeid FROM group_post_like WHERE postid = %s AND currentuserid = %s"
                 await cursor.execute(check_query, (postid, currentuserid))
                 existing_like = await cursor.fetchone()
 
                 if existing_like:
                     delete_query = "DELETE FROM group_post_like WHERE postid = %s AND currentuserid = %s"
-                    await cursor.execute(delete_query, (postid, currentuserid))
-                    await conn.commit()
-                    return JSONResponse(content={"message": "yes"}, status_code=200)
+                    async with transaction(conn):
+                        deleted = await cursor.execute(delete_query, (postid, currentuserid))
+                        await bump_counter(cursor, "grouppost", "likecount", "postid", postid, -deleted)
+                    post_cache.invalidate_post('g', postid)
+                    return ORJSONResponse(content={"message": "yes"}, status_code=200)
                 
                 insert_query = """
-                INSERT INTO group_post_like (postid, userid, currentuserid, username, profileimage)
-                VALUES (%s, %s, %s, %s, %s)
+                INSERT INTO group_post_like (postid, userid, currentuserid, username)
+                VALUES (%s, %s, %s, %s)
                 """
-                await cursor.execute(insert_query, (postid, userid, currentuserid, username, profileimage))
-                await conn.commit()
+                async with transaction(conn):
+                    await cursor.execute(insert_query, (postid, userid, currentuserid, username))
+                    await bump_counter(cursor, "grouppost", "likecount", "postid", postid, 1)
+                post_cache.invalidate_post('g', postid)
 
-                return JSONResponse(content={"message": "no"}, status_code=201)
+                return ORJSONResponse(content={"message": "no"}, status_code=201)
 
     except aiomysql.Error as e:
         print(f"Database error: {e}")
@@ -5506,7 +8872,7 @@ async def save_fav_post(
     try:
         async with pool.acquire() as conn:
             async with conn.cursor() as cursor:
-                check_query = "SELECT * FROM favpost WHERE postid = %s AND userid = %s"
+                check_query = "SELECT favpostid FROM favpost WHERE postid = %s AND userid = %s"
                 await cursor.execute(check_query, (postid, userid))
                 existing_like = await cursor.fetchone()
 
@@ -5514,7 +8880,7 @@ async def save_fav_post(
                     delete_query = "DELETE FROM favpost WHERE postid = %s AND userid = %s"
                     await cursor.execute(delete_query, (postid, userid))
                     await conn.commit()
-                    return JSONResponse(content={"message": "removed"}, status_code=200)
+                    return ORJSONResponse(content={"message": "removed"}, status_code=200)
 
                 insert_query = """
                 INSERT INTO favpost (postid, userid, saveeddate)
@@ -5523,7 +8889,7 @@ async def save_fav_post(
                 await cursor.execute(insert_query, (postid, userid))
                 await conn.commit()
 
-                return JSONResponse(content={"message": "saved"}, status_code=201)
+                return ORJSONResponse(content={"message": "saved"}, status_code=201)
 
     except aiomysql.MySQLError as err:
         print(f"Database error: {err}")
@@ -5555,14 +8921,14 @@ async def is_added_to_fav(
     try:
         async with pool.acquire() as conn:
             async with conn.cursor() as cursor:
-                check_query = "SELECT * FROM favpost WHERE postid = %s AND userid = %s"
+                check_query = "SELECT favpostid FROM favpost WHERE postid = %s AND userid = %s"
                 await cursor.execute(check_query, (postid, userid))
                 existing_like = await cursor.fetchone()
 
                 if existing_like:
-                    return JSONResponse(content={"message": "exists"}, status_code=200)
+                    return ORJSONResponse(content={"message": "exists"}, status_code=200)
                 else:
-                    return JSONResponse(content={"message": "not_found"}, status_code=200)
+                    return ORJSONResponse(content={"message": "not_found"}, status_code=200)
 
     except aiomysql.MySQLError as err:
         print(f"Database error: {err}")
@@ -5592,7 +8958,6 @@ async def send_notification(
     username: str = Form(...),
     commenttext: str = Form(...),
     notificationtype: str = Form(...),
-    profileimage: str = Form(...),
     replytext: str = Form(...),
 ):
     createddate = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
@@ -5601,16 +8966,12 @@ async def send_notification(
     try:
         async with pool.acquire() as conn:   
             async with conn.cursor(aiomysql.DictCursor) as cursor:
-                await cursor.execute("""
-                    SELECT username, profileimage FROM user WHERE userid = %s
-                """, (currentuserid,))
-                user_details = await cursor.fetchone()
+                user_details = await run_query(cursor, "user_name", (currentuserid,), fetch="one")
 
                 if not user_details:
                     raise HTTPException(status_code=404, detail="User not found")
 
                 username = user_details['username']
-                profileimagecurruntuser = user_details['profileimage']
 
                 if notificationtype == 'like':
                     await cursor.execute("""
@@ -5627,24 +8988,24 @@ async def send_notification(
                         """, (postid, currentuserid, 'like'))
                         await conn.commit() 
 
-                        return JSONResponse(content={"message": "Existing like notification dropped"}, status_code=200)
+                        return ORJSONResponse(content={"message": "Existing like notification dropped"}, status_code=200)
                     else:
                         await cursor.execute("""
-                            INSERT INTO notification (postid, postowneruserid, myuserid, username, notificationtype, commenttext, replaytext, date, userprofile, seenstatus)
-                            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                        """, (postid, userid, currentuserid, username, notificationtype, "", "", createddate, profileimagecurruntuser, 0))
+                            INSERT INTO notification (postid, postowneruserid, myuserid, username, notificationtype, commenttext, replaytext, date, seenstatus)
+                            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+                        """, (postid, userid, currentuserid, username, notificationtype, "", "", createddate, 0))
 
                 elif notificationtype == "comment":
                     await cursor.execute("""
-                        INSERT INTO notification (postid, postowneruserid, myuserid, username, notificationtype, commenttext, replaytext, date, userprofile, seenstatus)
-                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    """, (postid, userid, currentuserid, username, notificationtype, commenttext, "", createddate, profileimagecurruntuser, 0))
+                        INSERT INTO notification (postid, postowneruserid, myuserid, username, notificationtype, commenttext, replaytext, date, seenstatus)
+                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+                    """, (postid, userid, currentuserid, username, notificationtype, commenttext, "", createddate, 0))
                     
                 elif notificationtype == "replaycomment":
                     await cursor.execute("""
-                        INSERT INTO notification (postid, postowneruserid, myuserid, username, notificationtype, commenttext, replaytext, date, userprofile, seenstatus)
-                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    """, (postid, userid, currentuserid, username, notificationtype, commenttext, replytext, createddate, profileimagecurruntuser, 0))
+                        INSERT INTO notification (postid, postowneruserid, myuserid, username, notificationtype, commenttext, replaytext, date, seenstatus)
+                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+                    """, (postid, userid, currentuserid, username, notificationtype, commenttext, replytext, createddate, 0))
                     
                 await cursor.execute("""
                     UPDATE user
@@ -5653,7 +9014,7 @@ async def send_notification(
                 """, (userid,))
 
                 await conn.commit()   
-                return JSONResponse(content={"message": "Notification added successfully"}, status_code=201)
+                return ORJSONResponse(content={"message": "Notification added successfully"}, status_code=201)
                     
 
     except aiomysql.MySQLError as err:
@@ -5679,16 +9040,12 @@ async def send_notification(
 
 @app.get("/get_like_count")
 async def get_like_count(postid: int = Query(...)):
-    global pool
-    async with pool.acquire() as conn:   
-        async with conn.cursor(aiomysql.DictCursor) as cursor: 
-            await cursor.execute("SELECT COUNT(*) as like_count FROM post_like WHERE postid=%s", (postid,))
-            record = await cursor.fetchone()
+    record = await db_fetch("like_count", (postid,), fetch="one", replica=True)
     
     if record:
-        return JSONResponse(content={"like_count": record['like_count']}, status_code=200)
+        return ORJSONResponse(content={"like_count": record['like_count']}, status_code=200)
     else:
-        return JSONResponse(content={"like_count": 0}, status_code=200)
+        return ORJSONResponse(content={"like_count": 0}, status_code=200)
     
     
     
@@ -5701,16 +9058,12 @@ async def get_like_count(postid: int = Query(...)):
     
 @app.get("/get_like_count_group")
 async def get_like_count_group(postid: int = Query(...)):
-    global pool
-    async with pool.acquire() as conn:   
-        async with conn.cursor(aiomysql.DictCursor) as cursor: 
-            await cursor.execute("SELECT COUNT(*) as like_count FROM group_post_like WHERE postid=%s", (postid,))
-            record = await cursor.fetchone()
+    record = await db_fetch("like_count_group", (postid,), fetch="one", replica=True)
     
     if record:
-        return JSONResponse(content={"like_count": record['like_count']}, status_code=200)
+        return ORJSONResponse(content={"like_count": record['like_count']}, status_code=200)
     else:
-        return JSONResponse(content={"like_count": 0}, status_code=200)
+        return ORJSONResponse(content={"like_count": 0}, status_code=200)
     
     
     
@@ -5738,9 +9091,9 @@ async def check_curruntuser_liked_or_not_group(
             record = await cursor.fetchone()
 
     if record:
-        return JSONResponse(content={"message": "yes"}, status_code=200)
+        return ORJSONResponse(content={"message": "yes"}, status_code=200)
     else:
-        return JSONResponse(content={"message": "no"}, status_code=200)
+        return ORJSONResponse(content={"message": "no"}, status_code=200)
     
     
       
@@ -5767,9 +9120,9 @@ async def check_curruntuser_liked_or_not(
             record = await cursor.fetchone()
 
     if record:
-        return JSONResponse(content={"message": "yes"}, status_code=200)
+        return ORJSONResponse(content={"message": "yes"}, status_code=200)
     else:
-        return JSONResponse(content={"message": "no"}, status_code=200)
+        return ORJSONResponse(content={"message": "no"}, status_code=200)
     
     
     
@@ -5799,9 +9152,9 @@ async def check_curruntuser_liked_video_or_not(
             record = await cursor.fetchone()
 
     if record:
-        return JSONResponse(content={"message": "yes"}, status_code=200)
+        return ORJSONResponse(content={"message": "yes"}, status_code=200)
     else:
-        return JSONResponse(content={"message": "no"}, status_code=200)
+        return ORJSONResponse(content={"message": "no"}, status_code=200)
     
     
     
@@ -5819,19 +9172,16 @@ async def check_curruntuser_liked_video_or_not(
 async def get_replay_count(commentid: int = Query(...)):
     global pool
     try:
-        async with pool.acquire() as conn:
-            async with conn.cursor(aiomysql.DictCursor) as cursor:
-                await cursor.execute("SELECT COUNT(*) as replay_count FROM commentreply WHERE commentid = %s", (commentid,))
-                record = await cursor.fetchone()
+        record = await db_fetch("reply_count", (commentid,), fetch="one", replica=True)
 
         if record:
-            return JSONResponse(content={"replays_count": record['replay_count']}, status_code=200)
+            return ORJSONResponse(content={"replays_count": record['replay_count']}, status_code=200)
         else:
-            return JSONResponse(content={"replays_count": 0}, status_code=200)
+            return ORJSONResponse(content={"replays_count": 0}, status_code=200)
 
     except Exception as e:
         print(f"Error fetching replay count: {e}")
-        return JSONResponse(content={"message": "Error fetching replay count"}, status_code=500)
+        return ORJSONResponse(content={"message": "Error fetching replay count"}, status_code=500)
     
     
     
@@ -5839,42 +9189,28 @@ async def get_replay_count(commentid: int = Query(...)):
     
     
     
-def serialize_record(record):
-    """
-    Serialize the database record to handle datetime and bytes data types.
-    """
-    for key in record:
-        if isinstance(record[key], datetime):
-            record[key] = record[key].isoformat()
-        elif isinstance(record[key], bytes):
-            record[key] = base64.b64encode(record[key]).decode('utf-8')
-    return record
-
 @app.get("/get-popular-posts-from-like-count")
 async def get_popular_posts_from_like_count():
     try:
         async with pool.acquire() as conn:
             async with conn.cursor(aiomysql.DictCursor) as cursor:
-                await cursor.execute("""
-                    SELECT postid, COUNT(*) as like_count 
-                    FROM post_like 
-                    GROUP BY postid 
-                    ORDER BY like_count DESC  LIMIT 10
-                """)
-                like_counts = await cursor.fetchall()
+                like_counts = await run_query(cursor, "popular_like_counts")
 
                 if like_counts:
                     post_ids = [record['postid'] for record in like_counts]
                     placeholders = ', '.join(['%s'] * len(post_ids))
 
-                    await cursor.execute(f"SELECT * FROM post WHERE postid IN ({placeholders})", tuple(post_ids))
+                    await cursor.execute(f"SELECT {POST_PREVIEW_SELECT} FROM post WHERE postid IN ({placeholders})", tuple(post_ids))
                     posts = await cursor.fetchall()
+                    attach_media_urls(posts, 'post')
+                    attach_video_previews(posts)
+                    await attach_avatars(cursor, posts, 'userprofile')
 
-                    serialized_posts = [serialize_record(post) for post in posts]
+                    serialized_posts = [serialize_post(post) for post in posts]
 
-                    return JSONResponse(content={"posts": serialized_posts, "like_counts": like_counts}, status_code=200)
+                    return ORJSONResponse(content={"posts": serialized_posts, "like_counts": like_counts}, status_code=200)
                 else:
-                    return JSONResponse(content={"message": "No popular posts found"}, status_code=200)
+                    return ORJSONResponse(content={"message": "No popular posts found"}, status_code=200)
 
     except aiomysql.MySQLError as e:
         print(f"Database error occurred: {e}")
@@ -5907,9 +9243,9 @@ async def following_status(
             record = await cursor.fetchone()  
 
     if record:
-        return JSONResponse(content={"exists": True}, status_code=200)
+        return ORJSONResponse(content={"exists": True}, status_code=200)
     else:
-        return JSONResponse(content={"exists": False}, status_code=200)
+        return ORJSONResponse(content={"exists": False}, status_code=200)
         
         
         
@@ -5929,17 +9265,14 @@ async def update_user_details(
     try:
         async with pool.acquire() as conn:  
             async with conn.cursor(aiomysql.DictCursor) as cursor:  
-                await cursor.execute("SELECT profileimage FROM user WHERE userid = %s", (userid,))
-                user_record = await cursor.fetchone()
+                user_record = await run_query(cursor, "user_name", (userid,), fetch="one")
 
                 if not user_record:
                     raise HTTPException(status_code=404, detail=f"User with userid {userid} not found")
-                
-                user_profileimage = user_record['profileimage']
 
                 await cursor.execute(
-                    "UPDATE user SET username = %s, emailaddress = %s, phonenumber = %s, profileimage = %s WHERE userid = %s",
-                    (username, emailaddress, phonenumber, user_profileimage, userid)
+                    "UPDATE user SET username = %s, emailaddress = %s, phonenumber = %s WHERE userid = %s",
+                    (username, emailaddress, phonenumber, userid)
                 )
                 await conn.commit()
 
@@ -5952,12 +9285,12 @@ async def update_user_details(
                 affected_rows = cursor.rowcount
 
                 if affected_rows > 0:
-                    return JSONResponse(content={"message": "User details updated successfully"}, status_code=200)
+                    return ORJSONResponse(content={"message": "User details updated successfully"}, status_code=200)
                 else:
                     raise HTTPException(status_code=404, detail=f"User with userid {userid} not found")
 
     except Exception as e:
-        return JSONResponse(content={"message": f"Internal Server Error: {str(e)}"}, status_code=500)
+        return ORJSONResponse(content={"message": f"Internal Server Error: {str(e)}"}, status_code=500)
 
 
  
@@ -5990,12 +9323,12 @@ async def update_notification_status(
                 affected_rows = cursor.rowcount
 
                 if affected_rows > 0:
-                    return JSONResponse(content={"message": "User details updated successfully"}, status_code=200)
+                    return ORJSONResponse(content={"message": "User details updated successfully"}, status_code=200)
                 else:
                     raise HTTPException(status_code=404, detail=f"User with userid {userid} not found")
 
     except Exception as e:
-        return JSONResponse(content={"message": f"Internal Server Error: {str(e)}"}, status_code=500)
+        return ORJSONResponse(content={"message": f"Internal Server Error: {str(e)}"}, status_code=500)
     
     
     
@@ -6019,15 +9352,15 @@ async def update_notification_clicked(notificationid: str = Form(...)):
                 )
                 await conn.commit()   
 
-        return JSONResponse(content={"message": "Notification status updated successfully"}, status_code=200)
+        return ORJSONResponse(content={"message": "Notification status updated successfully"}, status_code=200)
 
     except aiomysql.Error as e:
         print(f"Database Error: {e}")
-        return JSONResponse(content={"message": f"Database Error: {str(e)}"}, status_code=500)
+        return ORJSONResponse(content={"message": f"Database Error: {str(e)}"}, status_code=500)
 
     except Exception as e:
         print(f"Internal Server Error: {e}")
-        return JSONResponse(content={"message": f"Internal Server Error: {str(e)}"}, status_code=500)
+        return ORJSONResponse(content={"message": f"Internal Server Error: {str(e)}"}, status_code=500)
     
     
     
@@ -6042,11 +9375,11 @@ async def get_link_preview(url: str = Form(...)):
             preview_data = await fetch_facebook_preview(url)
         else:
             preview_data = await fetch_general_preview(url)
-        return JSONResponse(content=preview_data)
+        return ORJSONResponse(content=preview_data)
     except HTTPException as e:
-        return JSONResponse(content={"message": e.detail}, status_code=e.status_code)
+        return ORJSONResponse(content={"message": e.detail}, status_code=e.status_code)
     except Exception as e:
-        return JSONResponse(content={"message": f"Internal Server Error: {str(e)}"}, status_code=500)
+        return ORJSONResponse(content={"message": f"Internal Server Error: {str(e)}"}, status_code=500)
 
 
 async def fetch_facebook_preview(url: str):
@@ -6121,19 +9454,6 @@ async def fetch_general_preview(url: str):
  
  
 
-class DateTimeEncoder(json.JSONEncoder):
-    def default(self, obj):
-        if isinstance(obj, datetime):
-            return obj.isoformat()
-        return json.JSONEncoder.default(self, obj)
-
-def serialize_record(record):
-    for key in record:
-        if isinstance(record[key], datetime):
-            record[key] = record[key].isoformat()
-        elif isinstance(record[key], bytes):
-            record[key] = base64.b64encode(record[key]).decode('utf-8')
-    return record
 
 @app.post("/get_post")
 async def get_post(
@@ -6142,14 +9462,15 @@ async def get_post(
     try:
         async with pool.acquire() as conn:
             async with conn.cursor(aiomysql.DictCursor) as cursor:
-                await cursor.execute("SELECT * FROM post WHERE postid=%s", (postid,))
+                await cursor.execute(f"SELECT {POST_SELECT} FROM post WHERE postid=%s", (postid,))
                 record = await cursor.fetchone()
+                attach_media_urls([record], 'post')
+                await attach_avatars(cursor, [record], 'userprofile')
 
                 if record:
-                    record = serialize_record(record)
-                    return JSONResponse(content=record, status_code=200)
+                    return ORJSONResponse(content=serialize_post(record), status_code=200)
                 else:
-                    return JSONResponse(content={"message": "Post not found"}, status_code=404)
+                    return ORJSONResponse(content={"message": "Post not found"}, status_code=404)
     except aiomysql.MySQLError as err:
         print(f"Database error: {err}")
         raise HTTPException(status_code=500, detail="Error interacting with the database")
@@ -6173,14 +9494,15 @@ async def get_post_group(
     try:
         async with pool.acquire() as conn:
             async with conn.cursor(aiomysql.DictCursor) as cursor:
-                await cursor.execute("SELECT * FROM grouppost WHERE postid=%s", (postid,))
+                await cursor.execute(f"SELECT {GROUPPOST_SELECT} FROM grouppost WHERE postid=%s", (postid,))
                 record = await cursor.fetchone()
+                attach_media_urls([record], 'post')
+                await attach_avatars(cursor, [record], 'userprofile')
 
                 if record:
-                    record = serialize_record_group(record)
-                    return JSONResponse(content=record, status_code=200)
+                    return ORJSONResponse(content=serialize_group_post(record), status_code=200)
                 else:
-                    return JSONResponse(content={"message": "Post not found"}, status_code=404)
+                    return ORJSONResponse(content={"message": "Post not found"}, status_code=404)
     except aiomysql.MySQLError as err:
         print(f"Database error: {err}")
         raise HTTPException(status_code=500, detail="Error interacting with the database")
@@ -6194,35 +9516,17 @@ async def get_post_group(
 
 
 
-def serialize_record_image(record):
-    """
-    Serialize a single record or a list of records.
-    """
-    if isinstance(record, dict):
-        for key in record:
-            if isinstance(record[key], datetime):
-                record[key] = record[key].isoformat()
-            elif isinstance(record[key], bytes):
-                record[key] = base64.b64encode(record[key]).decode('utf-8')
-    elif isinstance(record, list):
-        for rec in record:
-            serialize_record_image(rec)
-    return record
 
 @app.post("/get_images")
 async def get_images(postid: int = Form(...)):
     print(f"postid: {postid}")
 
-    async with pool.acquire() as conn:
-        async with conn.cursor(aiomysql.DictCursor) as cursor:
-            await cursor.execute("SELECT * FROM image WHERE postid=%s", (postid,))
-            records = await cursor.fetchall()  
+    first, records = await peek_rows(iter_query_rows("post_images", (postid,)))
 
-    if records:
-        serialized_records = serialize_record_image(records)
-        return JSONResponse(content=serialized_records, status_code=200)
+    if first is not None:
+        return stream_json(records, serialize=lambda record: attach_media_urls([record], 'image')[0])
     else:
-        return JSONResponse(content={"message": "Images not found for the post"}, status_code=404)
+        return ORJSONResponse(content={"message": "Images not found for the post"}, status_code=404)
     
     
     
@@ -6239,35 +9543,17 @@ async def get_images(postid: int = Form(...)):
     
     
     
-def serialize_record_image_group(record):
-    """
-    Serialize a single record or a list of records.
-    """
-    if isinstance(record, dict):
-        for key in record:
-            if isinstance(record[key], datetime):
-                record[key] = record[key].isoformat()
-            elif isinstance(record[key], bytes):
-                record[key] = base64.b64encode(record[key]).decode('utf-8')
-    elif isinstance(record, list):
-        for rec in record:
-            serialize_record_image(rec)
-    return record
 
 @app.post("/get_images_group")
 async def get_images_group(postid: int = Form(...)):
      
 
-    async with pool.acquire() as conn:
-        async with conn.cursor(aiomysql.DictCursor) as cursor:
-            await cursor.execute("SELECT * FROM groupimage WHERE postid=%s", (postid,))
-            records = await cursor.fetchall()  
+    first, records = await peek_rows(iter_query_rows("grouppost_images", (postid,)))
 
-    if records:
-        serialized_records = serialize_record_image_group(records)
-        return JSONResponse(content=serialized_records, status_code=200)
+    if first is not None:
+        return stream_json(records, serialize=lambda record: attach_media_urls([record], 'image')[0])
     else:
-        return JSONResponse(content={"message": "Images not found for the post"}, status_code=404)
+        return ORJSONResponse(content={"message": "Images not found for the post"}, status_code=404)
     
     
     
@@ -6281,7 +9567,6 @@ async def add_comment(
     userid: int = Form(...),
     username: str = Form(...),
     groupornormalpost: str = Form(...),
-    userprofile: str = Form(...),
     commenttext: str = Form(None),   
     selectedImage: UploadFile = File(None)   
 ):
@@ -6297,27 +9582,28 @@ async def add_comment(
         async with pool.acquire() as conn:
             async with conn.cursor(aiomysql.DictCursor) as cursor:
                 insert_query = """
-                INSERT INTO comment (postid, userid, username, text, commenteddate, userprofile, n_or_g, commentimage)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+                INSERT INTO comment (postid, userid, username, text, commenteddate, n_or_g, commentimage)
+                VALUES (%s, %s, %s, %s, %s, %s, %s)
                 """
                 
-                await cursor.execute(insert_query, (
-                    postid, 
-                    userid, 
-                    username, 
-                    commenttext if commenttext else "",  
-                    createddate, 
-                    userprofile, 
-                    groupornormalpost,
-                    image_data   
-                ))
-                await conn.commit()
+                async with transaction(conn):
+                    await cursor.execute(insert_query, (
+                        postid, 
+                        userid, 
+                        username, 
+                        commenttext if commenttext else "",  
+                        createddate, 
+                        groupornormalpost,
+                        image_data   
+                    ))
+                    await bump_counter(cursor, "post", "commentcount", "postid", postid, 1)
+                post_cache.invalidate_post('n', postid)
 
-        return JSONResponse(content={"message": "Comment added successfully"}, status_code=201)
+        return ORJSONResponse(content={"message": "Comment added successfully"}, status_code=201)
 
     except Exception as e:
         print(f"Error inserting comment: {e}")
-        return JSONResponse(content={"message": "Error adding comment"}, status_code=500)
+        return ORJSONResponse(content={"message": "Error adding comment"}, status_code=500)
 
     
     
@@ -6335,7 +9621,6 @@ async def add_comment_group(
     userid: int = Form(...),
     username: str = Form(...),
     groupornormalpost: str = Form(...),
-    userprofile: str = Form(...),
     commenttext: str = Form(None),   
     selectedImage: UploadFile = File(None)   
 ):
@@ -6351,27 +9636,28 @@ async def add_comment_group(
         async with pool.acquire() as conn:
             async with conn.cursor(aiomysql.DictCursor) as cursor:
                 insert_query = """
-                INSERT INTO groupcomment (postid, userid, username, text, commenteddate, userprofile, n_or_g, commentimage)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+                INSERT INTO groupcomment (postid, userid, username, text, commenteddate, n_or_g, commentimage)
+                VALUES (%s, %s, %s, %s, %s, %s, %s)
                 """
                 
-                await cursor.execute(insert_query, (
-                    postid, 
-                    userid, 
-                    username, 
-                    commenttext if commenttext else "",  
-                    createddate, 
-                    userprofile, 
-                    groupornormalpost,
-                    image_data   
-                ))
-                await conn.commit()
+                async with transaction(conn):
+                    await cursor.execute(insert_query, (
+                        postid, 
+                        userid, 
+                        username, 
+                        commenttext if commenttext else "",  
+                        createddate, 
+                        groupornormalpost,
+                        image_data   
+                    ))
+                    await bump_counter(cursor, "grouppost", "commentcount", "postid", postid, 1)
+                post_cache.invalidate_post('g', postid)
 
-        return JSONResponse(content={"message": "Comment added successfully"}, status_code=201)
+        return ORJSONResponse(content={"message": "Comment added successfully"}, status_code=201)
 
     except Exception as e:
         print(f"Error inserting comment: {e}")
-        return JSONResponse(content={"message": "Error adding comment"}, status_code=500)
+        return ORJSONResponse(content={"message": "Error adding comment"}, status_code=500)
 
 
     
@@ -6388,7 +9674,6 @@ async def add_replay_comment(
     userid: int = Form(...),
     username: str = Form(...),
     groupornormalpost: str = Form(...),
-    userprofile: str = File(...),
     replytext: str = Form(...)
 ):
     createddate = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
@@ -6398,30 +9683,24 @@ async def add_replay_comment(
                 
                 
                 
-                await cursor.execute("SELECT profileimage FROM user WHERE userid = %s", (userid,))
-                user_record = await cursor.fetchone()
+                user_record = await run_query(cursor, "user_name", (userid,), fetch="one")
 
                 if not user_record:
                     raise HTTPException(status_code=404, detail=f"User with userid {userid} not found")
                 
-                user_profileimage = user_record['profileimage']
-                
                 insert_query = """
-                INSERT INTO commentreply (commentid, postid, userid, username, text, replayeddate, userprofile,n_or_g)
-                VALUES (%s, %s, %s, %s, %s, %s, %s,%s)
+                INSERT INTO commentreply (commentid, postid, userid, username, text, replayeddate, n_or_g)
+                VALUES (%s, %s, %s, %s, %s, %s, %s)
                 """
-                await cursor.execute(insert_query, (commentid, postid, userid, username, replytext, createddate, user_profileimage,groupornormalpost))
-                await conn.commit()
-                
-                
-                
-        cursor.execute(insert_query, (commentid,postid, userid, username, replytext,createddate,userprofile))
-        conn.commit()
-        cursor.close()
-        return JSONResponse(content={"message": "replay Comment added successfully"}, status_code=201)
-    except mysql.connector.Error as e:
+                async with transaction(conn):
+                    await cursor.execute(insert_query, (commentid, postid, userid, username, replytext, createddate, groupornormalpost))
+                    await bump_counter(cursor, "comment", "replycount", "commentid", commentid, 1)
+                post_cache.invalidate_post('n', postid)
+
+        return ORJSONResponse(content={"message": "replay Comment added successfully"}, status_code=201)
+    except aiomysql.Error as e:
         print(f"Error inserting comment: {e}")
-        return JSONResponse(content={"message": "Error adding replay comment"}, status_code=500)
+        return ORJSONResponse(content={"message": "Error adding replay comment"}, status_code=500)
     
     
     
@@ -6444,7 +9723,6 @@ async def add_replay_comment_group(
     userid: int = Form(...),
     username: str = Form(...),
     groupornormalpost: str = Form(...),
-    userprofile: str = File(...),
     replytext: str = Form(...)
 ):
     createddate = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
@@ -6452,21 +9730,18 @@ async def add_replay_comment_group(
         async with pool.acquire() as conn:
             async with conn.cursor() as cursor:
                 insert_query = """
-                INSERT INTO groupcommentreplay (commentid, postid, userid, username, text, replayeddate, userprofile,n_or_g)
-                VALUES (%s, %s, %s, %s, %s, %s, %s,%s)
+                INSERT INTO groupcommentreplay (commentid, postid, userid, username, text, replayeddate, n_or_g)
+                VALUES (%s, %s, %s, %s, %s, %s, %s)
                 """
-                await cursor.execute(insert_query, (commentid, postid, userid, username, replytext, createddate, userprofile,groupornormalpost))
-                await conn.commit()
-                
-                
-                
-        cursor.execute(insert_query, (commentid,postid, userid, username, replytext,createddate,userprofile))
-        conn.commit()
-        cursor.close()
-        return JSONResponse(content={"message": "replay Comment added successfully"}, status_code=201)
-    except mysql.connector.Error as e:
+                async with transaction(conn):
+                    await cursor.execute(insert_query, (commentid, postid, userid, username, replytext, createddate, groupornormalpost))
+                    await bump_counter(cursor, "groupcomment", "replycount", "commentid", commentid, 1)
+                post_cache.invalidate_post('g', postid)
+
+        return ORJSONResponse(content={"message": "replay Comment added successfully"}, status_code=201)
+    except aiomysql.Error as e:
         print(f"Error inserting comment: {e}")
-        return JSONResponse(content={"message": "Error adding replay comment"}, status_code=500)
+        return ORJSONResponse(content={"message": "Error adding replay comment"}, status_code=500)
     
     
   
@@ -6479,14 +9754,6 @@ async def add_replay_comment_group(
  
  
 
-def serialize_record_comments(records):
-    for record in records:
-        for key in record:
-            if isinstance(record[key], datetime):
-                record[key] = record[key].isoformat()  # Convert datetime to ISO string
-            elif isinstance(record[key], bytes):
-                record[key] = base64.b64encode(record[key]).decode('utf-8')  # Base64 encode binary data
-    return records
 
 
 
@@ -6499,15 +9766,17 @@ def serialize_record_comments(records):
 async def get_comments(
     postid: str = Query(...),
     commentslimit: int = Query(10, ge=1),
-    last_comment_id: int = Query(None)   
+    last_comment_id: int = Query(None),
+    avatars: str = Query('url'),
 ):
+    resolver = AvatarResolver(avatars)
     try:
         async with pool.acquire() as conn:
             async with conn.cursor(aiomysql.DictCursor) as cursor:
                 if last_comment_id:
                     await cursor.execute(
                         """
-                        SELECT c.commentid, c.postid,c.commentimage,c.n_or_g, c.userid, u.username, c.text, c.commenteddate, u.profileimage
+                        SELECT c.commentid, c.postid,c.commentimage,c.n_or_g, c.userid, u.username, c.text, c.commenteddate, c.replycount
                         FROM comment c
                         INNER JOIN user u ON c.userid = u.userid
                         WHERE c.postid = %s AND c.commentid < %s
@@ -6519,7 +9788,7 @@ async def get_comments(
                 else:
                     await cursor.execute(
                         """
-                        SELECT c.commentid, c.postid,c.commentimage,c.n_or_g, c.userid, u.username, c.text, c.commenteddate, u.profileimage
+                        SELECT c.commentid, c.postid,c.commentimage,c.n_or_g, c.userid, u.username, c.text, c.commenteddate, c.replycount
                         FROM comment c
                         INNER JOIN user u ON c.userid = u.userid
                         WHERE c.postid = %s
@@ -6529,13 +9798,15 @@ async def get_comments(
                         (postid, commentslimit)
                     )
 
-                records = await cursor.fetchall()
+                records = resolver.add(await cursor.fetchall(), 'userid', 'profileimage')
+                avatar_table = await resolver.resolve(cursor)
 
                 if not records:
-                    return JSONResponse(content={"comments": []}, status_code=200)
+                    return ORJSONResponse(content={"comments": []}, status_code=200)
 
-                serialized_records = serialize_record_comments(records)
-                return JSONResponse(content={"comments": serialized_records}, status_code=200)
+                if avatar_table is not None:
+                    return ORJSONResponse(content={"comments": records, "avatars": avatar_table}, status_code=200)
+                return ORJSONResponse(content={"comments": records}, status_code=200)
 
     except aiomysql.MySQLError as err:
         print(f"MySQL Error: {err}")
@@ -6561,15 +9832,17 @@ async def get_comments(
 async def get_comments_group(
     postid: str = Query(...),
     commentslimit: int = Query(10, ge=1),
-    last_comment_id: int = Query(None)   
+    last_comment_id: int = Query(None),
+    avatars: str = Query('url'),
 ):
+    resolver = AvatarResolver(avatars)
     try:
         async with pool.acquire() as conn:
             async with conn.cursor(aiomysql.DictCursor) as cursor:
                 if last_comment_id:
                     await cursor.execute(
                         """
-                        SELECT c.commentid, c.postid,c.commentimage,c.n_or_g, c.userid, u.username, c.text, c.commenteddate, u.profileimage
+                        SELECT c.commentid, c.postid,c.commentimage,c.n_or_g, c.userid, u.username, c.text, c.commenteddate, c.replycount
                         FROM groupcomment c
                         INNER JOIN user u ON c.userid = u.userid
                         WHERE c.postid = %s AND c.commentid < %s
@@ -6581,7 +9854,7 @@ async def get_comments_group(
                 else:
                     await cursor.execute(
                         """
-                        SELECT c.commentid, c.postid,c.commentimage,c.n_or_g, c.userid, u.username, c.text, c.commenteddate, u.profileimage
+                        SELECT c.commentid, c.postid,c.commentimage,c.n_or_g, c.userid, u.username, c.text, c.commenteddate, c.replycount
                         FROM groupcomment c
                         INNER JOIN user u ON c.userid = u.userid
                         WHERE c.postid = %s
@@ -6591,13 +9864,15 @@ async def get_comments_group(
                         (postid, commentslimit)
                     )
 
-                records = await cursor.fetchall()
+                records = resolver.add(await cursor.fetchall(), 'userid', 'profileimage')
+                avatar_table = await resolver.resolve(cursor)
 
                 if not records:
-                    return JSONResponse(content={"comments": []}, status_code=200)
+                    return ORJSONResponse(content={"comments": []}, status_code=200)
 
-                serialized_records = serialize_record_comments(records)
-                return JSONResponse(content={"comments": serialized_records}, status_code=200)
+                if avatar_table is not None:
+                    return ORJSONResponse(content={"comments": records, "avatars": avatar_table}, status_code=200)
+                return ORJSONResponse(content={"comments": records}, status_code=200)
 
     except aiomysql.MySQLError as err:
         print(f"MySQL Error: {err}")
@@ -6626,7 +9901,7 @@ async def get_link_preview(url: str = Query(..., description="URL to fetch link
         response = requests.get(url)
         
         if response.status_code != 200:
-            return JSONResponse(content={"error": "Unable to fetch URL"}, status_code=400)
+            return ORJSONResponse(content={"error": "Unable to fetch URL"}, status_code=400)
 
         # Parse the page content with BeautifulSoup
         soup = BeautifulSoup(response.text, 'html.parser')
@@ -6644,7 +9919,7 @@ async def get_link_preview(url: str = Query(..., description="URL to fetch link
             "url": url
         }
 
-        return JSONResponse(content=preview_data, status_code=200)
+        return ORJSONResponse(content=preview_data, status_code=200)
 
     except Exception as e:
         print(f"Error fetching link preview: {e}")
@@ -6686,11 +9961,12 @@ async def update_comments(
                     (edittextcomment, commentid, postid)
                 )
                 await conn.commit()
+                post_cache.invalidate_post('n', postid)
 
                 if cursor.rowcount > 0:
-                    return JSONResponse(content={"success": True, "message": "Comment updated successfully."}, status_code=200)
+                    return ORJSONResponse(content={"success": True, "message": "Comment updated successfully."}, status_code=200)
                 else:
-                    return JSONResponse(content={"success": False, "message": "No comment found to update."}, status_code=404)
+                    return ORJSONResponse(content={"success": False, "message": "No comment found to update."}, status_code=404)
 
     except aiomysql.MySQLDataError as err:
         print(f"MySQL Error: {err}")
@@ -6724,11 +10000,12 @@ async def update_comments_group(
                     (edittextcomment, commentid, postid)
                 )
                 await conn.commit()
+                post_cache.invalidate_post('g', postid)
 
                 if cursor.rowcount > 0:
-                    return JSONResponse(content={"success": True, "message": "Comment updated successfully."}, status_code=200)
+                    return ORJSONResponse(content={"success": True, "message": "Comment updated successfully."}, status_code=200)
                 else:
-                    return JSONResponse(content={"success": False, "message": "No comment found to update."}, status_code=404)
+                    return ORJSONResponse(content={"success": False, "message": "No comment found to update."}, status_code=404)
 
     except aiomysql.MySQLDataError as err:
         print(f"MySQL Error: {err}")
@@ -6759,29 +10036,6 @@ async def update_comments_group(
 
 
 
-def serialize_record_replaycomments(record):
-    """
-    Serialize a single record (dictionary) or a list of records.
-    Returns None if the record is None or empty.
-    """
-    if not record:
-        return None
-    
-    if isinstance(record, dict):
-        serialized_record = {}
-        for key in record:
-            if isinstance(record[key], datetime):
-                serialized_record[key] = record[key].isoformat()
-            elif isinstance(record[key], bytes):
-                serialized_record[key] = base64.b64encode(record[key]).decode('utf-8')
-            else:
-                serialized_record[key] = record[key]
-        return serialized_record
-    
-    elif isinstance(record, list):
-        return [serialize_record(rec) for rec in record if rec]
-
-    return None
 
 @app.get("/get_replay_comments")
 async def get_replay_comments(
@@ -6794,16 +10048,22 @@ async def get_replay_comments(
         async with pool.acquire() as conn:
             async with conn.cursor(aiomysql.DictCursor) as cursor:
                 await cursor.execute(
-                    "SELECT * FROM commentreply WHERE commentid = %s ORDER BY replayeddate DESC", 
+                    """
+                    SELECT r.commentreplayid, r.commentid, r.postid, r.userid, r.username, r.text, r.replayeddate,
+                        u.profileimage AS userprofile, u.avatarkey, r.n_or_g
+                    FROM commentreply r
+                    LEFT JOIN user u ON u.userid = r.userid
+                    WHERE r.commentid = %s ORDER BY r.replayeddate DESC
+                    """,
                     (commentid,)
                 )
                 records = await cursor.fetchall()
+                attach_avatar_urls(records, 'userprofile')
 
                 if not records:
-                    return JSONResponse(content={"message": "No replay comments found"}, status_code=404)
+                    return ORJSONResponse(content={"message": "No replay comments found"}, status_code=404)
 
-                serialized_records = serialize_record_replaycomments(records)
-                return JSONResponse(content={"replaycomments": serialized_records}, status_code=200)
+                return ORJSONResponse(content={"replaycomments": records}, status_code=200)
     
     except aiomysql.MySQLDataError as err:
         print(f"MySQL Error: {err}")
@@ -6826,29 +10086,6 @@ async def get_replay_comments(
     
     
     
-def serialize_record_replaycomments_group(record):
-    """
-    Serialize a single record (dictionary) or a list of records.
-    Returns None if the record is None or empty.
-    """
-    if not record:
-        return None
-    
-    if isinstance(record, dict):
-        serialized_record = {}
-        for key in record:
-            if isinstance(record[key], datetime):
-                serialized_record[key] = record[key].isoformat()
-            elif isinstance(record[key], bytes):
-                serialized_record[key] = base64.b64encode(record[key]).decode('utf-8')
-            else:
-                serialized_record[key] = record[key]
-        return serialized_record
-    
-    elif isinstance(record, list):
-        return [serialize_record(rec) for rec in record if rec]
-
-    return None
 
 @app.get("/get_replay_comments_group")
 async def get_replay_comments_group(
@@ -6861,16 +10098,22 @@ async def get_replay_comments_group(
         async with pool.acquire() as conn:
             async with conn.cursor(aiomysql.DictCursor) as cursor:
                 await cursor.execute(
-                    "SELECT  * from groupcommentreplay where commentid =%s ORDER BY replayeddate DESC", 
+                    """
+                    SELECT r.commentreplayid, r.commentid, r.postid, r.userid, r.username, r.text, r.replayeddate,
+                        u.profileimage AS userprofile, u.avatarkey, r.n_or_g
+                    FROM groupcommentreplay r
+                    LEFT JOIN user u ON u.userid = r.userid
+                    WHERE r.commentid = %s ORDER BY r.replayeddate DESC
+                    """,
                     (commentid,)
                 )
                 records = await cursor.fetchall()
+                attach_avatar_urls(records, 'userprofile')
 
                 if not records:
-                    return JSONResponse(content={"message": "No replay comments found"}, status_code=404)
+                    return ORJSONResponse(content={"message": "No replay comments found"}, status_code=404)
 
-                serialized_records = serialize_record_replaycomments_group(records)
-                return JSONResponse(content={"replaycomments": serialized_records}, status_code=200)
+                return ORJSONResponse(content={"replaycomments": records}, status_code=200)
     
     except aiomysql.MySQLDataError as err:
         print(f"MySQL Error: {err}")
@@ -6909,27 +10152,20 @@ async def get_replay_comments_group(
     
     
     
-def serialize_record_user(record):
-    for key in record:
-        if isinstance(record[key], datetime):
-            record[key] = record[key].isoformat()
-        elif isinstance(record[key], bytes):
-            record[key] = base64.b64encode(record[key]).decode('utf-8')
-    return record
 
 
 @app.post("/get_user_details")
 async def get_user_details(userid: int = Form(...)):
     async with pool.acquire() as conn:
         async with conn.cursor(aiomysql.DictCursor) as cursor:
-            await cursor.execute("SELECT * FROM user WHERE userid=%s", (userid,))
+            await cursor.execute(f"SELECT {USER_SELECT} FROM user WHERE userid=%s", (userid,))
             record = await cursor.fetchone()
 
             if record:
-                record = serialize_record_user(record)
-                return JSONResponse(content=record, status_code=200)
+                attach_avatar_urls([record], 'profileimage')
+                return ORJSONResponse(content=record, status_code=200)
             else:
-                return JSONResponse(content={"message": "User not found"}, status_code=404)
+                return ORJSONResponse(content={"message": "User not found"}, status_code=404)
     
 
     
@@ -6942,13 +10178,6 @@ async def get_user_details(userid: int = Form(...)):
 
 
 
-async def serialize_record_user_followlist(record):
-    for key in record:
-        if isinstance(record[key], datetime):
-            record[key] = record[key].isoformat()
-        elif isinstance(record[key], bytes):
-            record[key] = base64.b64encode(record[key]).decode('utf-8')
-    return record
 
 @app.post("/get_userlist_to_follow")
 async def get_userlist_to_follow(
@@ -6964,18 +10193,18 @@ async def get_userlist_to_follow(
 
                 if followed_user_ids:
                     placeholders = ', '.join(['%s'] * len(followed_user_ids))
-                    query = f"SELECT * FROM user WHERE userid NOT IN ({placeholders}) AND userid != %s LIMIT 20"
+                    query = f"SELECT {USER_SELECT} FROM user WHERE userid NOT IN ({placeholders}) AND userid != %s LIMIT 20"
                     await cursor.execute(query, (*followed_user_ids, currentUserId))
                 else:
-                    await cursor.execute("SELECT * FROM user WHERE userid != %s LIMIT 20", (currentUserId,))
+                    await cursor.execute(f"SELECT {USER_SELECT} FROM user WHERE userid != %s LIMIT 20", (currentUserId,))
                 
                 user_details = await cursor.fetchall()
 
                 if user_details:
-                    serialized_user_details = [await serialize_record_user_followlist(user) for user in user_details]
-                    return JSONResponse(content={"users": serialized_user_details}, status_code=200)
+                    attach_avatar_urls(user_details, 'profileimage')
+                    return ORJSONResponse(content={"users": user_details}, status_code=200)
                 else:
-                    return JSONResponse(content={"message": "No users found"}, status_code=404)
+                    return ORJSONResponse(content={"message": "No users found"}, status_code=404)
 
     except aiomysql.MySQLError as e:
         print(f"Database error occurred: {e}")
@@ -6998,13 +10227,6 @@ async def get_userlist_to_follow(
     
     
     
-def serialize_record_group(record):
-    for key in record:
-        if isinstance(record[key], datetime):
-            record[key] = record[key].isoformat()
-        elif isinstance(record[key], bytes):
-            record[key] = base64.b64encode(record[key]).decode('utf-8')
-    return record
 
 @app.post("/get_group_details")
 async def get_group_details(groupid: str = Form(...)):
@@ -7013,16 +10235,15 @@ async def get_group_details(groupid: str = Form(...)):
             cursor = await conn.cursor(aiomysql.DictCursor)
 
        
-            await cursor.execute("SELECT * FROM groups WHERE groupid = %s", (groupid,))
+            await cursor.execute(f"SELECT {GROUP_SELECT} FROM groups WHERE groupid = %s", (groupid,))
             group_record = await cursor.fetchone()
 
             if not group_record:
-                return JSONResponse(content={"message": "Group not found"}, status_code=404)
+                return ORJSONResponse(content={"message": "Group not found"}, status_code=404)
 
-            serialized_group = serialize_record_group(group_record)
- 
-            await cursor.execute("SELECT * FROM group_users WHERE groupid = %s ", (groupid))
+            await cursor.execute(f"SELECT {GROUP_USER_SELECT} FROM group_users WHERE groupid = %s ", (groupid))
             users_records = await cursor.fetchall()
+            await attach_avatars(cursor, users_records, 'profileimage')
  
             admin_users = [user for user in users_records if user['usertype'] == 'admin']
             non_admin_users = [user for user in users_records if user['usertype'] != 'admin']
@@ -7031,15 +10252,12 @@ async def get_group_details(groupid: str = Form(...)):
             non_admin_users.sort(key=lambda user: user['joined_date'])
 
  
-            serialized_admin_users = [serialize_record_group(user) for user in admin_users]
-            serialized_non_admin_users = [serialize_record_group(user) for user in non_admin_users]
-
             await cursor.close()
 
         
-            serialized_group['users'] = serialized_admin_users + serialized_non_admin_users
+            group_record['users'] = admin_users + non_admin_users
 
-            return JSONResponse(content=serialized_group, status_code=200)
+            return ORJSONResponse(content=group_record, status_code=200)
 
     except aiomysql.Error as e:
         print(f"Database error: {e}")
@@ -7070,13 +10288,13 @@ async def joined_or_not(
         async with pool.acquire() as conn:
             cursor = await conn.cursor(aiomysql.DictCursor)
 
-            await cursor.execute("SELECT * FROM group_users WHERE groupid = %s AND userid = %s", (groupid, userid))
+            await cursor.execute("SELECT groupuser_id FROM group_users WHERE groupid = %s AND userid = %s", (groupid, userid))
             group_record = await cursor.fetchone()
 
             if not group_record:
-                return JSONResponse(content={"message": "no"})
+                return ORJSONResponse(content={"message": "no"})
 
-            return JSONResponse(content={"message": "yes"})
+            return ORJSONResponse(content={"message": "yes"})
 
     except aiomysql.Error as e:
         print(f"Database error: {e}")
@@ -7112,51 +10330,31 @@ async def joined_or_not(
     
     
     
-def serialize_search_result_user(record):
-    """
-    Serialize the user search result to handle datetime and bytes data types.
-    """
-    for key in record:
-        if isinstance(record[key], datetime):
-            record[key] = record[key].isoformat()
-        elif isinstance(record[key], bytes) and key == 'profileimage':
-            record[key] = base64.b64encode(record[key]).decode('utf-8')
-    return record
 
-def serialize_search_result_group(record):
-    """
-    Serialize the group search result to handle datetime and bytes data types.
-    """
-    for key in record:
-        if isinstance(record[key], datetime):
-            record[key] = record[key].isoformat()
-        elif isinstance(record[key], bytes) and (key == 'groupimage' or key == 'groupbackgroundimage'):
-            record[key] = base64.b64encode(record[key]).decode('utf-8')
-    return record
   
     
 @app.post("/search-result")
-async def search_result(query: str = Form(...)):
+async def search_result(query: str = Form(...), avatars: str = Form('url')):
     """
     Search for users and groups where the username or groupname matches the query and return the results.
     """
+    resolver = AvatarResolver(avatars)
     try:
-        async with pool.acquire() as conn:
+        async with read_pool().acquire() as conn:
             async with conn.cursor(aiomysql.DictCursor) as cursor:
-                await cursor.execute("SELECT * FROM user WHERE username LIKE %s", (f"%{query}%",))
-                user_records = await cursor.fetchall()
-                serialized_user_records = [serialize_search_result_user(record) for record in user_records]
+                user_records = resolver.add(await run_query(cursor, "search_users", (f"%{query}%",)))
+                avatar_table = await resolver.resolve(cursor)
 
-                await cursor.execute("SELECT * FROM groups WHERE groupname LIKE %s", (f"%{query}%",))
-                group_records = await cursor.fetchall()
-                serialized_group_records = [serialize_search_result_group(record) for record in group_records]
+                group_records = await run_query(cursor, "search_groups", (f"%{query}%",))
 
                 combined_results = {
-                    "users": serialized_user_records,
-                    "groups": serialized_group_records
+                    "users": user_records,
+                    "groups": group_records
                 }
+                if avatar_table is not None:
+                    combined_results["avatars"] = avatar_table
 
-        return JSONResponse(content=combined_results, status_code=200)
+        return ORJSONResponse(content=combined_results, status_code=200)
 
     except aiomysql.MySQLError as e:
         print(f"Database error occurred: {e}")
@@ -7192,43 +10390,37 @@ async def search_result(query: str = Form(...)):
  
 
 
-
-def serialize_search_enter_result_video(record):
-    """
-    Serialize the user search result to handle datetime and bytes data types.
-    """
-    for key in record:
-        if isinstance(record[key], datetime):
-            record[key] = record[key].isoformat()
-        elif isinstance(record[key], bytes):
-            if key in ['userprofile', 'post']:   
-                record[key] = base64.b64encode(record[key]).decode('utf-8')
-    return record
 
 @app.post("/search-enter-press-result")
 async def search_enter_press_result(
     searchtext: str = Form(...),
     limit: int = Form(10),   
-    offset: int = Form(0) 
-    
+    offset: int = Form(0),
+    cursor_token: Optional[str] = Form(None, alias="cursor")
     
 ):
     """
     Search for users whose username matches the query and return the results.
     """
     try:
-        async with pool.acquire() as conn:
+        async with read_pool().acquire() as conn:
             async with conn.cursor(aiomysql.DictCursor) as cursor:
-                await cursor.execute(
-                    "SELECT * FROM post WHERE postdescription LIKE %s AND posttype ='video' ORDER BY posteddate DESC LIMIT %s OFFSET %s", 
-                    (f"%{searchtext}%", limit, offset)
+                after, after_args = keyset_filter(["posteddate", "postid"], cursor_token)
+                records = await run_query(
+                    cursor, "search_video_posts_page",
+                    (f"%{searchtext}%", *after_args, limit, 0 if cursor_token else offset), after=after
                 )
-                records = await cursor.fetchall()
+                next_cursor = next_keyset_cursor(records, ["posteddate", "postid"], limit)
+                legacy_avatars = await load_legacy_avatars(cursor, "post", [record['postid'] for record in records])
                 
-                serialized_records = [serialize_search_enter_result_video(record) for record in records]
-                
-        return JSONResponse(content=serialized_records, status_code=200)
-
+        headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+        return stream_json(
+            iter_rows_in_order("preview_posts", [record['postid'] for record in records]),
+            serialize=lambda record: serialize_post_with_media(record, legacy_avatars), headers=headers,
+        )
+
+    except HTTPException:
+        raise
     except aiomysql.MySQLError as e:
         print(f"Database error occurred: {e}")
         raise HTTPException(status_code=500, detail="Database error occurred")
@@ -7285,43 +10477,53 @@ async def search_enter_press_result(
     
     
  
-def serialize_post_record_viode_slider(record):
-    """
-    Serialize the post record to handle datetime and bytes data types.
-    """
-    for key in record:
-        if isinstance(record[key], datetime):
-            record[key] = record[key].isoformat()
-        elif isinstance(record[key], bytes):
-            if key in [  'post' ,'userprofile']:   
-                record[key] = base64.b64encode(record[key]).decode('utf-8')
-    return record
-
-
-
 @app.get("/get_all_video_posts_slider")
-async def get_all_video_posts_slider(limit: int = 5, offset: int = 0):
+async def get_all_video_posts_slider(
+    request: Request,
+    limit: int = 5,
+    offset: int = 0,
+    maxbandwidth: Optional[int] = None,
+    cursor_token: Optional[str] = Query(None, alias="cursor")
+):
     """
-    Get video posts from the database in batches of `limit`, starting at `offset`.
+    Get shuffled video posts in batches of `limit`; continue with the X-Next-Cursor
+    header of the previous batch (`offset` is deprecated and ignored).
+    Each video carries its HLS master playlist plus the rendition picked for the
+    client's bandwidth (see client_bandwidth).
     """
     try:
         async with pool.acquire() as conn:
             async with conn.cursor(aiomysql.DictCursor) as cursor:
-                await cursor.execute(
-                    """
-                    SELECT *
-                    FROM post
-                    WHERE posttype = 'video'
-                    ORDER   BY RAND()
-                    LIMIT %s OFFSET %s
-                    """, (limit, offset)
-                )
-                records = await cursor.fetchall()
+                async def load_candidates(snapshot):
+                    return [row['postid'] for row in await run_query(cursor, "video_candidates", (snapshot,))]
+
+                postids, next_cursor = await feed_index.page("videos", load_candidates, limit, cursor_token)
+                records = await fetch_rows_in_order(cursor, "preview_posts", postids)
+                attach_media_urls(records, 'post')
+                attach_video_previews(records)
+                await attach_avatars(cursor, records, 'userprofile')
+
+                renditions = await load_video_renditions(cursor, [record['mediakey'] for record in records])
+                bandwidth = client_bandwidth(request, maxbandwidth)
+                for record in records:
+                    video_renditions = renditions.get(record['mediakey'])
+                    chosen = pick_rendition(video_renditions, bandwidth)
+                    record['hlsurl'] = hls_master_url(record['mediakey']) if video_renditions else None
+                    record['rendition'] = {
+                        'name': chosen['rendition'],
+                        'height': chosen['height'],
+                        'bandwidth': chosen['bandwidth'],
+                        'size': chosen['mediasize'],
+                        'url': media_url(chosen['playlistkey']),
+                    } if chosen else None
                 
-                serialized_records = [serialize_post_record_viode_slider(record) for record in records]
+                serialized_records = [serialize_video_slide(record) for record in records]
                 
-        return JSONResponse(content=serialized_records, status_code=200)
+        headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+        return ORJSONResponse(content=serialized_records, status_code=200, headers=headers)
 
+    except HTTPException:
+        raise
     except aiomysql.MySQLError as e:
         print(f"Database error occurred: {e}")
         raise HTTPException(status_code=500, detail="Database error occurred")
@@ -7350,74 +10552,31 @@ async def get_all_video_posts_slider(limit: int = 5, offset: int = 0):
 async def search_enter_press_result_image_link_text(
     searchtext: str = Form(...),
     limit: int = Form(10),
-    offset: int = Form(0)
+    offset: int = Form(0),
+    cardwidth: int = Form(IMAGE_CARD_WIDTH),
+    cursor_token: Optional[str] = Form(None, alias="cursor")
 ):
+    """
+    Relevance-ordered search, paged by (relevance_desc, relevance_text, postid) through
+    the X-Next-Cursor header; `offset` is a deprecated fallback.
+    """
     global pool
     searchtext = f"%{searchtext}%"  # Prepare for SQL LIKE query
 
-    async with pool.acquire() as conn:
+    async with read_pool().acquire() as conn:
         async with conn.cursor(aiomysql.DictCursor) as cursor:
             try:
-                # SQL query to search posts and calculate relevance based on the number of occurrences of searchtext
-                query = """
-                    SELECT *,
-                    (LENGTH(postdescription) - LENGTH(REPLACE(postdescription, %s, ''))) / LENGTH(%s) AS relevance_desc,
-                    (LENGTH(textbody) - LENGTH(REPLACE(textbody, %s, ''))) / LENGTH(%s) AS relevance_text
-                    FROM post 
-                    WHERE (posttype = 'text' OR posttype = 'link' OR posttype = 'image') 
-                    AND (postdescription LIKE %s OR textbody LIKE %s)
-                    ORDER BY relevance_desc DESC, relevance_text DESC
-                    LIMIT %s OFFSET %s
-                """
-                await cursor.execute(query, (searchtext, searchtext, searchtext, searchtext, searchtext, searchtext, limit, offset))
-                records = await cursor.fetchall()
+                keyset_columns = ["relevance_desc", "relevance_text", "postid"]
+                after, after_args = keyset_filter(keyset_columns, cursor_token)
 
-                processed_records = []
+                records = await run_query(cursor, "search_posts_by_relevance", (
+                    searchtext, searchtext, searchtext, searchtext, searchtext, searchtext,
+                    *after_args, limit, 0 if cursor_token else offset
+                ), after=after)
+                next_cursor = next_keyset_cursor(records, keyset_columns, limit)
 
-                for record in records:
-                    if record['posttype'] == 'image':
-                        # Process image post with additional info
-                        await cursor.execute("""
-                            SELECT p.userid, p.username, p.postdescription, p.posteddate, p.userprofile, p.posttype, p.postid, p.n_or_g,
-                                   p.groupname, p.groupid, p.grouptype, i.image
-                            FROM post p
-                            LEFT JOIN image i ON p.postid = i.postid
-                            WHERE p.posttype = 'image' AND p.postid = %s 
-                        """, (record['postid'],))
-                        image_records = await cursor.fetchall()
-
-                        for image_record in image_records:
-                            if image_record['image']:
-                                image_record['image'] = base64.b64encode(image_record['image']).decode('utf-8')
-                            if image_record['userprofile']:
-                                image_record['userprofile'] = base64.b64encode(image_record['userprofile']).decode('utf-8')
-
-                            processed_records.append(image_record)
-
-                    elif record['posttype'] in ['text', 'link']:
-                        # Process text or link posts
-                        post_record = {
-                            'postid': record['postid'],
-                            'userid': record['userid'],
-                            'username': record['username'],
-                            'postdescription': record['postdescription'],
-                            'posteddate': record['posteddate'],
-                            'posttype': record['posttype'],
-                            'post': base64.b64encode(record['post']).decode('utf-8') if record['post'] else None,
-                            'userprofile': base64.b64encode(record['userprofile']).decode('utf-8') if record['userprofile'] else None,
-                            'filepath': record['filepath'] if 'filepath' in record else None,
-                            'textcolor': record['textcolor'] if 'textcolor' in record else None,
-                            'textbody': record['textbody'] if 'textbody' in record else None,
-                            'thelink': record['thelink'] if 'thelink' in record else None,
-                            'groupid': record['groupid'] if 'groupid' in record else None,
-                            'grouptype': record['grouptype'] if 'grouptype' in record else None,
-                            'n_or_g': record['n_or_g'] if 'n_or_g' in record else None,
-                            'groupname': record['groupname'] if 'groupname' in record else None,
-                        }
-
-                        processed_records.append(post_record)
-
-                return processed_records
+                headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+                return stream_json(iter_hydrated_posts([('n', record['postid']) for record in records], cardwidth), headers=headers)
 
             except aiomysql.Error as err:
                 print(f"Error: {err}")
@@ -7508,16 +10667,6 @@ async def check_groupname_exsist_or_not_group(
 
 
 
-def serialize_search_enter_result_group(record: dict) -> dict:
-    """
-    Serialize the user search result to handle datetime and bytes data types.
-    """
-    for key in record:
-        if isinstance(record[key], datetime):
-            record[key] = record[key].isoformat()
-        elif isinstance(record[key], bytes) and key in ['groupimage', 'groupbackgroundimage']:
-            record[key] = base64.b64encode(record[key]).decode('utf-8')
-    return record
 
 @app.post("/search-enter-press-get-groups")
 async def search_enter_press_get_groups(
@@ -7532,20 +10681,7 @@ async def search_enter_press_get_groups(
     Search for users where the username matches the query and return the results.
     """
     try:
-        async with pool.acquire() as conn:
-            async with conn.cursor(aiomysql.DictCursor) as cursor:
-                query = """
-                SELECT * FROM groups 
-                WHERE groupname LIKE %s
-                ORDER BY createdate DESC
-                 LIMIT %s OFFSET %s
-                """
-                await cursor.execute(query, (f"%{searchtext}%", limit, offset))
-                records = await cursor.fetchall()
-                
-                serialized_records = [serialize_search_enter_result_group(record) for record in records]
-                
-        return JSONResponse(content=serialized_records, status_code=200)
+        return stream_json(iter_query_rows("search_groups_page", (f"%{searchtext}%", limit, offset)))
 
     except aiomysql.MySQLError as e:
         print(f"Database error occurred: {e}")
@@ -7563,45 +10699,36 @@ async def search_enter_press_get_groups(
 
 
 
-def serialize_search_enter_result_user_textlink(record):
-    """
-    Serialize the user search result to handle datetime and bytes data types.
-    """
-    for key in record:
-        if isinstance(record[key], datetime):
-            record[key] = record[key].isoformat()
-        elif isinstance(record[key], bytes):
-            if key in ['userprofile', 'post']: 
-                record[key] = base64.b64encode(record[key]).decode('utf-8')
-    return record
-
 @app.post("/search-enter-press-result-link-text")
 async def search_enter_press_result_link_text(
     searchtext: str = Form(...),
     limit: int = Form(10),   
-    offset: int = Form(0) 
-    
+    offset: int = Form(0),
+    cursor_token: Optional[str] = Form(None, alias="cursor")
     ):
     """
     Search for posts where the description or body matches the query and return the results.
     """
     try:
-        async with pool.acquire() as conn:
+        async with read_pool().acquire() as conn:
             async with conn.cursor(aiomysql.DictCursor) as cursor:
               
-                query = """
-                SELECT * FROM post 
-                WHERE (posttype = 'text' OR posttype = 'link') 
-                AND (postdescription LIKE %s OR textbody LIKE %s)  ORDER BY posteddate DESC
-                LIMIT %s OFFSET %s
-                """
-                await cursor.execute(query, (f"%{searchtext}%", f"%{searchtext}%", limit, offset))
-                records = await cursor.fetchall()
-                
-                serialized_records = [serialize_search_enter_result_user_textlink(record) for record in records]
+                after, after_args = keyset_filter(["posteddate", "postid"], cursor_token)
+                records = await run_query(
+                    cursor, "search_text_posts_page",
+                    (f"%{searchtext}%", f"%{searchtext}%", *after_args, limit, 0 if cursor_token else offset), after=after
+                )
+                next_cursor = next_keyset_cursor(records, ["posteddate", "postid"], limit)
+                legacy_avatars = await load_legacy_avatars(cursor, "post", [record['postid'] for record in records])
                 
-        return JSONResponse(content=serialized_records, status_code=200)
-
+        headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+        return stream_json(
+            iter_rows_in_order("posts_by_id", [record['postid'] for record in records]),
+            serialize=lambda record: serialize_post_with_media(record, legacy_avatars), headers=headers,
+        )
+
+    except HTTPException:
+        raise
     except aiomysql.MySQLError as e:
         print(f"Database error occurred: {e}")
         raise HTTPException(status_code=500, detail="Database error occurred")
@@ -7627,16 +10754,6 @@ async def search_enter_press_result_link_text(
     
     
     
-def serialize_search_enter_result_user(record: dict) -> dict:
-    """
-    Serialize the user search result to handle datetime and bytes data types.
-    """
-    for key in record:
-        if isinstance(record[key], datetime):
-            record[key] = record[key].isoformat()
-        elif isinstance(record[key], bytes) and key == 'profileimage':
-            record[key] = base64.b64encode(record[key]).decode('utf-8')
-    return record
 
 @app.post("/search-enter-press-get-users")
 async def search_enter_press_get_users(
@@ -7650,20 +10767,10 @@ async def search_enter_press_get_users(
     Search for users where the username matches the query and return the results.
     """
     try:
-        async with pool.acquire() as conn:
-            async with conn.cursor(aiomysql.DictCursor) as cursor:
-                query = """
-                SELECT * FROM user 
-                WHERE username LIKE %s
-                ORDER BY createddate DESC
-                LIMIT %s OFFSET %s
-                """
-                await cursor.execute(query, (f"%{searchtext}%", limit, offset))
-                records = await cursor.fetchall()
-                
-                serialized_records = [serialize_search_enter_result_user(record) for record in records]
-                
-        return JSONResponse(content=serialized_records, status_code=200)
+        return stream_json(
+            iter_query_rows("search_users_page", (f"%{searchtext}%", limit, offset)),
+            serialize=lambda record: attach_avatar_urls([record], 'profileimage')[0],
+        )
 
     except aiomysql.MySQLError as e:
         print(f"Database error occurred: {e}")
@@ -7717,10 +10824,18 @@ async def delete_comment(
         global pool
         async with pool.acquire() as conn:
             async with conn.cursor() as cursor:
-                await cursor.execute("DELETE FROM comment WHERE commentid=%s", (commentid,))
-                await conn.commit()
-
-        return JSONResponse(content={"message": "Deleted"}, status_code=200)
+                async with transaction(conn):
+                    await cursor.execute("SELECT postid FROM comment WHERE commentid=%s FOR UPDATE", (commentid,))
+                    comment = await cursor.fetchone()
+                    if comment:
+                        await cursor.execute("DELETE FROM comment WHERE commentid=%s", (commentid,))
+                        await bump_counter(cursor, "post", "commentcount", "postid", comment[0], -1)
+
+                if comment:
+                    post_cache.invalidate_post('n', comment[0])
+                    note_write()
+
+        return ORJSONResponse(content={"message": "Deleted"}, status_code=200)
     except Exception as e:
  
         raise HTTPException(status_code=500, detail="Internal Server Error")
@@ -7751,23 +10866,23 @@ async def update_user_details(
         async with pool.acquire() as conn:
             async with conn.cursor(aiomysql.DictCursor) as cursor:
                 
-                await cursor.execute("SELECT * FROM user WHERE userid=%s", (iamfollowinguserid,))
+                await cursor.execute("SELECT userid, username FROM user WHERE userid=%s", (iamfollowinguserid,))
                 iamfollowing_user = await cursor.fetchone()
                 
                 if not iamfollowing_user:
                     raise HTTPException(status_code=404, detail=f"User with userid {iamfollowinguserid} not found")
                 
-                await cursor.execute("SELECT * FROM user WHERE userid=%s", (myuserid,))
+                await cursor.execute("SELECT userid, username FROM user WHERE userid=%s", (myuserid,))
                 my_user = await cursor.fetchone()
                 
                 if not my_user:
                     raise HTTPException(status_code=404, detail=f"User with userid {myuserid} not found")
                 
-                await cursor.execute("SELECT * FROM iamfollowing WHERE otheruserid=%s AND myuserid=%s", 
+                await cursor.execute("SELECT iamfollowingid FROM iamfollowing WHERE otheruserid=%s AND myuserid=%s", 
                                      (iamfollowing_user['userid'], my_user['userid']))
                 iamfollowing_exists = await cursor.fetchone()
                 
-                await cursor.execute("SELECT * FROM iamfollowed WHERE otheruserid=%s AND myuserid=%s", 
+                await cursor.execute("SELECT iamfollowedid FROM iamfollowed WHERE otheruserid=%s AND myuserid=%s", 
                                      (my_user['userid'], iamfollowing_user['userid']))
                 iamfollowed_exists = await cursor.fetchone()
                 
@@ -7775,31 +10890,36 @@ async def update_user_details(
                     if iamfollowing_exists:
                         await cursor.execute("DELETE FROM iamfollowing WHERE otheruserid=%s AND myuserid=%s AND type='user'", 
                                              (iamfollowing_user['userid'], my_user['userid']))
+                        if TIMELINE_FANOUT_ENABLED:
+                            await timeline_store.remove_source(cursor, my_user['userid'], 'n', iamfollowing_user['userid'])
                     if iamfollowed_exists:
                         await cursor.execute("DELETE FROM iamfollowed WHERE otheruserid=%s AND myuserid=%s", 
                                              (my_user['userid'], iamfollowing_user['userid']))
                     await conn.commit()
-                    return JSONResponse(content={"message": "Records already existed and were deleted"}, status_code=200)
+                    return ORJSONResponse(content={"message": "Records already existed and were deleted"}, status_code=200)
                 
                 await cursor.execute("""
-                    INSERT INTO iamfollowing (myuserid, otheruserid, username, profile,date,type)
-                    VALUES (%s, %s, %s, %s,%s,%s)
-                """, (myuserid, iamfollowing_user['userid'], iamfollowing_user['username'], iamfollowing_user['profileimage'],createddate,'user'))
+                    INSERT INTO iamfollowing (myuserid, otheruserid, username, date, type)
+                    VALUES (%s, %s, %s, %s, %s)
+                """, (myuserid, iamfollowing_user['userid'], iamfollowing_user['username'], createddate, 'user'))
                 
                 await cursor.execute("""
-                    INSERT INTO iamfollowed (myuserid, otheruserid, username, profile,date)
-                    VALUES (%s, %s, %s, %s,%s)
-                """, (iamfollowinguserid, my_user['userid'], my_user['username'], my_user['profileimage'],createddate))
+                    INSERT INTO iamfollowed (myuserid, otheruserid, username, date)
+                    VALUES (%s, %s, %s, %s)
+                """, (iamfollowinguserid, my_user['userid'], my_user['username'], createddate))
                 
                 # Commit the transaction
                 await conn.commit()
 
-                return JSONResponse(content={"message": "User details updated successfully"}, status_code=200)
+                if TIMELINE_FANOUT_ENABLED:
+                    await add_followee_to_timeline(cursor, my_user['userid'], [iamfollowing_user['userid']], [])
+
+                return ORJSONResponse(content={"message": "User details updated successfully"}, status_code=200)
 
     except HTTPException as e:
         raise e
     except Exception as e:
-        return JSONResponse(content={"message": f"Internal Server Error: {str(e)}"}, status_code=500)
+        return ORJSONResponse(content={"message": f"Internal Server Error: {str(e)}"}, status_code=500)
     
     
     
@@ -0,0 +1,102 @@
+"""
+Maintenance commands for the Ravoom backend.
+
+    python manage.py migrate-media
+    python manage.py migrate-avatars
+    python manage.py reconcile-counters --batch-size 500
+    python manage.py transcode-worker --concurrency 2
+    python manage.py backfill-video
+    python manage.py backfill-images
+    python manage.py reset-timelines
+"""
+import argparse
+import asyncio
+
+import main
+
+
+async def migrate_media(args):
+    await main.migrate_media_blobs(batch_size=args.batch_size)
+
+
+async def migrate_avatars(args):
+    await main.migrate_avatars(batch_size=args.batch_size)
+
+
+async def reconcile_counters(args):
+    await main.reconcile_counters(batch_size=args.batch_size)
+
+
+async def backfill_video(args):
+    await main.enqueue_video_backfill_jobs()
+
+
+async def backfill_images(args):
+    await main.enqueue_image_backfill_jobs()
+
+
+async def reset_timelines(args):
+    async with main.pool.acquire() as conn:
+        async with conn.cursor() as cursor:
+            await main.timeline_store.clear(cursor)
+
+
+async def transcode_worker(args):
+    worker = main.TranscodeWorker(concurrency=args.concurrency)
+    await worker.start()
+    try:
+        await worker.task
+    finally:
+        await worker.stop()
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Ravoom maintenance commands")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    migrate_media_parser = subparsers.add_parser("migrate-media", help="Move LONGBLOB media into the media store")
+    migrate_media_parser.add_argument("--batch-size", type=int, default=50)
+    migrate_media_parser.set_defaults(handler=migrate_media)
+
+    migrate_avatars_parser = subparsers.add_parser(
+        "migrate-avatars", help="Move profile images into the media store and drop their per-row copies"
+    )
+    migrate_avatars_parser.add_argument("--batch-size", type=int, default=50)
+    migrate_avatars_parser.set_defaults(handler=migrate_avatars)
+
+    reconcile_counters_parser = subparsers.add_parser(
+        "reconcile-counters", help="Recompute like/comment/reply counters that drifted"
+    )
+    reconcile_counters_parser.add_argument("--batch-size", type=int, default=500)
+    reconcile_counters_parser.set_defaults(handler=reconcile_counters)
+
+    transcode_worker_parser = subparsers.add_parser("transcode-worker", help="Run the video transcode worker without the API")
+    transcode_worker_parser.add_argument("--concurrency", type=int, default=main.TRANSCODE_CONCURRENCY)
+    transcode_worker_parser.set_defaults(handler=transcode_worker)
+
+    backfill_video_parser = subparsers.add_parser("backfill-video", help="Queue HLS ladders and posters for videos missing them")
+    backfill_video_parser.set_defaults(handler=backfill_video)
+
+    backfill_images_parser = subparsers.add_parser("backfill-images", help="Queue WebP derivatives for images missing them")
+    backfill_images_parser.set_defaults(handler=backfill_images)
+
+    reset_timelines_parser = subparsers.add_parser(
+        "reset-timelines", help="Drop precomputed home timelines; each is rebuilt on the user's next feed read"
+    )
+    reset_timelines_parser.set_defaults(handler=reset_timelines)
+
+    return parser
+
+
+async def run(args):
+    main.pool = await main.create_db_pool()
+    try:
+        await main.create_tables()
+        await args.handler(args)
+    finally:
+        main.pool.close()
+        await main.pool.wait_closed()
+
+
+if __name__ == "__main__":
+    asyncio.run(run(build_parser().parse_args()))
@@ -0,0 +1,149 @@
+"""
+Two simultaneous /add-post-image uploads must overlap: each takes its own pooled
+connection, and Pillow runs in the threadpool, so neither waits for the other.
+
+    python -m pytest tests
+
+No database is needed: every query on the stand-in pool sleeps for a few
+milliseconds, and the timings of each connection's queries and of each Pillow call
+are recorded to check that the two requests ran side by side.
+"""
+import asyncio
+import io
+import os
+import sys
+import time
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("aiomysql")
+httpx = pytest.importorskip("httpx")
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main
+
+
+QUERY_SECONDS = 0.02
+# Stands in for decoding and re-encoding a large photo.
+PILLOW_SECONDS = 0.2
+
+
+class SlowCursor:
+    def __init__(self, timings):
+        self.timings = timings
+        self.rowcount = 1
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, query, args=None):
+        started = time.perf_counter()
+        await asyncio.sleep(QUERY_SECONDS)
+        self.timings.setdefault(id(self), []).append((started, time.perf_counter()))
+        return 1
+
+    async def fetchone(self):
+        return {'username': 'uploader'}
+
+    async def fetchall(self):
+        return []
+
+
+class SlowConnection:
+    def __init__(self, timings):
+        self.timings = timings
+
+    def cursor(self, *args):
+        return SlowCursor(self.timings)
+
+    async def begin(self):
+        pass
+
+    async def commit(self):
+        await asyncio.sleep(QUERY_SECONDS)
+
+    async def rollback(self):
+        pass
+
+
+class SlowPool:
+    def __init__(self):
+        self.timings = {}
+
+    async def acquire(self):
+        return SlowConnection(self.timings)
+
+    async def release(self, conn):
+        pass
+
+
+def make_image(color) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 64), color).save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+def span(intervals):
+    return min(start for start, _ in intervals), max(end for _, end in intervals)
+
+
+def overlaps(first, second):
+    return max(first[0], second[0]) < min(first[1], second[1])
+
+
+@pytest.fixture
+def slow_pool(monkeypatch, tmp_path):
+    slow_pool = SlowPool()
+    monkeypatch.setattr(main, "pool", main.InstrumentedPool(slow_pool))
+    monkeypatch.setattr(main, "media_store", main.LocalMediaStore(str(tmp_path)))
+    monkeypatch.setattr(main, "TIMELINE_FANOUT_ENABLED", False)
+    main.app.dependency_overrides[main.get_current_user] = lambda: "1"
+    try:
+        yield slow_pool
+    finally:
+        main.app.dependency_overrides.clear()
+
+
+def test_concurrent_uploads_overlap(slow_pool, monkeypatch):
+    pillow_timings = []
+    strip_image_metadata = main.strip_image_metadata
+
+    def slow_strip_image_metadata(data, mediatype):
+        started = time.perf_counter()
+        result = strip_image_metadata(data, mediatype)
+        time.sleep(PILLOW_SECONDS)
+        pillow_timings.append((started, time.perf_counter()))
+        return result
+
+    monkeypatch.setattr(main, "strip_image_metadata", slow_strip_image_metadata)
+
+    async def upload(client, data):
+        return await client.post(
+            "/add-post-image",
+            data={"uid": "1", "imagePostdescription": "concurrent upload"},
+            files=[("imagefile", ("upload.jpg", data, "image/jpeg"))],
+        )
+
+    async def upload_two():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await asyncio.gather(
+                upload(client, make_image((255, 0, 0))),
+                upload(client, make_image((0, 0, 255))),
+            )
+
+    responses = asyncio.run(upload_two())
+
+    assert [response.status_code for response in responses] == [201, 201]
+    assert len(pillow_timings) == 2
+    assert overlaps(*pillow_timings)
+    # add-post-image runs all of its queries on one cursor.
+    db_spans = [span(intervals) for intervals in slow_pool.timings.values() if len(intervals) > 1]
+    assert len(db_spans) == 2
+    assert overlaps(*db_spans)
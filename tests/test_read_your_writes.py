@@ -0,0 +1,96 @@
+"""
+A write made over GET (delete_post, delete_comment) must pin the client's reads to
+the primary, like writes made with any other method.
+
+    python -m pytest tests
+
+No database is needed: the pools are stand-ins that record nothing and answer every
+query as if one row matched.
+"""
+import os
+import sys
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("aiomysql")
+
+from fastapi.testclient import TestClient
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main
+
+
+class StubCursor:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, query, args=None):
+        return 1
+
+    async def fetchone(self):
+        return (1,)
+
+
+class StubConnection:
+    def cursor(self, *args):
+        return StubCursor()
+
+    async def begin(self):
+        pass
+
+    async def commit(self):
+        pass
+
+    async def rollback(self):
+        pass
+
+
+class StubPool:
+    async def acquire(self):
+        return StubConnection()
+
+    async def release(self, conn):
+        pass
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(main, "pool", main.InstrumentedPool(StubPool()))
+    monkeypatch.setattr(main, "replica_pool", main.InstrumentedPool(StubPool(), replica=True))
+    monkeypatch.setattr(main, "recent_writers", main.RecentWriters())
+    monkeypatch.setattr(main.replica_monitor, "is_healthy", lambda: True)
+    main.app.dependency_overrides[main.get_current_user] = lambda: "1"
+    try:
+        yield TestClient(main.app)
+    finally:
+        main.app.dependency_overrides.clear()
+
+
+def reads_for(client_key):
+    token = main.db_routing.set({"client": client_key, "primary_writes": False})
+    try:
+        return main.read_pool()
+    finally:
+        main.db_routing.reset(token)
+
+
+@pytest.mark.parametrize("path", ["/delete_post?postid=1&userid=1", "/delete_comment?commentid=1"])
+def test_get_delete_pins_reads_to_primary(client, path):
+    assert reads_for("addr:testclient") is main.replica_pool
+
+    response = client.get(path)
+
+    assert response.status_code == 200
+    assert reads_for("addr:testclient") is main.pool.reads
+    assert reads_for("addr:someone-else") is main.replica_pool
+
+
+def test_get_read_does_not_pin(client):
+    client.get("/internal/post-cache-stats")
+
+    assert reads_for("addr:testclient") is main.replica_pool